@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'spark.settings')
+# the dashboards have async views, use them when served over ASGI
+os.environ.setdefault('SPARKAPP_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
@@ -1,6 +1,9 @@
 from pathlib import Path
+import importlib.util
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -29,11 +32,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'sparkapp.middleware.QueryCountMiddleware',  # no-op unless SPARKAPP_QUERY_STATS is on
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'sparkapp.middleware.ReplicaRoutingMiddleware',  # no-op without a "replica" database
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -64,13 +69,80 @@ WSGI_APPLICATION = 'spark.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
-
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+#
+# SPARKAPP_DB_ENGINE picks the backend:
+#   sqlite (default)  SPARKAPP_DB_NAME is the database file
+#   postgresql        needs psycopg; SPARKAPP_DB_NAME, _USER, _PASSWORD, _HOST, _PORT
+# A read replica becomes the "replica" alias when SPARKAPP_DB_REPLICA_NAME (a
+# second SQLite file) or SPARKAPP_DB_REPLICA_HOST (PostgreSQL) is set, see
+# sparkapp/routers.py for which views read from it.
+
+SPARKAPP_DB_ENGINE = os.environ.get('SPARKAPP_DB_ENGINE', 'sqlite')
+
+# SQLite settings for serving real traffic, selected with
+# SPARKAPP_DB_PROFILE=production. The PRAGMAs run on every new connection.
+SQLITE_PRODUCTION_PRAGMAS = {
+    'journal_mode': 'WAL',          # readers and the writer stop blocking each other
+    'synchronous': 'NORMAL',        # durable with WAL, no fsync on every commit
+    'busy_timeout': 5000,           # ms to wait for the write lock before "database is locked"
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -32000,           # negative = KiB, 32 MB page cache per connection
+    'temp_store': 'MEMORY',
+}
+SQLITE_PRODUCTION_OPTIONS = {
+    'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRODUCTION_PRAGMAS.items()),
+    # BEGIN IMMEDIATE: take the write lock up front, a DEFERRED transaction
+    # that reads and then writes fails at once if another writer got in first
+    'transaction_mode': 'IMMEDIATE',
 }
+SPARKAPP_DB_PROFILE = os.environ.get('SPARKAPP_DB_PROFILE', 'default')
+
+if SPARKAPP_DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SPARKAPP_DB_NAME', BASE_DIR / 'db.sqlite3'),
+        }
+    }
+    if SPARKAPP_DB_PROFILE == 'production':
+        DATABASES['default'].update({
+            'OPTIONS': SQLITE_PRODUCTION_OPTIONS,
+            'CONN_MAX_AGE': 600,  # keep connections (and their page cache) between requests
+            'CONN_HEALTH_CHECKS': True,
+        })
+    elif SPARKAPP_DB_PROFILE != 'default':
+        raise ImproperlyConfigured(f'Unknown SPARKAPP_DB_PROFILE "{SPARKAPP_DB_PROFILE}", use "default" or "production".')
+    if os.environ.get('SPARKAPP_DB_REPLICA_NAME'):
+        # locally: a copy of the primary file standing in for a streaming replica
+        DATABASES['replica'] = dict(DATABASES['default'], NAME=os.environ['SPARKAPP_DB_REPLICA_NAME'])
+elif SPARKAPP_DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('SPARKAPP_DB_NAME', 'spark'),
+            'USER': os.environ.get('SPARKAPP_DB_USER', 'spark'),
+            'PASSWORD': os.environ.get('SPARKAPP_DB_PASSWORD', ''),
+            'HOST': os.environ.get('SPARKAPP_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('SPARKAPP_DB_PORT', '5432'),
+            'CONN_MAX_AGE': 600,
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+    if os.environ.get('SPARKAPP_DB_REPLICA_HOST'):
+        DATABASES['replica'] = dict(
+            DATABASES['default'],
+            HOST=os.environ['SPARKAPP_DB_REPLICA_HOST'],
+            PORT=os.environ.get('SPARKAPP_DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        )
+else:
+    raise ImproperlyConfigured(f'Unknown SPARKAPP_DB_ENGINE "{SPARKAPP_DB_ENGINE}", use "sqlite" or "postgresql".')
+
+if 'replica' in DATABASES:
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}  # tests only have the primary
+    DATABASE_ROUTERS = ['sparkapp.routers.ReplicaRouter']
+
+# How long a session keeps reading from the primary after it wrote something
+SPARKAPP_REPLICA_PIN_SECONDS = 10
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -90,6 +162,78 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing (sparkapp/hashers.py). SPARKAPP_PASSWORD_HASHER picks the
+# algorithm of new hashes: pbkdf2 (default), scrypt or argon2 (needs
+# argon2-cffi). The costs below are the ones it hashes with, None keeps
+# Django's; ``manage.py calibrate_hasher`` suggests values for this machine.
+# Hashes of the other algorithms or of an older cost still verify, and are
+# redone with the current policy at the user's next successful login.
+def _optional_int(name):
+    value = os.environ.get(name, '')
+    return int(value) if value else None
+
+
+PASSWORD_HASHER_CLASSES = {
+    'pbkdf2': 'sparkapp.hashers.TunedPBKDF2PasswordHasher',
+    'scrypt': 'sparkapp.hashers.TunedScryptPasswordHasher',
+    'argon2': 'sparkapp.hashers.TunedArgon2PasswordHasher',
+}
+SPARKAPP_PASSWORD_HASHER = os.environ.get('SPARKAPP_PASSWORD_HASHER', 'pbkdf2')
+if SPARKAPP_PASSWORD_HASHER not in PASSWORD_HASHER_CLASSES:
+    raise ImproperlyConfigured(
+        f'Unknown SPARKAPP_PASSWORD_HASHER "{SPARKAPP_PASSWORD_HASHER}", use "pbkdf2", "scrypt" or "argon2".'
+    )
+if SPARKAPP_PASSWORD_HASHER == 'argon2' and importlib.util.find_spec('argon2') is None:
+    raise ImproperlyConfigured('SPARKAPP_PASSWORD_HASHER=argon2 needs the argon2-cffi package.')
+PASSWORD_HASHERS = [PASSWORD_HASHER_CLASSES[SPARKAPP_PASSWORD_HASHER]] + [
+    path for name, path in PASSWORD_HASHER_CLASSES.items() if name != SPARKAPP_PASSWORD_HASHER
+] + ['django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']
+SPARKAPP_PBKDF2_ITERATIONS = _optional_int('SPARKAPP_PBKDF2_ITERATIONS')
+SPARKAPP_SCRYPT_WORK_FACTOR = _optional_int('SPARKAPP_SCRYPT_WORK_FACTOR')  # a power of 2
+SPARKAPP_SCRYPT_PARALLELISM = _optional_int('SPARKAPP_SCRYPT_PARALLELISM')
+SPARKAPP_ARGON2_TIME_COST = _optional_int('SPARKAPP_ARGON2_TIME_COST')
+SPARKAPP_ARGON2_MEMORY_COST = _optional_int('SPARKAPP_ARGON2_MEMORY_COST')  # KiB
+SPARKAPP_ARGON2_PARALLELISM = _optional_int('SPARKAPP_ARGON2_PARALLELISM')
+
+# Login throttling (sparkapp/throttle.py): after this many failed logins in
+# the window, further attempts for the username from the same address, or
+# from the address at all, are refused before any password is hashed. Failed
+# logins for a username from anywhere only delay its further attempts, so
+# nobody can lock another user out. 0 turns a limit off. Behind a proxy, set
+# the header carrying the client address, e.g. HTTP_X_REAL_IP.
+SPARKAPP_LOGIN_THROTTLE_WINDOW = 15 * 60  # seconds
+SPARKAPP_LOGIN_THROTTLE_PER_USERNAME = 10
+SPARKAPP_LOGIN_THROTTLE_PER_IP = 50
+SPARKAPP_LOGIN_SLOWDOWN_PER_USERNAME = 10
+SPARKAPP_LOGIN_SLOWDOWN_DELAY = 1  # seconds
+SPARKAPP_LOGIN_CLIENT_IP_HEADER = os.environ.get('SPARKAPP_LOGIN_CLIENT_IP_HEADER', 'REMOTE_ADDR')
+
+# Authentication (sparkapp/backends.py): login throttling, and the logged-in
+# user loaded with their employee row in one query and cached between requests
+AUTHENTICATION_BACKENDS = ['sparkapp.backends.SparkModelBackend']
+
+# Where sessions are kept, SPARKAPP_SESSIONS:
+#   db              a query per request (Django's default)
+#   cached_db       read from the cache, written through to the database
+#   signed_cookies  in the cookie itself, no storage; can't be revoked
+#                   server-side before they expire (logout only clears the cookie)
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+SPARKAPP_SESSIONS = os.environ.get('SPARKAPP_SESSIONS', 'db')
+if SPARKAPP_SESSIONS not in SESSION_ENGINES:
+    raise ImproperlyConfigured(f'Unknown SPARKAPP_SESSIONS "{SPARKAPP_SESSIONS}", use "db", "cached_db" or "signed_cookies".')
+SESSION_ENGINE = SESSION_ENGINES[SPARKAPP_SESSIONS]
+
+# Change feed for HR / payroll systems (sparkapp/sync.py): a page holds at
+# most SPARKAPP_SYNC_PAGE_SIZE changes. Changes are published once they are
+# SPARKAPP_SYNC_SETTLE_SECONDS old, so a transaction that is still open when a
+# page is served can't commit a change behind the consumer's cursor.
+SPARKAPP_SYNC_PAGE_SIZE = 500
+SPARKAPP_SYNC_SETTLE_SECONDS = 10
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
@@ -121,6 +265,25 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Media files (uploads)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Files only their owner may download, e.g. prepared reports (sparkapp/tasks.py).
+# Keep it outside MEDIA_ROOT and never mount it on the web server.
+SPARKAPP_PRIVATE_ROOT = os.environ.get('SPARKAPP_PRIVATE_ROOT', os.path.join(BASE_DIR, 'private'))
+
+# Uploaded documents and profile pictures are served by sparkapp views that
+# check permissions, then leave sending the bytes to the front proxy:
+#   SPARKAPP_MEDIA_ACCEL=nginx   X-Accel-Redirect to SPARKAPP_MEDIA_ACCEL_PREFIX + name,
+#                                with  location /protected-media/ { internal; alias <MEDIA_ROOT>/; }
+#   SPARKAPP_MEDIA_ACCEL=apache  X-Sendfile with the file path (mod_xsendfile)
+# Unset, Django streams the file itself (Range requests and conditional GET included).
+SPARKAPP_MEDIA_ACCEL = os.environ.get('SPARKAPP_MEDIA_ACCEL', '')
+SPARKAPP_MEDIA_ACCEL_PREFIX = os.environ.get('SPARKAPP_MEDIA_ACCEL_PREFIX', '/protected-media/')
+if SPARKAPP_MEDIA_ACCEL not in ('', 'nginx', 'apache'):
+    raise ImproperlyConfigured(f'Unknown SPARKAPP_MEDIA_ACCEL "{SPARKAPP_MEDIA_ACCEL}", use "nginx" or "apache".')
+
+# Chunked document uploads (sparkapp/uploads.py)
+SPARKAPP_UPLOAD_MAX_SIZE = int(os.environ.get('SPARKAPP_UPLOAD_MAX_SIZE', 50 * 1024 * 1024))
+SPARKAPP_UPLOAD_MAX_CHUNK = int(os.environ.get('SPARKAPP_UPLOAD_MAX_CHUNK', 5 * 1024 * 1024))
+SPARKAPP_UPLOAD_EXPIRY_HOURS = 24  # unfinished uploads are dropped by collect_documents after this
 
 
 #AUTH_USER_MODEL = 'sparkapp.CustomUser'
@@ -128,4 +291,56 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 LOGIN_REDIRECT_URL='/'
 #LOGIN_REDIRECT_URL = '/login-redirect/'
 
-LOGOUT_REDIRECT_URL='login'
\ No newline at end of file
+LOGOUT_REDIRECT_URL='login'
+
+# Cache (role sets, analytics, reference tables and list fragments).
+# Local memory by default, which is per process: with several worker processes
+# use the shared file or Redis backend so invalidations reach every worker.
+#   SPARKAPP_CACHE=file   SPARKAPP_CACHE_LOCATION=/var/tmp/spark-cache
+#   SPARKAPP_CACHE=redis  SPARKAPP_CACHE_LOCATION=redis://127.0.0.1:6379/1
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'spark'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', str(BASE_DIR / 'cache')),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379/1'),
+}
+_cache_backend, _cache_location = CACHE_BACKENDS[os.environ.get('SPARKAPP_CACHE', 'locmem')]
+CACHES = {
+    'default': {
+        'BACKEND': _cache_backend,
+        'LOCATION': os.environ.get('SPARKAPP_CACHE_LOCATION', _cache_location),
+        'KEY_PREFIX': 'spark',
+    },
+}
+
+# How long cached reference tables are kept (they are invalidated on change anyway)
+SPARKAPP_REFERENCE_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Serve the async variants of the dashboard views (set by spark/asgi.py)
+SPARKAPP_ASYNC_VIEWS = os.environ.get('SPARKAPP_ASYNC_VIEWS', '') == '1'
+
+# Per-request SQL statistics (sparkapp.middleware.QueryCountMiddleware)
+SPARKAPP_QUERY_STATS = os.environ.get('SPARKAPP_QUERY_STATS', '') == '1'
+SPARKAPP_QUERY_STATS_SLOWEST = 3  # how many of the slowest statements to log
+
+# Background tasks (sparkapp/tasks.py, run by manage.py run_worker)
+SPARKAPP_TASKS_EAGER = os.environ.get('SPARKAPP_TASKS_EAGER', '') == '1'  # run in the request, no worker needed
+SPARKAPP_TASKS_BACKOFF = 10          # seconds before the first retry, doubled for each next one
+SPARKAPP_TASKS_BACKOFF_MAX = 60 * 60
+SPARKAPP_TASKS_TIMEOUT = 15 * 60     # a task running longer than this is assumed lost and retried
+SPARKAPP_TASKS_KEEP_DAYS = 7         # finished tasks (and report files) are deleted after this
+
+# Processes the import page uses to hash passwords during bulk onboarding
+# (1 = no pool). Keep it at 1 unless the web workers may fork: the pool lives
+# as long as the request. ``manage.py import_employees`` uses one per CPU.
+SPARKAPP_ONBOARDING_WORKERS = 1
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'sparkapp.queries': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
\ No newline at end of file
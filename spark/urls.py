@@ -15,16 +15,16 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
+from django.contrib.auth import views as auth_views
 from django.urls import path, include
 
+from sparkapp.forms import LoginForm
+
+# Nothing is served from MEDIA_URL, not even under DEBUG: uploads go through
+# sparkapp's document and picture views, which check who is asking.
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('sparkapp.urls')),  # Include URLs from the sparkapp
+    path('accounts/login/', auth_views.LoginView.as_view(authentication_form=LoginForm), name='login'),
     path('accounts/', include('django.contrib.auth.urls')),
 ]
-
-from django.conf import settings
-from django.conf.urls.static import static
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
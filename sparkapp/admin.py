@@ -1,5 +1,7 @@
+from django import forms
 from django.contrib import admin
 from .models import Department, Designation, Employee,EventType,Venue,Role,EmployeeRoleAssignment, Event,EventParticipation
+from .forms import VenueBookingMixin, allow_double_booking_field
 
 # Customizing the Department admin
 @admin.register(Department)
@@ -59,8 +61,17 @@ class EmployeeRoleAssignmentAdmin(admin.ModelAdmin):
     search_fields = ('emp_id__emp_name', 'role_id__role_name')  # Search by employee name or role name
     list_filter = ('assigned_date', 'relieved_date')  # Filter options
 
+class EventAdminForm(VenueBookingMixin, forms.ModelForm):
+    allow_double_booking = allow_double_booking_field()
+
+    class Meta:
+        model = Event
+        fields = '__all__'
+
+
 @admin.register(Event)
 class EventAdmin(admin.ModelAdmin):
+    form = EventAdminForm
     list_display = ('title', 'type_id', 'from_date', 'to_date', 'venue')  # Columns to display in admin
     list_filter = ('type_id', 'venue')  # Add filters for type and venue
     search_fields = ('title',)  # Add search for title
@@ -0,0 +1,199 @@
+# sparkapp/analytics.py
+#
+# Principal dashboard analytics.
+#
+# Each metric is one GROUP BY query over EventParticipation or
+# EmployeeRoleAssignment. The results are stored in AnalyticsSummary and kept
+# up to date incrementally: signals (sparkapp/signals.py) report which buckets
+# a change touches, and after the transaction commits only those buckets are
+# counted again. The dashboard reads the summary table through a versioned
+# cache key, so serving it doesn't depend on how much history there is.
+
+import datetime
+import threading
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count, F, Q, Value
+from django.db.models.functions import Coalesce, Lower, NullIf, TruncMonth
+from django.utils import timezone
+
+from .models import AnalyticsSummary, EmployeeRoleAssignment, EventParticipation
+
+VERSION_KEY = 'sparkapp:analytics:version'
+ACTIVE_ROLE_DAY_KEY = 'sparkapp:analytics:active-role-day'
+SUMMARY_TIMEOUT = 60 * 60 * 24
+
+DEPARTMENT = 'department'
+EVENT_TYPE = 'event_type'
+MONTH = 'month'
+MODE = 'mode'
+ACTIVE_ROLE = 'active_role'
+METRICS = (DEPARTMENT, EVENT_TYPE, MONTH, MODE, ACTIVE_ROLE)
+
+
+def month_key(value):
+    return value.strftime('%Y-%m') if value else ''
+
+
+def mode_key(value):
+    return (value or 'unknown').lower()
+
+
+def _grouped(metric):
+    """The GROUP BY query of a metric, with ``bucket``, ``bucket_label`` and ``value`` columns."""
+    if metric == DEPARTMENT:
+        queryset = EventParticipation.objects.annotate(
+            bucket=F('emp_id__dept_id'), bucket_label=F('emp_id__dept_id__dept_name'))
+    elif metric == EVENT_TYPE:
+        queryset = EventParticipation.objects.annotate(
+            bucket=F('event_id__type_id'), bucket_label=F('event_id__type_id__type_description'))
+    elif metric == MONTH:
+        queryset = EventParticipation.objects.annotate(
+            bucket=TruncMonth('event_id__from_date'), bucket_label=Value(''))
+    elif metric == MODE:
+        queryset = EventParticipation.objects.annotate(
+            bucket=Lower(Coalesce(NullIf('mode', Value('')), Value('unknown'))), bucket_label=Value(''))
+    elif metric == ACTIVE_ROLE:
+        today = timezone.localdate()
+        queryset = EmployeeRoleAssignment.objects.filter(
+            Q(relieved_date__isnull=True) | Q(relieved_date__gte=today), assigned_date__lte=today,
+        ).annotate(bucket=F('role_id'), bucket_label=F('role_id__role_name'))
+        return queryset.values('bucket', 'bucket_label').annotate(value=Count('emp_id', distinct=True))
+    else:
+        raise ValueError(f'Unknown metric {metric!r}')
+    return queryset.values('bucket', 'bucket_label').annotate(value=Count('id'))
+
+
+def _key_and_label(metric, bucket, label):
+    if metric == MONTH:
+        return month_key(bucket), bucket.strftime('%b %Y') if bucket else 'No date'
+    if metric == MODE:
+        return bucket, bucket.title()
+    return str(bucket), label
+
+
+def _bucket_filter(metric, keys):
+    if metric == MONTH:
+        # counted by the month of the event's start date
+        condition = Q()
+        for key in keys:
+            year, month = map(int, key.split('-'))
+            start = timezone.make_aware(datetime.datetime(year, month, 1))
+            end = timezone.make_aware(datetime.datetime(year + month // 12, month % 12 + 1, 1))
+            condition |= Q(event_id__from_date__gte=start, event_id__from_date__lt=end)
+        return condition
+    return Q(bucket__in=list(keys))
+
+
+def refresh(metric, keys=None):
+    """Count the given buckets of ``metric`` again (all of them if keys is None)."""
+    queryset = _grouped(metric).using(DEFAULT_DB_ALIAS)  # counted on the primary, never a lagging replica
+    if keys is not None:
+        keys = {key for key in keys if key not in (None, '')}
+        if not keys:
+            return
+        queryset = queryset.filter(_bucket_filter(metric, keys))
+
+    rows = {}
+    for row in queryset:
+        key, label = _key_and_label(metric, row['bucket'], row['bucket_label'])
+        if key:
+            rows[key] = AnalyticsSummary(metric=metric, key=key, label=label or '', value=row['value'])
+
+    with transaction.atomic():
+        stale = AnalyticsSummary.objects.filter(metric=metric)
+        if keys is not None:
+            stale = stale.filter(key__in=keys)
+        stale.exclude(key__in=rows).delete()
+        AnalyticsSummary.objects.bulk_create(
+            rows.values(),
+            update_conflicts=True,
+            unique_fields=['metric', 'key'],
+            update_fields=['label', 'value'],
+        )
+    _bump_version()
+
+
+def rebuild():
+    for metric in METRICS:
+        refresh(metric)
+    cache.set(ACTIVE_ROLE_DAY_KEY, timezone.localdate().isoformat(), SUMMARY_TIMEOUT)
+
+
+def _bump_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:  # not in the cache yet (or evicted)
+        cache.set(VERSION_KEY, 1, None)
+
+
+# ---- Incremental updates ---- #
+# Buckets touched by the current transaction; counted once on commit.
+_pending = threading.local()
+
+
+def mark_dirty(metric, *keys):
+    buckets = getattr(_pending, 'buckets', None)
+    if buckets is None:
+        buckets = _pending.buckets = {}
+    buckets.setdefault(metric, set()).update(str(key) for key in keys if key not in (None, ''))
+    transaction.on_commit(flush)
+
+
+def flush():
+    buckets = getattr(_pending, 'buckets', None)
+    _pending.buckets = None
+    for metric, keys in (buckets or {}).items():
+        refresh(metric, keys)
+
+
+def participation_buckets(participation_id):
+    """{metric: key} of one stored EventParticipation (one query)."""
+    row = (
+        EventParticipation.objects.filter(pk=participation_id)
+        .values('emp_id__dept_id', 'event_id__type_id', 'event_id__from_date', 'mode')
+        .first()
+    )
+    if row is None:
+        return {}
+    return {
+        DEPARTMENT: row['emp_id__dept_id'],
+        EVENT_TYPE: row['event_id__type_id'],
+        MONTH: month_key(row['event_id__from_date']),
+        MODE: mode_key(row['mode']),
+    }
+
+
+# ---- Reading ---- #
+def dashboard_summary():
+    """
+    {metric: [(label, value), ...]} for the principal dashboard, served from
+    the cache while nothing changed.
+    """
+    today = timezone.localdate().isoformat()
+    version = cache.get_or_set(VERSION_KEY, 1, None)
+    key = f'sparkapp:analytics:summary:{version}:{today}'
+    summary = cache.get(key)
+    if summary is not None:
+        return summary
+
+    if cache.get(ACTIVE_ROLE_DAY_KEY) != today:
+        # who holds a role "now" changes with the date, not only with writes
+        if not AnalyticsSummary.objects.exists():
+            rebuild()
+        else:
+            refresh(ACTIVE_ROLE)
+            cache.set(ACTIVE_ROLE_DAY_KEY, today, SUMMARY_TIMEOUT)
+        version = cache.get_or_set(VERSION_KEY, 1, None)
+        key = f'sparkapp:analytics:summary:{version}:{today}'
+
+    summary = {metric: [] for metric in METRICS}
+    for row in AnalyticsSummary.objects.order_by('metric', '-value', 'label'):
+        if row.metric in summary:
+            summary[row.metric].append((row.key, row.label, row.value))
+    summary[MONTH].sort()  # chronological, keys are YYYY-MM
+    summary = {metric: [(label, value) for _, label, value in rows] for metric, rows in summary.items()}
+
+    cache.set(key, summary, SUMMARY_TIMEOUT)
+    return summary
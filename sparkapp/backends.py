@@ -0,0 +1,97 @@
+# sparkapp/backends.py
+#
+# The authentication backend (settings.AUTHENTICATION_BACKENDS).
+#
+# Logging in: refused before any password is hashed while the client
+# address, or the username from that address, is throttled, and slowed down
+# while the username has failed too often from anywhere (sparkapp/throttle.py).
+#
+# Every request: AuthenticationMiddleware asks the backend for the session's
+# user. The user is loaded in one query together with the Employee row,
+# department and designation that base.html and most views need, and kept in
+# the cache, so a page view usually needs no query at all to know who is
+# asking. Signals drop the cached copy whenever the user, the employee or
+# their department or designation changes (sparkapp/signals.py), and Django
+# still checks the session against the password hash on every request: the
+# cache keeps the session hash derived from it, not the password hash.
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+
+from . import throttle
+
+USER_CACHE_TIMEOUT = 60 * 60  # changes invalidate it anyway
+
+
+def user_cache_key(user_id):
+    return f'sparkapp:user:{user_id}'
+
+
+def _cached_session_hash(user, session_hash):
+    def get_session_auth_hash():
+        if 'password' in user.__dict__:  # loaded or changed since it was cached
+            return type(user).get_session_auth_hash(user)
+        return session_hash
+    return get_session_auth_hash
+
+
+def load_user(user_id):
+    """
+    The user with their employee, department and designation, or None.
+
+    The password hash is never put in the shared cache, only the session
+    hash derived from it that Django compares on every request. On the
+    returned user ``password`` is a deferred field, read on first use.
+    """
+    key = user_cache_key(user_id)
+    cached = cache.get(key)
+    if cached is None:
+        user = (
+            get_user_model()._default_manager
+            .select_related('employee__dept_id', 'employee__designation_id')
+            .filter(pk=user_id).first()
+        )
+        if user is None:
+            return None
+        session_hash = user.get_session_auth_hash()
+        del user.__dict__['password']
+        cache.set(key, (user, session_hash), USER_CACHE_TIMEOUT)
+    else:
+        user, session_hash = cached
+    user.get_session_auth_hash = _cached_session_hash(user, session_hash)
+    return user
+
+
+def invalidate_cached_users(*user_ids):
+    user_ids = [pk for pk in user_ids if pk is not None]
+    if user_ids:
+        cache.delete_many([user_cache_key(pk) for pk in user_ids])
+
+
+class SparkModelBackend(ModelBackend):
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(get_user_model().USERNAME_FIELD)
+        if throttle.is_throttled(request, username):
+            if request is not None:
+                request.login_throttled = True  # for the login form's message
+            # stops authenticate() from trying other backends
+            raise PermissionDenied
+        throttle.slow_down(username)
+        user = super().authenticate(request, username=username, password=password, **kwargs)
+        if user is not None:
+            throttle.clear(request, username)
+        elif password is not None:
+            throttle.record_failure(request, username)
+        return user
+
+    def get_user(self, user_id):
+        user = load_user(user_id)
+        return user if user is not None and self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        return await sync_to_async(self.get_user)(user_id)
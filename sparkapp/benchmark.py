@@ -0,0 +1,321 @@
+# sparkapp/benchmark.py
+#
+# Measuring the app at production scale. seed() fills an empty database with
+# a realistic institution (thousands of staff, tens of thousands of events
+# and participations, spread over twenty years) using bulk inserts, and run()
+# drives the main pages with concurrent test clients and reports throughput,
+# latency percentiles and queries per request. Results are plain JSON, so
+# runs on different commits can be compared:
+#
+#     SPARKAPP_DB_NAME=/tmp/bench.sqlite3 ./manage.py migrate
+#     SPARKAPP_DB_NAME=/tmp/bench.sqlite3 ./manage.py seed_bench
+#     SPARKAPP_DB_NAME=/tmp/bench.sqlite3 ./manage.py run_benchmark --output before.json
+#
+# Both work on whatever database is configured, never on a real one by
+# accident: seed() refuses a database that already has bench users.
+
+import datetime
+import random
+import subprocess
+import threading
+import time
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.core.management import call_command
+from django.db import OperationalError, close_old_connections, connections, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import analytics, timeline
+from .calendar import upcoming_events
+from .models import (
+    Department, Designation, Employee, EmployeeRoleAssignment, Event, EventParticipation, EventType, Role, Venue,
+)
+
+PREFIX = 'bench'
+PASSWORD = 'bench-pass-123'  # every bench user's, for benchmarks that log in for real
+BATCH_SIZE = 1000
+
+DEPARTMENTS = (
+    'Computer Science', 'Physics', 'Chemistry', 'Mathematics', 'Commerce', 'English', 'Economics',
+    'History', 'Biology', 'Electronics', 'Statistics', 'Psychology',
+)
+DESIGNATIONS = ('Assistant Professor', 'Associate Professor', 'Professor', 'Lecturer', 'Lab Instructor')
+EVENT_TYPES = ('Workshop', 'FDP', 'Seminar', 'Conference', 'Webinar', 'Guest Lecture')
+ROLES = ('HOD', 'Coordinator', 'Examiner', 'Mentor', 'NAAC Member', 'Exam Superintendent', 'Warden')
+TOPICS = (
+    'Machine Learning', 'Research Methods', 'Outcome Based Education', 'Cyber Security', 'Pedagogy',
+    'Data Science', 'Academic Writing', 'Quantum Computing', 'Financial Literacy', 'Climate Change',
+)
+FIRST_NAMES = ('Asha', 'Rahul', 'Priya', 'Vikram', 'Meera', 'Arjun', 'Kavya', 'Rohan', 'Nisha', 'Sanjay', 'Divya', 'Karan')
+LAST_NAMES = ('Sharma', 'Iyer', 'Patel', 'Reddy', 'Nair', 'Gupta', 'Das', 'Menon', 'Rao', 'Singh', 'Joshi', 'Khan')
+
+
+def username(kind, number=None):
+    return f'{PREFIX}-{kind}' if number is None else f'{PREFIX}-{kind}{number}'
+
+
+# ---- Seeding ---- #
+def seed(departments=12, teachers=2000, events=20000, participations=25, roles=3, upcoming=0.02, random_seed=0):
+    """
+    Fill the database with a synthetic institution; returns the row counts.
+
+    ``participations`` and ``roles`` are averages per teacher, ``upcoming``
+    the share of events that haven't happened yet (the ones teachers can
+    still register for). The same ``random_seed`` gives the same data.
+    """
+    if User.objects.filter(username=username('admin')).exists():
+        raise ValueError('This database already has bench data; seed a fresh one.')
+    rng = random.Random(random_seed)
+    now = timezone.now()
+    password = make_password(PASSWORD)  # hashed once, shared by every user
+
+    with transaction.atomic():
+        groups = {name: Group.objects.get_or_create(name=name)[0] for name in ('Admin', 'Teacher', 'Principal')}
+        department_rows = Department.objects.bulk_create([
+            Department(dept_name=DEPARTMENTS[i] if i < len(DEPARTMENTS) else f'Department {i + 1}')
+            for i in range(departments)
+        ])
+        designation_rows = Designation.objects.bulk_create([Designation(designation_name=name) for name in DESIGNATIONS])
+        type_rows = EventType.objects.bulk_create([EventType(type_description=name) for name in EVENT_TYPES])
+        venue_rows = Venue.objects.bulk_create([Venue(name=f'Seminar Hall {i + 1}', address='Main Campus') for i in range(20)])
+        role_rows = Role.objects.bulk_create([Role(role_name=name, role_description=name) for name in ROLES])
+
+        event_rows, past = _seed_events(rng, now, events, upcoming, type_rows, venue_rows)
+        employees = _seed_staff(rng, now, teachers, password, groups, department_rows, designation_rows)
+        teacher_rows = employees[:teachers]
+
+        EventParticipation.objects.bulk_create((
+            EventParticipation(
+                emp_id=employee, event_id=event_rows[index],
+                role=rng.choices(('Participant', 'Speaker', 'Organiser'), (90, 5, 5))[0],
+                mode=rng.choice(('Online', 'Offline')),
+            )
+            for employee in teacher_rows
+            for index in rng.sample(range(past), min(past, rng.randint(participations // 2, participations * 3 // 2)))
+        ), batch_size=BATCH_SIZE)
+        EmployeeRoleAssignment.objects.bulk_create(
+            _role_assignments(rng, now, teacher_rows, role_rows, roles), batch_size=BATCH_SIZE,
+        )
+
+    # the derived tables, which signals would have maintained row by row
+    analytics.rebuild()
+    timeline.rebuild()
+    call_command('rebuild_employee_search', stdout=StringIO())
+    return dataset_size()
+
+
+def _seed_events(rng, now, events, upcoming, type_rows, venue_rows):
+    """Events over the last twenty years, then a few in the coming months; returns (rows, number in the past)."""
+    future = int(events * upcoming)
+    past = events - future
+    starts = sorted(now - datetime.timedelta(days=rng.uniform(1, 20 * 365)) for _ in range(past))
+    starts += sorted(now + datetime.timedelta(days=rng.uniform(1, 180)) for _ in range(future))
+    rows = []
+    for i, start in enumerate(starts):
+        start = start.replace(hour=rng.choice((9, 10, 14)), minute=0, second=0, microsecond=0)
+        event_type = rng.choice(type_rows)
+        rows.append(Event(
+            title=f'{event_type.type_description} on {rng.choice(TOPICS)} #{i + 1}', type_id=event_type,
+            from_date=start, to_date=start + datetime.timedelta(days=rng.choice((0, 0, 1, 2, 4)), hours=3),
+            venue=rng.choice(venue_rows),
+        ))
+    return Event.objects.bulk_create(rows, batch_size=BATCH_SIZE), past
+
+
+def _seed_staff(rng, now, teachers, password, groups, department_rows, designation_rows):
+    """Teachers first, then the admins and the principal; returns their Employee rows in that order."""
+    accounts = [('Teacher', username('teacher', i)) for i in range(teachers)]
+    accounts += [('Admin', username('admin'))] + [('Admin', username('admin', i)) for i in range(1, 3)]
+    accounts += [('Principal', username('principal'))]
+
+    users = User.objects.bulk_create([
+        User(username=name, email=f'{name}@example.edu', password=password, date_joined=now)
+        for _, name in accounts
+    ], batch_size=BATCH_SIZE)
+    User.groups.through.objects.bulk_create([
+        User.groups.through(user_id=user.pk, group_id=groups[group].pk)
+        for (group, _), user in zip(accounts, users)
+    ], batch_size=BATCH_SIZE)
+
+    employees = []
+    for user in users:
+        joined = (now - datetime.timedelta(days=rng.uniform(30, 25 * 365))).date()
+        employees.append(Employee(
+            user=user, emp_name=f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}', email_id=user.email,
+            phn_no=f'9{rng.randrange(10 ** 9):09d}', gender=rng.choice(('Male', 'Female')),
+            dept_id=rng.choice(department_rows), designation_id=rng.choice(designation_rows),
+            date_of_joining=joined, DOB=joined - datetime.timedelta(days=rng.uniform(23, 40) * 365),
+            status='Active' if rng.random() < 0.9 else 'Inactive',
+        ))
+    return Employee.objects.bulk_create(employees, batch_size=BATCH_SIZE)
+
+
+def _role_assignments(rng, now, employees, role_rows, roles):
+    # one after the other since joining, the last one still held
+    for employee in employees:
+        count = rng.randint(0, roles * 2)
+        held_since = employee.date_of_joining
+        for n in range(count):
+            relieved = held_since + datetime.timedelta(days=rng.randint(180, 3 * 365))
+            last = n == count - 1 or relieved >= now.date()
+            yield EmployeeRoleAssignment(
+                emp_id=employee, role_id=rng.choice(role_rows), assigned_date=held_since,
+                relieved_date=None if last else relieved, mode=rng.choice(('online', 'offline')),
+            )
+            if last:
+                break
+            held_since = relieved
+
+
+def dataset_size():
+    return {
+        'employees': Employee.objects.count(),
+        'events': Event.objects.count(),
+        'participations': EventParticipation.objects.count(),
+        'role_assignments': EmployeeRoleAssignment.objects.count(),
+    }
+
+
+# ---- Running ---- #
+# name -> (who, method, expected status)
+SCENARIOS = {
+    'index': ('teacher', 'get', 302),
+    'teacher_dashboard': ('teacher', 'get', 200),
+    'admin_dashboard': ('admin', 'get', 200),
+    'principal_dashboard': ('principal', 'get', 200),
+    'teacher_details': ('principal', 'get', 200),
+    'manage_admin_employee': ('admin', 'get', 200),
+    'register_participation': ('teacher', 'post', 302),
+}
+
+
+class _Session:
+    """One simulated browser tab per role, for one benchmark thread."""
+
+    def __init__(self, teacher, admin, principal, rng):
+        self.clients = {}
+        for role, user in (('teacher', teacher), ('admin', admin), ('principal', principal)):
+            self.clients[role] = Client()
+            self.clients[role].force_login(user)
+        self.rng = rng
+        registered = EventParticipation.objects.filter(emp_id__user=teacher).values('event_id')
+        self.open_events = list(upcoming_events().exclude(pk__in=registered).values_list('pk', flat=True))
+
+    def request(self, scenario, detail_user_ids):
+        role, method, _ = SCENARIOS[scenario]
+        client = self.clients[role]
+        if scenario == 'teacher_details':
+            return client.get(reverse('teacher_details', args=[self.rng.choice(detail_user_ids)]))
+        if scenario == 'register_participation':
+            # a new event each time; once they run out the form answers "already registered" (200)
+            event = self.open_events.pop() if self.open_events else 0
+            return client.post(reverse('manage_event_participation'), {'event_id': event})
+        return getattr(client, method)(reverse(scenario))
+
+
+def run(scenarios=tuple(SCENARIOS), requests=200, concurrency=8, random_seed=0):
+    """
+    Send ``requests`` requests per scenario from ``concurrency`` threads, the
+    scenarios interleaved, and return the results as a JSON-ready dict.
+    """
+    rng = random.Random(random_seed)
+    teachers = list(
+        User.objects.filter(username__startswith=username('teacher'), employee__status='Active').order_by('pk')
+    )
+    admin = User.objects.filter(username=username('admin')).first()
+    principal = User.objects.filter(username=username('principal')).first()
+    if not teachers or admin is None or principal is None:
+        raise ValueError('No bench users in this database; run seed_bench first.')
+
+    detail_user_ids = [user.pk for user in rng.sample(teachers, min(100, len(teachers)))]
+    sessions = [
+        _Session(teacher, admin, principal, random.Random(rng.random()))
+        for teacher in rng.sample(teachers, min(concurrency, len(teachers)))
+    ]
+    close_old_connections()
+
+    plan = [scenario for _ in range(requests) for scenario in scenarios]
+    pending = list(reversed(plan))
+    samples = {scenario: [] for scenario in scenarios}  # (seconds, queries, ok)
+    lock = threading.Lock()
+    start = threading.Barrier(len(sessions))
+
+    def client_loop(session):
+        start.wait()
+        while True:
+            with lock:
+                if not pending:
+                    return
+                scenario = pending.pop()
+            began = time.perf_counter()
+            with CaptureQueriesContext(connections['default']) as queries:
+                try:
+                    status = session.request(scenario, detail_user_ids).status_code
+                except OperationalError:  # e.g. "database is locked"
+                    status = None
+                finally:
+                    close_old_connections()  # as the WSGI handler does after each request
+            took = time.perf_counter() - began
+            with lock:
+                samples[scenario].append((took, len(queries), status == SCENARIOS[scenario][2]))
+
+    threads = [threading.Thread(target=client_loop, args=(session,)) for session in sessions]
+    with override_settings(ALLOWED_HOSTS=['testserver']):  # the test clients' host
+        began = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - began
+
+    return {
+        'commit': _git_commit(),
+        'created_at': timezone.now().isoformat(),
+        'database': {'vendor': connections['default'].vendor, 'profile': getattr(settings, 'SPARKAPP_DB_PROFILE', '')},
+        'async_views': settings.SPARKAPP_ASYNC_VIEWS,
+        'dataset': dataset_size(),
+        'concurrency': len(sessions),
+        'requests': len(plan),
+        'seconds': round(elapsed, 3),
+        'throughput': round(len(plan) / elapsed, 1),
+        'scenarios': {scenario: summarize(samples[scenario], elapsed) for scenario in scenarios},
+    }
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of sorted ``values``."""
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, round(fraction * len(values)) - 1))]
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(seconds * 1000 for seconds, _, _ in samples)
+    queries = [count for _, count, _ in samples]
+    result = {
+        'requests': len(samples),
+        'errors': sum(1 for _, _, ok in samples if not ok),
+        'throughput': round(len(samples) / elapsed, 1) if elapsed else None,
+        'mean_ms': round(sum(latencies) / len(latencies), 2) if latencies else None,
+        'queries_mean': round(sum(queries) / len(queries), 1) if queries else None,
+        'queries_max': max(queries, default=None),
+    }
+    for name, fraction in (('p50', 0.5), ('p90', 0.9), ('p95', 0.95), ('p99', 0.99)):
+        value = percentile(latencies, fraction)
+        result[f'{name}_ms'] = None if value is None else round(value, 2)
+    return result
+
+
+def _git_commit():
+    try:
+        process = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                                 capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return process.stdout.strip() or None
@@ -0,0 +1,72 @@
+# sparkapp/caching.py
+#
+# Caching of the reference tables (departments, designations, event types,
+# venues, roles, events). They change a few times a term but are listed and
+# offered as form choices on almost every page.
+#
+# Every cached model has a version token in the cache. All cache keys built
+# for a model include its current token, and signals (sparkapp/signals.py)
+# replace the token whenever a row is saved or deleted, so stale entries are
+# never read again and simply expire.
+
+import datetime
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from .models import Department, Designation, Event, EventType, Role, Venue
+
+CACHED_MODELS = (Department, Designation, EventType, Venue, Role, Event)
+
+
+def cache_timeout():
+    """How long cached reference rows and template fragments are kept (SPARKAPP_REFERENCE_CACHE_TIMEOUT)."""
+    return getattr(settings, 'SPARKAPP_REFERENCE_CACHE_TIMEOUT', 60 * 60 * 24)
+
+
+def _version_key(model):
+    return f'sparkapp:model-version:{model._meta.label_lower}'
+
+
+def model_version(model):
+    """Current version token of ``model``, usable in any cache key."""
+    # A timestamp rather than a counter: if the token is evicted, a restarted
+    # counter could match entries written under the old "1".
+    return cache.get_or_set(_version_key(model), time.time_ns(), None)
+
+
+def bump_model_version(model):
+    cache.set(_version_key(model), time.time_ns(), None)
+
+
+def model_changed_at(model):
+    """
+    When ``model`` last changed, read from its version token. Never earlier
+    than the real change: a token recreated after eviction starts at "now".
+    """
+    return datetime.datetime.fromtimestamp(model_version(model) / 1e9, tz=datetime.timezone.utc)
+
+
+def model_cache_key(model, name):
+    return f'sparkapp:{model._meta.label_lower}:{model_version(model)}:{name}'
+
+
+def cached_objects(queryset, name=None):
+    """
+    The rows of ``queryset`` as a list, from the cache while the model is
+    unchanged. ``name`` tells the cached querysets of one model apart; it
+    defaults to a hash of the SQL.
+    """
+    if name is None:
+        name = hashlib.md5(str(queryset.query).encode()).hexdigest()
+    key = model_cache_key(queryset.model, name)
+    objects = cache.get(key)
+    if objects is None:
+        # Never from a read replica: rows that lag behind would be cached
+        # under the new version and stay stale until the next change.
+        objects = list(queryset.using(DEFAULT_DB_ALIAS))
+        cache.set(key, objects, cache_timeout())
+    return objects
@@ -0,0 +1,212 @@
+# sparkapp/calendar.py
+#
+# Events by time: the calendar feed, venue double-booking checks and the
+# "upcoming" list offered when registering for an event.
+#
+# Overlap with a window is  from_date < end AND to_date > start.  On its own
+# the first condition is an open-ended range (every event that ever started
+# before ``end``), so the query is also bounded below by the longest event
+# duration: an event that overlaps the window can't have started more than
+# that before ``start``. That turns it into a closed range scan on
+# event_dates_idx (from_date, to_date).
+
+import datetime
+import hashlib
+import heapq
+from itertools import groupby
+
+from django.core.cache import cache
+from django.db.models import DurationField, ExpressionWrapper, F, Max
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .caching import model_cache_key, model_changed_at, model_version
+from .models import Event, EventType, Venue
+
+WINDOWS = ('week', 'month', 'term')
+MAX_WINDOW = datetime.timedelta(days=400)
+# First month of each term; a term runs until the next one starts
+TERM_START_MONTHS = (1, 7)
+
+
+class WindowError(ValueError):
+    """The requested calendar window is missing or malformed."""
+
+
+# ---- Windows ---- #
+def _parse_moment(value, name):
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise WindowError(f'"{name}" must be a date (YYYY-MM-DD) or an ISO datetime.')
+        return _start_of_day(day)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def _month_start(day, offset=0):
+    month = day.month - 1 + offset
+    return day.replace(year=day.year + month // 12, month=month % 12 + 1, day=1)
+
+
+def window_for(view, day):
+    """(start, end) dates of the week / month / term containing ``day``."""
+    if view == 'week':
+        start = day - datetime.timedelta(days=day.weekday())
+        return start, start + datetime.timedelta(days=7)
+    if view == 'month':
+        return _month_start(day), _month_start(day, 1)
+    if view == 'term':
+        starts = [month for month in TERM_START_MONTHS if month <= day.month]
+        start = day.replace(month=starts[-1] if starts else TERM_START_MONTHS[-1], day=1)
+        if not starts:
+            start = start.replace(year=day.year - 1)
+        following = [month for month in TERM_START_MONTHS if month > start.month]
+        if following:
+            end = start.replace(month=following[0])
+        else:
+            end = start.replace(year=start.year + 1, month=TERM_START_MONTHS[0])
+        return start, end
+    raise WindowError(f'"view" must be one of {", ".join(WINDOWS)}.')
+
+
+def parse_window(params):
+    """
+    The window requested by the query parameters, as aware datetimes:
+    either ``start`` and ``end``, or ``view`` (week/month/term) around
+    ``date`` (today if missing).
+    """
+    if params.get('start') or params.get('end'):
+        if not (params.get('start') and params.get('end')):
+            raise WindowError('Give both "start" and "end".')
+        start = _parse_moment(params['start'], 'start')
+        end = _parse_moment(params['end'], 'end')
+    else:
+        day = timezone.localdate()
+        if params.get('date'):
+            day = parse_date(params['date'])
+            if day is None:
+                raise WindowError('"date" must be a date (YYYY-MM-DD).')
+        first, last = window_for(params.get('view', 'month'), day)
+        start, end = _start_of_day(first), _start_of_day(last)
+
+    if end <= start:
+        raise WindowError('"end" must be after "start".')
+    if end - start > MAX_WINDOW:
+        raise WindowError(f'The window can span at most {MAX_WINDOW.days} days.')
+    return start, end
+
+
+# ---- Queries ---- #
+def longest_event():
+    """Longest from_date -> to_date span of any event, cached until Event changes."""
+    key = model_cache_key(Event, 'longest-span')
+    span = cache.get(key)
+    if span is None:
+        span = Event.objects.aggregate(span=Max(ExpressionWrapper(
+            F('to_date') - F('from_date'), output_field=DurationField(),
+        )))['span'] or datetime.timedelta(0)
+        cache.set(key, span, 60 * 60 * 24)
+    return span
+
+
+def events_overlapping(start, end):
+    return (
+        Event.objects
+        .filter(from_date__gte=start - longest_event(), from_date__lt=end, to_date__gt=start)
+        .select_related('type_id', 'venue')
+        .order_by('from_date', 'id')
+    )
+
+
+def venue_conflicts(venue, start, end, exclude_pk=None):
+    """
+    Events booked at ``venue`` during start..end: a range seek on
+    event_venue_dates_idx (venue, from_date, to_date).
+
+    Bookings include both ends: events are entered as dates, so a one-day
+    event runs from midnight to the same midnight, and two events on the
+    same day clash even when one ends as the other starts.
+    """
+    events = Event.objects.filter(
+        venue=venue, from_date__gte=start - longest_event(), from_date__lte=end, to_date__gte=start,
+    ).order_by('from_date', 'id')
+    if exclude_pk is not None:
+        events = events.exclude(pk=exclude_pk)
+    return events
+
+
+def all_venue_conflicts():
+    """
+    Every pair of clashing events at the same venue (same rule as
+    venue_conflicts), over the whole history, as (venue_id, earlier, later)
+    with (id, title, from, to) tuples.
+
+    One pass over the events sorted by (venue, from_date): a heap keeps the
+    bookings still running, ordered by end. Each new booking first drops the
+    ones that ended before it starts, whatever is left clashes with it.
+    That's O(n log n + conflicts) instead of comparing every pair.
+    """
+    rows = (
+        Event.objects.order_by('venue_id', 'from_date', 'id')
+        .values_list('venue_id', 'id', 'title', 'from_date', 'to_date')
+        .iterator(chunk_size=2000)
+    )
+    for venue_id, bookings in groupby(rows, key=lambda row: row[0]):
+        running = []  # heap of (to_date, id, booking)
+        for _, *booking in bookings:
+            booking = tuple(booking)
+            event_id, _, starts, ends = booking
+            while running and running[0][0] < starts:
+                heapq.heappop(running)
+            for _, _, other in sorted(running, key=lambda item: (item[2][2], item[1])):
+                yield venue_id, other, booking
+            heapq.heappush(running, (ends, event_id, booking))
+
+
+def upcoming_events(now=None):
+    """
+    Events that haven't ended yet, soonest first. The cutoff is rounded down
+    to the hour so the SQL, and with it the cached choice list, stays the
+    same for an hour.
+    """
+    cutoff = (now or timezone.now()).replace(minute=0, second=0, microsecond=0)
+    return Event.objects.filter(to_date__gt=cutoff).order_by('from_date', 'id')
+
+
+# ---- Feed ---- #
+# The feed shows columns of these, a change to any of them changes the feed
+FEED_MODELS = (Event, EventType, Venue)
+
+
+def feed_changed_at():
+    return max(model_changed_at(model) for model in FEED_MODELS)
+
+
+def feed_etag(start, end):
+    versions = ':'.join(str(model_version(model)) for model in FEED_MODELS)
+    return hashlib.sha1(f'{versions}:{start.isoformat()}:{end.isoformat()}'.encode()).hexdigest()
+
+
+def feed(start, end):
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'events': [
+            {
+                'id': event.id,
+                'title': event.title,
+                'type': event.type_id.type_description,
+                'venue': event.venue.name,
+                'start': event.from_date.isoformat(),
+                'end': event.to_date.isoformat(),
+            }
+            for event in events_overlapping(start, end)
+        ],
+    }
@@ -1,12 +1,15 @@
 # attendance/context_processors.py
 
-from django.contrib.auth.models import Group
+from .roles import ADMIN, PRINCIPAL, TEACHER, get_user_roles
+
+# All three read the same memoized role set, so rendering a page costs at most
+# one group query per request (none once the role set is cached).
 
 def is_teacher(request):
-    return {'is_teacher': request.user.groups.filter(name='Teacher').exists()}
+    return {'is_teacher': TEACHER in get_user_roles(request.user)}
 
 def is_admin(request):
-    return {'is_admin': request.user.groups.filter(name='Admin').exists()}
+    return {'is_admin': ADMIN in get_user_roles(request.user)}
 
 def is_principal(request):
-    return {'is_principal': request.user.groups.filter(name='Principal').exists()}
\ No newline at end of file
+    return {'is_principal': PRINCIPAL in get_user_roles(request.user)}
@@ -0,0 +1,153 @@
+# sparkapp/documents.py
+#
+# Content-addressed storage for uploaded documents (role assignment and event
+# participation certificates). The same circular gets uploaded by dozens of
+# teachers, so every upload is stored once per content, as
+#
+#     blobs/<aa>/<sha-256 of the content><extension>
+#
+# and the rows pointing at a blob are counted on DocumentBlob.refs (kept by
+# signals, see sparkapp/signals.py). When the last row lets go of a blob, the
+# file is removed after the transaction commits.
+#
+# Uploads and the collector can race for the same blob: an upload of content
+# that is being collected. Both sides touch the DocumentBlob row first: an
+# upload bumps touched_at and only then checks that the file is there, the
+# collector deletes the row (if still unreferenced and untouched) and the
+# file in one transaction, so one of them always waits for the other.
+
+import hashlib
+import os
+import tempfile
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+BLOB_DIR = 'blobs'
+CHUNK_SIZE = 64 * 1024
+
+
+def _blob_model():
+    from .models import DocumentBlob
+    return DocumentBlob
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(BLOB_DIR + '/')
+
+
+def blob_name(digest, original_name):
+    extension = os.path.splitext(original_name)[1].lower()
+    return f'{BLOB_DIR}/{digest[:2]}/{digest}{extension}'
+
+
+@deconstructible
+class DocumentStorage(FileSystemStorage):
+    """
+    FileSystemStorage that names files by content. The name chosen by
+    upload_to only contributes its extension.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Same content, same name: nothing to make unique
+        return name
+
+    def _save(self, name, content):
+        directory = self.path(BLOB_DIR)
+        os.makedirs(directory, exist_ok=True)
+
+        if hasattr(content, 'temporary_file_path'):
+            # Already on disk (large multipart uploads, chunked uploads):
+            # hash it where it is and move it rather than copy it
+            source, owned = content.temporary_file_path(), False
+            digest, size = file_digest(source)
+        else:
+            # Hash while copying to a temporary file next to the blobs, so
+            # the upload is never held in memory and the final move is a rename.
+            (source, digest, size), owned = _spool(content, directory), True
+        try:
+            name = blob_name(digest, name)
+            touch(name, size)
+            path = self.path(name)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                file_move_safe(source, path, allow_overwrite=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(path, self.file_permissions_mode)
+        finally:
+            if owned and os.path.exists(source):
+                os.remove(source)
+        return name
+
+
+def _spool(content, directory):
+    digest = hashlib.sha256()
+    size = 0
+    handle, temporary = tempfile.mkstemp(dir=directory, prefix='.upload-')
+    try:
+        with os.fdopen(handle, 'wb') as target:
+            for chunk in content.chunks():
+                digest.update(chunk)
+                target.write(chunk)
+                size += len(chunk)
+    except BaseException:
+        os.remove(temporary)
+        raise
+    return temporary, digest.hexdigest(), size
+
+
+def file_digest(path):
+    """(sha-256 hex digest, size) of the file at ``path``, read in chunks."""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+document_storage = DocumentStorage()
+
+
+# ---- Reference counts ---- #
+def touch(name, size):
+    """Create the DocumentBlob row of ``name`` or mark it as just written."""
+    DocumentBlob = _blob_model()
+    DocumentBlob.objects.bulk_create(
+        [DocumentBlob(name=name, size=size, touched_at=timezone.now())],
+        update_conflicts=True, unique_fields=['name'], update_fields=['touched_at'],
+    )
+
+
+def acquire(name):
+    if is_blob(name):
+        _blob_model().objects.filter(name=name).update(refs=F('refs') + 1)
+
+
+def release(name):
+    """Drop one reference to ``name``; the blob goes once the last one is committed."""
+    if not is_blob(name):
+        return
+    released_at = timezone.now()
+    _blob_model().objects.filter(name=name, refs__gt=0).update(refs=F('refs') - 1)
+    transaction.on_commit(lambda: collect(name, released_at))
+
+
+def collect(name, before=None):
+    """
+    Remove the blob ``name`` if no row refers to it and no upload wrote it
+    since ``before``. Returns whether it was removed.
+    """
+    blobs = _blob_model().objects.filter(name=name, refs=0)
+    if before is not None:
+        blobs = blobs.filter(touched_at__lte=before)
+    with transaction.atomic():
+        deleted, _ = blobs.delete()
+        if deleted:
+            document_storage.delete(name)
+    return bool(deleted)
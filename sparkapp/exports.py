@@ -0,0 +1,187 @@
+# sparkapp/exports.py
+#
+# Participation and role-assignment reports.
+#
+# Rows are read with values_list() + iterator(chunk_size=...) and written
+# out as they arrive, so a multi-year export never builds model instances or
+# holds the whole result in memory. CSV is streamed; XLSX (needs openpyxl)
+# is written in openpyxl's write-only mode to a temporary file. Either can
+# also be written by a background task (write_report) for a later download.
+
+import csv
+import datetime
+import io
+import tempfile
+import uuid
+
+from django.core.files import File
+from django.db.models import Q
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from .models import Department, EmployeeRoleAssignment, EventParticipation, EventType
+from .tasks import result_storage, task
+
+try:
+    import openpyxl
+except ImportError:  # XLSX export is optional
+    openpyxl = None
+
+CHUNK_SIZE = 2000
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+PARTICIPATION_COLUMNS = (
+    ('Employee', 'emp_id__emp_name'),
+    ('Email', 'emp_id__email_id'),
+    ('Department', 'emp_id__dept_id__dept_name'),
+    ('Event', 'event_id__title'),
+    ('Event Type', 'event_id__type_id__type_description'),
+    ('From', 'event_id__from_date'),
+    ('To', 'event_id__to_date'),
+    ('Venue', 'event_id__venue__name'),
+    ('Role', 'role'),
+    ('Mode', 'mode'),
+)
+
+ROLE_ASSIGNMENT_COLUMNS = (
+    ('Employee', 'emp_id__emp_name'),
+    ('Email', 'emp_id__email_id'),
+    ('Department', 'emp_id__dept_id__dept_name'),
+    ('Role', 'role_id__role_name'),
+    ('Assigned', 'assigned_date'),
+    ('Relieved', 'relieved_date'),
+    ('Mode', 'mode'),
+)
+
+
+def participation_rows(filters):
+    queryset = EventParticipation.objects.all()
+    # events overlapping the period; compared as datetimes so the event date index is usable
+    if filters.get('from_date'):
+        queryset = queryset.filter(event_id__to_date__gte=_start_of_day(filters['from_date']))
+    if filters.get('to_date'):
+        queryset = queryset.filter(
+            event_id__from_date__lt=_start_of_day(filters['to_date'] + datetime.timedelta(days=1)))
+    if filters.get('department'):
+        queryset = queryset.filter(emp_id__dept_id=filters['department'])
+    if filters.get('event_type'):
+        queryset = queryset.filter(event_id__type_id=filters['event_type'])
+    if filters.get('mode'):
+        queryset = queryset.filter(mode__iexact=filters['mode'])
+    return _rows(queryset.order_by('event_id__from_date', 'pk'), PARTICIPATION_COLUMNS)
+
+
+def role_assignment_rows(filters):
+    queryset = EmployeeRoleAssignment.objects.all()
+    # assignments that were running at some point of the requested period
+    if filters.get('from_date'):
+        queryset = queryset.filter(Q(relieved_date__isnull=True) | Q(relieved_date__gte=filters['from_date']))
+    if filters.get('to_date'):
+        queryset = queryset.filter(assigned_date__lte=filters['to_date'])
+    if filters.get('department'):
+        queryset = queryset.filter(emp_id__dept_id=filters['department'])
+    if filters.get('mode'):
+        queryset = queryset.filter(mode__iexact=filters['mode'])
+    return _rows(queryset.order_by('assigned_date', 'pk'), ROLE_ASSIGNMENT_COLUMNS)
+
+
+# report -> (rows function, file name, sheet title)
+REPORTS = {
+    'participations': (participation_rows, 'event_participations', 'Participations'),
+    'role_assignments': (role_assignment_rows, 'role_assignments', 'Role Assignments'),
+}
+FILTER_MODELS = {'department': Department, 'event_type': EventType}
+
+
+def filters_to_json(filters):
+    """ReportFilterForm.cleaned_data as task arguments."""
+    data = {}
+    for name in ('from_date', 'to_date', 'department', 'event_type', 'mode'):
+        value = filters.get(name)
+        if isinstance(value, datetime.date):
+            value = value.isoformat()
+        elif name in FILTER_MODELS and value is not None:
+            value = value.pk
+        data[name] = value or None
+    return data
+
+
+def filters_from_json(data):
+    filters = dict(data)
+    for name in ('from_date', 'to_date'):
+        if filters.get(name):
+            filters[name] = datetime.date.fromisoformat(filters[name])
+    return filters
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def _rows(queryset, columns):
+    """Header row, then one tuple per row, fetched CHUNK_SIZE rows at a time."""
+    yield [title for title, _ in columns]
+    fields = [field for _, field in columns]
+    for row in queryset.values_list(*fields).iterator(chunk_size=CHUNK_SIZE):
+        yield [_cell(value) for value in row]
+
+
+def _cell(value):
+    if isinstance(value, datetime.datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.strftime('%Y-%m-%d %H:%M')
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return '' if value is None else value
+
+
+class _Echo:
+    # csv.writer wants a file; this one hands every line straight back
+    def write(self, value):
+        return value
+
+
+def csv_response(rows, filename):
+    writer = csv.writer(_Echo())
+    response = StreamingHttpResponse(
+        (writer.writerow(row) for row in rows), content_type='text/csv; charset=utf-8',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
+
+
+def _write_xlsx(rows, sheet_title, output):
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=sheet_title)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(output)
+
+
+def xlsx_response(rows, filename, sheet_title):
+    output = tempfile.TemporaryFile()  # removed when the response closes it
+    _write_xlsx(rows, sheet_title, output)
+    output.seek(0)
+    return FileResponse(
+        output, as_attachment=True, filename=f'{filename}.xlsx', content_type=XLSX_CONTENT_TYPE,
+    )
+
+
+@task(max_attempts=2)
+def write_report(report, filters, file_format):
+    """Task: write ``report`` to the tasks' private storage; returns the stored name and download name."""
+    rows_for, filename, sheet_title = REPORTS[report]
+    rows = rows_for(filters_from_json(filters))
+    extension = 'xlsx' if file_format == 'xlsx' and openpyxl is not None else 'csv'
+    with tempfile.TemporaryFile() as output:
+        if extension == 'xlsx':
+            _write_xlsx(rows, sheet_title, output)
+        else:
+            text = io.TextIOWrapper(output, encoding='utf-8', newline='')
+            csv.writer(text).writerows(rows)
+            text.detach()  # flushes, and leaves output open
+        output.seek(0)
+        # a name nobody can guess, the file is only served to the task's owner
+        name = result_storage().save(f'reports/{uuid.uuid4().hex}/{filename}.{extension}', File(output))
+    return {'file': name, 'filename': f'{filename}.{extension}'}
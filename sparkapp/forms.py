@@ -1,10 +1,54 @@
 from django import forms
 from django.contrib.auth.models import User
-from django.contrib.auth.forms import UserCreationForm
+from django.conf import settings
+from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
+from django.utils.timezone import localtime
 from .models import (
     Employee, Department, Designation, EventType, Venue, Role, 
     EmployeeRoleAssignment, Event, EventParticipation, AdminEmployee
 )
+from .caching import cached_objects
+from .calendar import upcoming_events, venue_conflicts
+
+
+### ---- Cached Choice Fields ---- ###
+class CachedModelChoiceIterator(forms.models.ModelChoiceIterator):
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        for obj in self.field.cached_choices():
+            yield self.choice(obj)
+
+    def __len__(self):
+        return len(self.field.cached_choices()) + (self.field.empty_label is not None)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(self.field.cached_choices())
+
+
+class CachedModelChoiceField(forms.ModelChoiceField):
+    """
+    ModelChoiceField for the reference tables: the options are rendered and
+    validated from the list cached by sparkapp.caching, so neither showing
+    nor submitting the form queries the table while it is unchanged.
+    """
+    iterator = CachedModelChoiceIterator
+
+    def cached_choices(self):
+        return cached_objects(self.queryset)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        key = self.to_field_name or 'pk'
+        if isinstance(value, self.queryset.model):
+            value = getattr(value, key)
+        for obj in self.cached_choices():
+            if str(getattr(obj, key)) == str(value):
+                return obj
+        raise forms.ValidationError(
+            self.error_messages['invalid_choice'], code='invalid_choice', params={'value': value},
+        )
 
 ### ---- Department & Designation Forms ---- ###
 class DepartmentForm(forms.ModelForm):
@@ -24,6 +68,22 @@ class DesignationForm(forms.ModelForm):
         }
 
 ### ---- User & Employee Forms ---- ###
+class LoginForm(AuthenticationForm):
+    error_messages = {
+        **AuthenticationForm.error_messages,
+        'throttled': "Too many failed logins. Please try again in %(minutes)s minutes.",
+    }
+
+    def get_invalid_login_error(self):
+        # set by sparkapp.throttle.ThrottledModelBackend
+        if getattr(self.request, 'login_throttled', False):
+            return forms.ValidationError(
+                self.error_messages['throttled'], code='throttled',
+                params={'minutes': settings.SPARKAPP_LOGIN_THROTTLE_WINDOW // 60},
+            )
+        return super().get_invalid_login_error()
+
+
 class UserForm(UserCreationForm):
     email = forms.EmailField(required=True)
 
@@ -78,10 +138,54 @@ class VenueForm(forms.ModelForm):
             'address': forms.Textarea(attrs={'class': 'form-control', 'placeholder': 'Enter Venue Address', 'rows': 3}),
         }
 
-class EventForm(forms.ModelForm):
+class VenueBookingMixin:
+    """
+    Rejects an event that ends before it starts, and warns when its venue is
+    already booked then. Venues such as "online" host parallel events, so
+    the warning can be confirmed with ``allow_double_booking``; clashes the
+    saved event already had don't count when it's edited.
+    """
+
+    def clean(self):
+        cleaned_data = super().clean()
+        venue, start, end = (cleaned_data.get(name) for name in ('venue', 'from_date', 'to_date'))
+        if not (venue and start and end):
+            return cleaned_data
+        if end < start:
+            self.add_error('to_date', "The event can't end before it starts.")
+            return cleaned_data
+        if cleaned_data.get('allow_double_booking'):
+            return cleaned_data
+
+        conflicts = venue_conflicts(venue, start, end, exclude_pk=self.instance.pk)
+        if self.instance.pk and self.instance.venue_id:
+            # the instance still holds the saved booking until _post_clean
+            conflicts = conflicts.exclude(pk__in=venue_conflicts(
+                self.instance.venue_id, self.instance.from_date, self.instance.to_date, exclude_pk=self.instance.pk,
+            ).values('pk'))
+        for event in conflicts[:3]:
+            self.add_error('venue', "%s is already booked for \"%s\" (%s to %s)." % (
+                venue.name, event.title,
+                localtime(event.from_date).strftime('%d %b %Y %H:%M'),
+                localtime(event.to_date).strftime('%d %b %Y %H:%M'),
+            ))
+        return cleaned_data
+
+
+def allow_double_booking_field():
+    return forms.BooleanField(
+        required=False, label="Book anyway",
+        help_text="Save even if the venue is already booked, e.g. for online events.",
+    )
+
+
+class EventForm(VenueBookingMixin, forms.ModelForm):
+    allow_double_booking = allow_double_booking_field()
+
     class Meta:
         model = Event
         fields = ['title', 'type_id', 'from_date', 'to_date', 'venue']
+        field_classes = {'type_id': CachedModelChoiceField, 'venue': CachedModelChoiceField}
         widgets = {
             'from_date': forms.DateInput(attrs={'type': 'date'}),
             'to_date': forms.DateInput(attrs={'type': 'date'}),
@@ -94,16 +198,42 @@ class EventParticipationForm(forms.ModelForm):
     class Meta:
         model = EventParticipation
         fields = ['event_id']  # Only show event and mode
+        field_classes = {'event_id': CachedModelChoiceField}
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-        # Optional: Customize dropdown if needed (e.g., filter only upcoming events)
-        self.fields['event_id'].queryset = Event.objects.all()  # or your filter
+        # Only events that haven't ended can be registered for
+        self.fields['event_id'].queryset = upcoming_events()
         self.fields['event_id'].label = "Select Event"
         #self.fields['mode'].label = "Mode (Online/Offline)"
 
 
+class BulkParticipationForm(forms.Form):
+    event = CachedModelChoiceField(queryset=Event.objects.none(), widget=forms.Select(attrs={'class': 'form-control'}))
+    department = CachedModelChoiceField(queryset=Department.objects.all(), required=False,
+                                          widget=forms.Select(attrs={'class': 'form-control'}))
+    designation = CachedModelChoiceField(queryset=Designation.objects.all(), required=False,
+                                           widget=forms.Select(attrs={'class': 'form-control'}))
+    file = forms.FileField(
+        label="Employee list (CSV / XLSX)", required=False,
+        help_text="A username column; the employees must also match the department and designation chosen.",
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,.xlsx'}),
+    )
+    role = forms.CharField(max_length=100, initial='Participant', widget=forms.TextInput(attrs={'class': 'form-control'}))
+    mode = forms.ChoiceField(choices=EventParticipation.MODE_CHOICES, widget=forms.Select(attrs={'class': 'form-control'}))
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['event'].queryset = upcoming_events()
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not any(cleaned_data.get(name) for name in ('department', 'designation', 'file')):
+            raise forms.ValidationError("Choose a department, a designation or upload a list of employees.")
+        return cleaned_data
+
+
 
 ### ---- Role Management Forms ---- ###
 class RoleForm(forms.ModelForm):
@@ -120,6 +250,7 @@ class EmployeeRoleAssignmentForm(forms.ModelForm):
     class Meta:
         model = EmployeeRoleAssignment
         fields = ['role_id', 'assigned_date', 'relieved_date', 'mode', 'document']
+        field_classes = {'role_id': CachedModelChoiceField}
         widgets = {
             'assigned_date': forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
             'relieved_date': forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
@@ -173,7 +304,7 @@ class EmployeeForm(forms.Form):
     
     emp_name = forms.CharField(label="Emp Name", max_length=100, required=True)
     email = forms.EmailField(label="Email ID", required=True, help_text="Enter a valid email address.")
-    dept_id = forms.ModelChoiceField(queryset=Department.objects.all(), required=True, label="Department")
+    dept_id = CachedModelChoiceField(queryset=Department.objects.all(), required=True, label="Department")
     username = forms.CharField(label="Username", max_length=100, required=True, help_text="Choose a unique username.")
     password = forms.CharField(label="Password", widget=forms.PasswordInput, required=True)
     status = forms.ChoiceField(choices=EMPLOYEE_STATUS_CHOICES, label="Status", required=True)
@@ -198,3 +329,38 @@ class EmployeeEditForm(forms.ModelForm):
             'adhar_no', 'dept_id', 'gender', 'DOB', 'date_of_joining', 
             'current_address', 'residential_address', 'status', 'designation_id'
         ]
+
+
+### ---- Bulk Onboarding Form ---- ###
+class EmployeeImportForm(forms.Form):
+    file = forms.FileField(
+        label="CSV / XLSX file",
+        help_text="Columns: username, password, emp_name, email, department, phone, gender "
+                  "(optional: designation, status, group, date_of_joining).",
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,.xlsx'}),
+    )
+    dry_run = forms.BooleanField(label="Validate only (don't create anything)", required=False)
+
+
+### ---- Report Export Form ---- ###
+class ReportFilterForm(forms.Form):
+    FORMAT_CHOICES = [('csv', 'CSV'), ('xlsx', 'Excel (XLSX)')]
+    MODE_CHOICES = [('', 'Any'), ('online', 'Online'), ('offline', 'Offline')]
+
+    from_date = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
+    to_date = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
+    department = CachedModelChoiceField(queryset=Department.objects.all(), required=False,
+                                          widget=forms.Select(attrs={'class': 'form-control'}))
+    event_type = CachedModelChoiceField(queryset=EventType.objects.all(), required=False,
+                                          label="Event type (participations only)",
+                                          widget=forms.Select(attrs={'class': 'form-control'}))
+    mode = forms.ChoiceField(choices=MODE_CHOICES, required=False, widget=forms.Select(attrs={'class': 'form-control'}))
+    format = forms.ChoiceField(choices=FORMAT_CHOICES, initial='csv', required=False, widget=forms.Select(attrs={'class': 'form-control'}))
+
+    def clean(self):
+        cleaned_data = super().clean()
+        from_date, to_date = cleaned_data.get('from_date'), cleaned_data.get('to_date')
+        if from_date and to_date and from_date > to_date:
+            raise forms.ValidationError("The start date must be before the end date.")
+        return cleaned_data
+
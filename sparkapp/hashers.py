@@ -0,0 +1,54 @@
+# sparkapp/hashers.py
+#
+# Django's password hashers with their cost taken from settings, so each
+# deployment can tune it to its hardware (manage.py calibrate_hasher
+# measures it) without a code change. SPARKAPP_PASSWORD_HASHER picks the
+# algorithm new hashes use. The algorithm names are Django's own, so the
+# existing hashes stay valid. On a successful login Django re-hashes a
+# password whose algorithm or cost isn't the preferred one.
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+def _cost(name, default):
+    value = getattr(settings, name, None)
+    return default if value is None else value
+
+
+class TunedPBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+
+    @property
+    def iterations(self):
+        return _cost('SPARKAPP_PBKDF2_ITERATIONS', hashers.PBKDF2PasswordHasher.iterations)
+
+
+class TunedScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    # Only a limit, not an allocation: high enough that hashes made with a
+    # larger work factor than the current one still verify
+    maxmem = 2 ** 30
+
+    @property
+    def work_factor(self):
+        return _cost('SPARKAPP_SCRYPT_WORK_FACTOR', hashers.ScryptPasswordHasher.work_factor)
+
+    @property
+    def parallelism(self):
+        return _cost('SPARKAPP_SCRYPT_PARALLELISM', hashers.ScryptPasswordHasher.parallelism)
+
+
+class TunedArgon2PasswordHasher(hashers.Argon2PasswordHasher):
+    # needs argon2-cffi; the library is only loaded when a hash is made or checked
+
+    @property
+    def time_cost(self):
+        return _cost('SPARKAPP_ARGON2_TIME_COST', hashers.Argon2PasswordHasher.time_cost)
+
+    @property
+    def memory_cost(self):
+        return _cost('SPARKAPP_ARGON2_MEMORY_COST', hashers.Argon2PasswordHasher.memory_cost)
+
+    @property
+    def parallelism(self):
+        return _cost('SPARKAPP_ARGON2_PARALLELISM', hashers.Argon2PasswordHasher.parallelism)
+
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.utils.timezone import localtime
+
+from sparkapp.calendar import all_venue_conflicts
+from sparkapp.models import Venue
+
+
+def _when(moment):
+    return localtime(moment).strftime('%Y-%m-%d %H:%M')
+
+
+class Command(BaseCommand):
+    help = (
+        'List every pair of events booked at the same venue at the same time, '
+        'over the whole event history, in one sorted pass over the events.'
+    )
+
+    def handle(self, *args, **options):
+        venues = dict(Venue.objects.values_list('pk', 'name'))
+        total = 0
+        current = None
+        for venue_id, (first_id, first, first_from, first_to), (second_id, second, second_from, second_to) \
+                in all_venue_conflicts():
+            if venue_id != current:
+                current = venue_id
+                self.stdout.write(self.style.MIGRATE_HEADING(venues.get(venue_id, f'Venue {venue_id}')))
+            self.stdout.write(
+                f'  #{first_id} {first} ({_when(first_from)} - {_when(first_to)})  clashes with  '
+                f'#{second_id} {second} ({_when(second_from)} - {_when(second_to)})'
+            )
+            total += 1
+
+        if total:
+            self.stdout.write(self.style.WARNING(f'{total} double booking(s) found.'))
+        else:
+            self.stdout.write(self.style.SUCCESS('No double bookings.'))
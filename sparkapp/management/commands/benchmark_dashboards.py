@@ -0,0 +1,196 @@
+import asyncio
+import datetime
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from sparkapp import analytics, timeline
+from sparkapp.models import (
+    Department, Designation, Employee, EmployeeRoleAssignment, Event,
+    EventParticipation, EventType, Role, Venue,
+)
+
+PATHS = ('wsgi', 'asgi')
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare p50/p99 latency of the dashboard pages served by the sync views '
+        'through the WSGI handler and by the async views through the ASGI handler, '
+        'under the same number of concurrent clients, on a scratch SQLite database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=16, help='requests in flight at once')
+        parser.add_argument('--requests', type=int, default=800, help='requests per path')
+        parser.add_argument('--teachers', type=int, default=300)
+        parser.add_argument('--events', type=int, default=200)
+        parser.add_argument('--path', choices=PATHS, action='append', help='path(s) to run (default: both)')
+        parser.add_argument('--worker', action='store_true', help='internal: run one path in this process')
+
+    def handle(self, *args, **options):
+        if options['worker']:
+            self.stdout.write(json.dumps(self.run_worker(options)))
+            return
+        if connections['default'].vendor != 'sqlite':
+            raise CommandError('benchmark_dashboards only supports SQLite.')
+
+        # The URLconf picks sync or async views once, at startup
+        # (SPARKAPP_ASYNC_VIEWS), so every path runs in a fresh process.
+        results = {}
+        for path in options['path'] or PATHS:
+            self.stdout.write(f'Running the {path} path...')
+            with tempfile.TemporaryDirectory() as tmp:
+                env = dict(
+                    os.environ,
+                    SPARKAPP_ASYNC_VIEWS='1' if path == 'asgi' else '',
+                    SPARKAPP_DB_NAME=os.path.join(tmp, 'benchmark.sqlite3'),
+                )
+                command = [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'benchmark_dashboards', '--worker']
+                for name in ('concurrency', 'requests', 'teachers', 'events'):
+                    command += [f'--{name}', str(options[name])]
+                process = subprocess.run(command + ['--path', path], env=env, capture_output=True, text=True)
+            if process.returncode:
+                raise CommandError(f'The {path} run failed:\n{process.stderr}')
+            results[path] = json.loads(process.stdout.strip().splitlines()[-1])
+
+        self.stdout.write('')
+        self.stdout.write(f'{"path":<6}{"page":<22}{"p50 ms":>9}{"p99 ms":>9}')
+        for path, result in results.items():
+            for page, timings in result['pages'].items():
+                self.stdout.write(f'{path:<6}{page:<22}{timings["p50_ms"]:>9.1f}{timings["p99_ms"]:>9.1f}')
+            self.stdout.write(f'{path:<6}{"(all) req/s":<22}{result["throughput"]:>9.1f}')
+
+    # ---- Worker ---- #
+    def run_worker(self, options):
+        call_command('migrate', verbosity=0, interactive=False)
+        user, teacher = self.seed(options['teachers'], options['events'])
+        pages = {
+            'principal_dashboard': reverse('principal_dashboard'),
+            'teacher_details': reverse('teacher_details', args=[teacher.pk]),
+            'teacher_dashboard': reverse('teacher_dashboard'),
+            'admin_dashboard': reverse('admin_dashboard'),
+        }
+        plan = [list(pages.items())[i % len(pages)] for i in range(options['requests'])]
+
+        with override_settings(ALLOWED_HOSTS=['testserver']):  # the test clients' host
+            if options['path'][0] == 'asgi':
+                timings, elapsed = asyncio.run(self.run_asgi(user, plan, options['concurrency']))
+            else:
+                timings, elapsed = self.run_wsgi(user, plan, options['concurrency'])
+
+        result = {'throughput': len(plan) / elapsed, 'pages': {}}
+        for page in pages:
+            latencies = sorted(timings[page])
+            result['pages'][page] = {
+                'p50_ms': latencies[len(latencies) // 2] * 1000,
+                'p99_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+            }
+        return result
+
+    def run_wsgi(self, user, plan, concurrency):
+        timings = {page: [] for page, _ in plan}
+        pending = list(reversed(plan))
+        lock = threading.Lock()
+
+        def client_loop():
+            client = Client()
+            client.force_login(user)
+            while True:
+                with lock:
+                    if not pending:
+                        break
+                    page, url = pending.pop()
+                began = time.perf_counter()
+                response = client.get(url)
+                close_old_connections()  # as the WSGI handler does after each request
+                took = time.perf_counter() - began
+                if response.status_code != 200:
+                    raise RuntimeError(f'{url} returned {response.status_code}')
+                with lock:
+                    timings[page].append(took)
+
+        threads = [threading.Thread(target=client_loop) for _ in range(concurrency)]
+        began = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return timings, time.perf_counter() - began
+
+    async def run_asgi(self, user, plan, concurrency):
+        timings = {page: [] for page, _ in plan}
+        pending = list(reversed(plan))
+
+        async def client_loop():
+            client = AsyncClient()
+            await client.aforce_login(user)
+            while pending:
+                page, url = pending.pop()
+                began = time.perf_counter()
+                response = await client.get(url)
+                took = time.perf_counter() - began
+                if response.status_code != 200:
+                    raise RuntimeError(f'{url} returned {response.status_code}')
+                timings[page].append(took)
+
+        began = time.perf_counter()
+        await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+        return timings, time.perf_counter() - began
+
+    def seed(self, teachers, events):
+        groups = {name: Group.objects.create(name=name) for name in ('Admin', 'Teacher', 'Principal')}
+        departments = Department.objects.bulk_create([Department(dept_name=f'Department {i}') for i in range(8)])
+        designations = Designation.objects.bulk_create([Designation(designation_name=f'Designation {i}') for i in range(4)])
+        event_types = EventType.objects.bulk_create([EventType(type_description=f'Type {i}') for i in range(5)])
+        venues = Venue.objects.bulk_create([Venue(name=f'Hall {i}', address='Campus') for i in range(5)])
+        roles = Role.objects.bulk_create([Role(role_name=f'Role {i}', role_description='') for i in range(6)])
+
+        start = timezone.now() - datetime.timedelta(days=365)
+        event_rows = Event.objects.bulk_create([
+            Event(title=f'Event {i}', type_id=event_types[i % 5], venue=venues[i % 5],
+                  from_date=start + datetime.timedelta(days=i), to_date=start + datetime.timedelta(days=i, hours=3))
+            for i in range(events)
+        ])
+        users = User.objects.bulk_create([
+            User(username=f'bench{i}', email=f'bench{i}@example.com', password='!') for i in range(teachers)
+        ])
+        User.groups.through.objects.bulk_create([
+            User.groups.through(user_id=user.pk, group_id=groups['Teacher'].pk) for user in users
+        ])
+        employees = Employee.objects.bulk_create([
+            Employee(user=user, emp_name=f'Teacher {i:04d}', email_id=user.email, phn_no='9876543210',
+                     dept_id=departments[i % 8], designation_id=designations[i % 4], gender='Other', status='Active')
+            for i, user in enumerate(users)
+        ])
+        EventParticipation.objects.bulk_create([
+            EventParticipation(emp_id=employee, event_id=event_rows[(i + j) % events], role='Participant', mode='Online')
+            for i, employee in enumerate(employees)
+            for j in range(min(10, events))
+        ])
+        EmployeeRoleAssignment.objects.bulk_create([
+            EmployeeRoleAssignment(emp_id=employee, role_id=roles[(i + j) % 6], mode='offline',
+                                   assigned_date=datetime.date(2020 + j, 6, 1))
+            for i, employee in enumerate(employees)
+            for j in range(3)
+        ])
+        analytics.rebuild()
+        timeline.rebuild()
+
+        # one user in every group, so it can open all four pages
+        user = users[0]
+        user.groups.add(groups['Admin'], groups['Principal'])
+        return user, user
@@ -0,0 +1,167 @@
+import importlib.util
+import itertools
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+from django.test import Client, override_settings
+from django.urls import reverse
+
+PASSWORD = 'bench-pass-123'
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulate a credential-stuffing burst (wrong passwords from a few addresses) '
+        'mixed with real logins, per password hasher policy, with and without login '
+        'throttling, and report the CPU spent per login attempt and how many '
+        'passwords were hashed. Runs on a scratch SQLite database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hasher', choices=list(settings.PASSWORD_HASHER_CLASSES), action='append',
+                            help='hasher policy to run (default: every one that is installed)')
+        parser.add_argument('--attempts', type=int, default=300, help='attacker attempts (default: 300)')
+        parser.add_argument('--attacker-ips', type=int, default=2, help='addresses the attack comes from (default: 2)')
+        parser.add_argument('--logins', type=int, default=40, help='real users logging in meanwhile (default: 40)')
+        parser.add_argument('--concurrency', type=int, default=8, help='requests in flight at once (default: 8)')
+        parser.add_argument('--worker', action='store_true', help='internal: run one policy in this process')
+
+    def handle(self, *args, **options):
+        if options['worker']:
+            self.stdout.write(json.dumps(self.run_worker(options)))
+            return
+        if connections['default'].vendor != 'sqlite':
+            raise CommandError('benchmark_logins only supports SQLite.')
+
+        hashers = options['hasher'] or [
+            name for name in settings.PASSWORD_HASHER_CLASSES
+            if name != 'argon2' or importlib.util.find_spec('argon2') is not None
+        ]
+        # The hasher policy is read once, at startup: a fresh process each
+        results = {}
+        for hasher in hashers:
+            self.stdout.write(f'Running the {hasher} policy...')
+            with tempfile.TemporaryDirectory() as tmp:
+                env = dict(os.environ, SPARKAPP_PASSWORD_HASHER=hasher,
+                           SPARKAPP_DB_NAME=os.path.join(tmp, 'benchmark.sqlite3'))
+                command = [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'benchmark_logins', '--worker']
+                for name in ('attempts', 'attacker_ips', 'logins', 'concurrency'):
+                    command += [f'--{name.replace("_", "-")}', str(options[name])]
+                process = subprocess.run(command, env=env, capture_output=True, text=True)
+            if process.returncode:
+                raise CommandError(f'The {hasher} run failed:\n{process.stderr}')
+            results[hasher] = json.loads(process.stdout.strip().splitlines()[-1])
+
+        self.stdout.write('')
+        self.stdout.write(f'{"hasher":<8}{"throttle":<10}{"hashes":>8}{"refused":>9}{"CPU ms/try":>12}'
+                          f'{"CPU s":>8}{"logins ok":>11}{"login p95 ms":>14}')
+        for hasher, runs in results.items():
+            for throttle, run in runs.items():
+                self.stdout.write(
+                    f'{hasher:<8}{throttle:<10}{run["hashes"]:>8}{run["refused"]:>9}{run["cpu_ms_per_attempt"]:>12.1f}'
+                    f'{run["cpu_seconds"]:>8.1f}{run["logins_ok"]:>7}/{run["logins"]:<3}{run["login_p95_ms"]:>14.1f}'
+                )
+
+    # ---- Worker ---- #
+    def run_worker(self, options):
+        call_command('migrate', verbosity=0, interactive=False)
+        password = make_password(PASSWORD)
+        users = User.objects.bulk_create([
+            User(username=f'bench{i}', email=f'bench{i}@example.com', password=password)
+            for i in range(max(options['logins'], 1))
+        ])
+        close_old_connections()
+
+        # attackers cycle through real and made-up usernames; real logins come from their own addresses
+        attack = [
+            (f'bench{i % len(users)}' if i % 3 else f'nobody{i}', 'wrong-password', f'10.0.0.{i % options["attacker_ips"] + 1}')
+            for i in range(options['attempts'])
+        ]
+        logins = [(user.username, PASSWORD, f'192.168.0.{i % 250 + 1}') for i, user in enumerate(users)]
+        plan = list(attack)
+        step = max(1, len(attack) // max(len(logins), 1))
+        for n, login in enumerate(logins[:options['logins']]):
+            plan.insert(n * (step + 1), ('login',) + login)
+
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            off = self.burst(plan, options['concurrency'], SPARKAPP_LOGIN_THROTTLE_PER_USERNAME=0,
+                             SPARKAPP_LOGIN_THROTTLE_PER_IP=0, SPARKAPP_LOGIN_SLOWDOWN_PER_USERNAME=0)
+            on = self.burst(plan, options['concurrency'])
+        return {'off': off, 'on': on}
+
+    def burst(self, plan, concurrency, **throttle):
+        cache.clear()
+        url = reverse('login')
+        hasher_class = type(get_hasher())
+        encode = hasher_class.encode
+        hashes = itertools.count()
+
+        def counting_encode(hasher, *args, **kwargs):
+            next(hashes)
+            return encode(hasher, *args, **kwargs)
+
+        pending = list(reversed(plan))
+        lock = threading.Lock()
+        outcome = {'refused': 0, 'logins_ok': 0}
+        login_timings = []
+
+        def client_loop():
+            client = Client()
+            while True:
+                with lock:
+                    if not pending:
+                        return
+                    item = pending.pop()
+                real = item[0] == 'login'
+                username, password, ip = item[1:] if real else item
+                began = time.perf_counter()
+                response = client.post(url, {'username': username, 'password': password}, REMOTE_ADDR=ip)
+                close_old_connections()
+                took = time.perf_counter() - began
+                with lock:
+                    if response.status_code == 200 and b'Too many failed logins' in response.content:
+                        outcome['refused'] += 1
+                    if real:
+                        login_timings.append(took)
+                        outcome['logins_ok'] += response.status_code == 302
+                if real:
+                    client.cookies.clear()
+
+        threads = [threading.Thread(target=client_loop) for _ in range(concurrency)]
+        with override_settings(**throttle), mock.patch.object(hasher_class, 'encode', counting_encode):
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            began = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - began
+            after = resource.getrusage(resource.RUSAGE_SELF)
+
+        cpu = (after.ru_utime - usage.ru_utime) + (after.ru_stime - usage.ru_stime)
+        login_timings.sort()
+        return dict(
+            outcome,
+            attempts=len(plan),
+            logins=len(login_timings),
+            hashes=next(hashes),
+            seconds=elapsed,
+            cpu_seconds=cpu,
+            cpu_ms_per_attempt=cpu / len(plan) * 1000,
+            login_p95_ms=login_timings[min(len(login_timings) - 1, int(len(login_timings) * 0.95))] * 1000
+            if login_timings else 0,
+        )
@@ -0,0 +1,84 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from sparkapp.hashers import TunedArgon2PasswordHasher, TunedPBKDF2PasswordHasher, TunedScryptPasswordHasher
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure how long one password hash takes on this machine and suggest the '
+        'cost settings (environment variables) that bring it closest to a target '
+        'time without going over. Run it on the production hardware.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--algorithm', choices=list(settings.PASSWORD_HASHER_CLASSES),
+                            default=settings.SPARKAPP_PASSWORD_HASHER)
+        parser.add_argument('--target-ms', type=float, default=250, help='time one login may spend hashing (default: 250)')
+
+    def handle(self, *args, **options):
+        target = options['target_ms'] / 1000
+        algorithm = options['algorithm']
+        try:
+            suggestion, took = getattr(self, f'calibrate_{algorithm}')(target)
+        except (ImportError, ValueError) as exc:
+            raise CommandError(f'Cannot hash with {algorithm}: {exc}')
+
+        if took > target:
+            self.stderr.write(f'Even the lowest cost tried is over {options["target_ms"]:.0f} ms on this machine.')
+        self.stdout.write(f'One {algorithm} hash takes {took * 1000:.0f} ms with:')
+        self.stdout.write(f'SPARKAPP_PASSWORD_HASHER={algorithm}')
+        for name, value in suggestion.items():
+            self.stdout.write(f'{name}={value}')
+
+    def timed(self, hasher_class, **costs):
+        with override_settings(**costs):
+            hasher = hasher_class()
+            timings = []
+            for _ in range(3):
+                began = time.perf_counter()
+                hasher.encode('correct horse battery staple', hasher.salt())
+                timings.append(time.perf_counter() - began)
+        return statistics.median(timings)
+
+    def calibrate_pbkdf2(self, target):
+        # linear in the iterations
+        probe = 100_000
+        took = self.timed(TunedPBKDF2PasswordHasher, SPARKAPP_PBKDF2_ITERATIONS=probe)
+        iterations = max(probe, int(probe * target / took) // 10_000 * 10_000)
+        return {'SPARKAPP_PBKDF2_ITERATIONS': iterations}, self.timed(
+            TunedPBKDF2PasswordHasher, SPARKAPP_PBKDF2_ITERATIONS=iterations)
+
+    def largest_within(self, target, hasher_class, costs, name, values):
+        """The largest of ``values`` for the setting ``name`` hashing within ``target``, at least the first."""
+        best = None
+        for value in values:
+            took = self.timed(hasher_class, **costs, **{name: value})
+            if best is None or took <= target:
+                best = value, took
+            if took > target:
+                break
+        return best
+
+    def calibrate_scrypt(self, target):
+        # the work factor must be a power of two
+        costs = {'SPARKAPP_SCRYPT_PARALLELISM': settings.SPARKAPP_SCRYPT_PARALLELISM
+                 or hashers.ScryptPasswordHasher.parallelism}
+        work_factor, took = self.largest_within(
+            target, TunedScryptPasswordHasher, costs, 'SPARKAPP_SCRYPT_WORK_FACTOR', [2 ** n for n in range(14, 23)])
+        return {'SPARKAPP_SCRYPT_WORK_FACTOR': work_factor, **costs}, took
+
+    def calibrate_argon2(self, target):
+        # the memory is what makes guessing expensive for an attacker: keep it, add passes
+        costs = {
+            'SPARKAPP_ARGON2_MEMORY_COST': settings.SPARKAPP_ARGON2_MEMORY_COST or hashers.Argon2PasswordHasher.memory_cost,
+            'SPARKAPP_ARGON2_PARALLELISM': settings.SPARKAPP_ARGON2_PARALLELISM or hashers.Argon2PasswordHasher.parallelism,
+        }
+        time_cost, took = self.largest_within(
+            target, TunedArgon2PasswordHasher, costs, 'SPARKAPP_ARGON2_TIME_COST', range(1, 11))
+        return {'SPARKAPP_ARGON2_TIME_COST': time_cost, **costs}, took
@@ -0,0 +1,107 @@
+import datetime
+import os
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from sparkapp import documents, uploads
+from sparkapp.documents import BLOB_DIR, document_storage
+from sparkapp.models import DocumentBlob, EmployeeRoleAssignment, EventParticipation
+
+DOCUMENT_FIELDS = ((EmployeeRoleAssignment, 'document'), (EventParticipation, 'doc_link'))
+
+
+class Command(BaseCommand):
+    help = (
+        'Recount the references to every stored document blob and remove the '
+        'unreferenced ones, and drop chunked uploads that were never finished. '
+        'Blobs only go stale after changes that bypass signals (bulk_create, '
+        'queryset.update(), raw SQL) or uploads that were rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--legacy', action='store_true',
+            help='first move documents stored under their upload name into the blob store',
+        )
+        parser.add_argument(
+            '--grace', type=int, default=60,
+            help='minutes an unreferenced blob is kept after it was written (default: 60), '
+                 'so uploads still being saved are left alone',
+        )
+
+    def handle(self, *args, **options):
+        if options['legacy']:
+            self.move_legacy_documents()
+        self.recount()
+        removed, freed = self.sweep(timezone.now() - datetime.timedelta(minutes=options['grace']))
+        abandoned = 0
+        for upload in uploads.expired():
+            uploads.discard(upload)
+            abandoned += 1
+        if abandoned:
+            self.stdout.write(f'{abandoned} unfinished upload(s) dropped.')
+        self.stdout.write(self.style.SUCCESS(
+            f'{DocumentBlob.objects.count()} blob(s) kept, {removed} removed ({freed} bytes freed).'
+        ))
+
+    def referenced(self):
+        counts = Counter()
+        for model, field in DOCUMENT_FIELDS:
+            counts.update(
+                model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+                .values_list(field, flat=True).iterator()
+            )
+        return counts
+
+    def move_legacy_documents(self):
+        moved = 0
+        for name in self.referenced():
+            if documents.is_blob(name):
+                continue
+            if not document_storage.exists(name):
+                self.stderr.write(f'Missing file, left as is: {name}')
+                continue
+            with document_storage.open(name, 'rb') as original:
+                blob = document_storage.save(name, original)
+            # update(): the reference counts are redone by recount()
+            for model, field in DOCUMENT_FIELDS:
+                model.objects.filter(**{field: name}).update(**{field: blob})
+            document_storage.delete(name)
+            moved += 1
+        self.stdout.write(f'{moved} legacy document(s) moved into the blob store.')
+
+    def recount(self):
+        counts = {name: refs for name, refs in self.referenced().items() if documents.is_blob(name)}
+        for name in counts.keys() - set(DocumentBlob.objects.filter(name__in=counts).values_list('name', flat=True)):
+            if document_storage.exists(name):
+                documents.touch(name, document_storage.size(name))
+            else:
+                self.stderr.write(f'Missing blob: {name}')
+
+        for blob in DocumentBlob.objects.iterator():
+            refs = counts.get(blob.name, 0)
+            if blob.refs != refs:
+                DocumentBlob.objects.filter(pk=blob.pk).update(refs=refs)
+
+    def sweep(self, before):
+        removed = freed = 0
+        for name, size in DocumentBlob.objects.filter(refs=0, touched_at__lte=before).values_list('name', 'size'):
+            if documents.collect(name, before):
+                removed += 1
+                freed += size
+
+        # Files without a row: leftovers of interrupted uploads
+        known = set(DocumentBlob.objects.values_list('name', flat=True))
+        root = document_storage.path(BLOB_DIR)
+        for directory, _, files in os.walk(root):
+            for file_name in files:
+                path = os.path.join(directory, file_name)
+                name = os.path.relpath(path, document_storage.location).replace(os.sep, '/')
+                modified = datetime.datetime.fromtimestamp(os.path.getmtime(path), datetime.timezone.utc)
+                if name not in known and modified <= before:
+                    freed += os.path.getsize(path)
+                    os.remove(path)
+                    removed += 1
+        return removed, freed
@@ -0,0 +1,165 @@
+import datetime
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.migrations.executor import MigrationExecutor
+from django.utils import timezone
+
+BEFORE = '0003_employeesearchtoken'
+AFTER = '0004_hot_path_indexes'
+
+
+def hot_queries(apps, sample):
+    """The lookups the indexes in 0004_hot_path_indexes were added for."""
+    Employee = apps.get_model('sparkapp', 'Employee')
+    EmployeeRoleAssignment = apps.get_model('sparkapp', 'EmployeeRoleAssignment')
+    Event = apps.get_model('sparkapp', 'Event')
+    EventParticipation = apps.get_model('sparkapp', 'EventParticipation')
+
+    start = sample['window_start']
+    end = start + datetime.timedelta(days=31)
+    return [
+        ('participation (emp_id, event_id)',
+         EventParticipation.objects.filter(emp_id=sample['employee'], event_id=sample['event'])),
+        ('role assignments of an employee by assigned_date',
+         EmployeeRoleAssignment.objects.filter(emp_id=sample['employee']).order_by('-assigned_date')),
+        ('events overlapping a month',
+         Event.objects.filter(from_date__lt=end, to_date__gt=start).order_by('from_date')),
+        ('active employees of a department',
+         Employee.objects.filter(dept_id=sample['department'], status='Active')),
+        ('employee directory ordered by name',
+         Employee.objects.order_by('emp_name')[:25]),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed two scratch in-memory databases, one migrated to before and one to '
+        'after the hot-path indexes, and print EXPLAIN QUERY PLAN and timings '
+        'of the hot lookups on both.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--employees', type=int, default=2000)
+        parser.add_argument('--events', type=int, default=5000)
+        parser.add_argument('--participations', type=int, default=20, help='per employee')
+        parser.add_argument('--roles', type=int, default=5, help='role assignments per employee')
+        parser.add_argument('--repeat', type=int, default=50, help='executions timed per query')
+        parser.add_argument('--before', default=BEFORE, help='sparkapp migration for the "before" plans')
+        parser.add_argument('--after', default=AFTER, help='sparkapp migration for the "after" plans')
+
+    def handle(self, *args, **options):
+        if connections['default'].vendor != 'sqlite':
+            raise CommandError('explain_indexes only supports SQLite (EXPLAIN QUERY PLAN).')
+
+        for label, migration in (('before', options['before']), ('after', options['after'])):
+            alias = f'explain_{label}'
+            self.stdout.write(self.style.MIGRATE_HEADING(f'== {label}: sparkapp.{migration} =='))
+            self.open_scratch_database(alias)
+            try:
+                apps = self.migrate(alias, migration)
+                sample = self.seed(apps, alias, options)
+                for title, queryset in hot_queries(apps, sample):
+                    queryset = queryset.using(alias)
+                    elapsed = self.time(queryset, options['repeat'])
+                    self.stdout.write(f'\n{title}  ({elapsed:.3f} ms avg)')
+                    for line in queryset.explain().splitlines():
+                        self.stdout.write(f'    {line}')
+                self.stdout.write('')
+            finally:
+                self.close_scratch_database(alias)
+
+    def open_scratch_database(self, alias):
+        settings_dict = dict(connections['default'].settings_dict)
+        settings_dict['NAME'] = ':memory:'
+        connections.settings[alias] = settings_dict
+
+    def close_scratch_database(self, alias):
+        connections[alias].close()
+        del connections[alias]
+        del connections.settings[alias]
+
+    def migrate(self, alias, migration):
+        executor = MigrationExecutor(connections[alias])
+        target = [('sparkapp', migration)]
+        if ('sparkapp', migration) not in executor.loader.graph.nodes:
+            raise CommandError(f'Unknown migration sparkapp.{migration}')
+        executor.migrate(target)
+        return executor.loader.project_state(target).apps
+
+    def seed(self, apps, alias, options):
+        rng = random.Random(42)  # identical data for both databases
+        User = apps.get_model('auth', 'User')
+        Department = apps.get_model('sparkapp', 'Department')
+        Designation = apps.get_model('sparkapp', 'Designation')
+        Employee = apps.get_model('sparkapp', 'Employee')
+        EventType = apps.get_model('sparkapp', 'EventType')
+        Venue = apps.get_model('sparkapp', 'Venue')
+        Role = apps.get_model('sparkapp', 'Role')
+        Event = apps.get_model('sparkapp', 'Event')
+        EventParticipation = apps.get_model('sparkapp', 'EventParticipation')
+        EmployeeRoleAssignment = apps.get_model('sparkapp', 'EmployeeRoleAssignment')
+
+        def create(model, rows):
+            return model.objects.using(alias).bulk_create(rows, batch_size=500)
+
+        departments = create(Department, [Department(dept_name=f'Department {i}') for i in range(20)])
+        designations = create(Designation, [Designation(designation_name=f'Designation {i}') for i in range(6)])
+        event_types = create(EventType, [EventType(type_description=f'Type {i}') for i in range(8)])
+        venues = create(Venue, [Venue(name=f'Venue {i}', address='Campus') for i in range(30)])
+        roles = create(Role, [Role(role_name=f'Role {i}', role_description='') for i in range(15)])
+
+        users = create(User, [
+            User(username=f'user{i}', email=f'user{i}@example.com', password='!')
+            for i in range(options['employees'])
+        ])
+        employees = create(Employee, [
+            Employee(
+                user=user, emp_name=f'Employee {rng.randrange(10 ** 6):06d}',
+                email_id=user.email, phn_no='9876543210',
+                dept_id=rng.choice(departments), designation_id=rng.choice(designations),
+                gender='Other', status=rng.choice(['Active', 'Active', 'Active', 'Inactive']),
+            )
+            for user in users
+        ])
+
+        first_day = timezone.now() - datetime.timedelta(days=365 * 10)
+        events = []
+        for i in range(options['events']):
+            start = first_day + datetime.timedelta(hours=rng.randrange(24 * 365 * 10))
+            events.append(Event(
+                title=f'Event {i}', type_id=rng.choice(event_types), venue=rng.choice(venues),
+                from_date=start, to_date=start + datetime.timedelta(hours=rng.randrange(1, 72)),
+            ))
+        events = create(Event, events)
+
+        per_employee = min(options['participations'], len(events))
+        create(EventParticipation, [
+            EventParticipation(emp_id=employee, event_id=event, role='Participant', mode='Online')
+            for employee in employees
+            for event in rng.sample(events, per_employee)
+        ])
+        create(EmployeeRoleAssignment, [
+            EmployeeRoleAssignment(
+                emp_id=employee, role_id=rng.choice(roles), mode='offline',
+                assigned_date=(first_day + datetime.timedelta(days=rng.randrange(3650))).date(),
+            )
+            for employee in employees
+            for _ in range(options['roles'])
+        ])
+
+        connections[alias].cursor().execute('ANALYZE')
+        return {
+            'employee': employees[len(employees) // 2].pk,
+            'event': events[len(events) // 2].pk,
+            'department': departments[0].pk,
+            'window_start': events[len(events) // 2].from_date,
+        }
+
+    def time(self, queryset, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            list(queryset.all())
+        return (time.perf_counter() - started) * 1000 / max(repeat, 1)
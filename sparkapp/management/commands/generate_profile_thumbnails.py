@@ -0,0 +1,66 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+
+from sparkapp.models import Employee
+from sparkapp.thumbnails import generate_variants, save_hash, variants_exist
+
+
+def _init_worker():
+    # Needed when worker processes are spawned rather than forked
+    django.setup()
+
+
+def _generate(pk, user_id, name):
+    return pk, user_id, name, generate_variants(name)
+
+
+class Command(BaseCommand):
+    help = (
+        'Create the resized WebP/JPEG variants of every Employee.profile_pic. '
+        'Employees whose variants already exist are skipped, so an interrupted '
+        'run can simply be started again.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='worker processes (default: number of CPUs)')
+        parser.add_argument('--force', action='store_true',
+                            help='re-check every picture, even if its variants exist')
+
+    def handle(self, *args, **options):
+        pending = []
+        employees = (
+            Employee.objects.exclude(profile_pic='').exclude(profile_pic__isnull=True)
+            .values_list('pk', 'user_id', 'profile_pic', 'profile_pic_hash')
+        )
+        for pk, user_id, name, digest in employees.iterator():
+            if options['force'] or not variants_exist(name, digest):
+                pending.append((pk, user_id, name))
+
+        self.stdout.write(f'{len(pending)} profile picture(s) to process.')
+        if not pending:
+            return
+
+        done = failed = 0
+        with ProcessPoolExecutor(max_workers=max(1, options['workers']), initializer=_init_worker) as pool:
+            futures = {pool.submit(_generate, *employee): employee[0] for employee in pending}
+            for future in as_completed(futures):
+                try:
+                    pk, user_id, name, digest = future.result()
+                    # saved as soon as each picture is done, this is what makes the run resumable;
+                    # a picture replaced meanwhile keeps the hash of its own upload
+                    save_hash(pk, user_id, name, digest)
+                except Exception as exc:  # e.g. a decompression bomb: report it, go on with the rest
+                    failed += 1
+                    self.stderr.write(f'employee {futures[future]}: {type(exc).__name__}: {exc}')
+                    continue
+                if digest:
+                    done += 1
+                else:
+                    failed += 1
+                    self.stderr.write(f'employee {pk}: profile picture is missing or not an image')
+
+        self.stdout.write(self.style.SUCCESS(f'Generated variants for {done} picture(s), {failed} failed.'))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from sparkapp.onboarding import DEFAULT_BATCH_SIZE, OnboardingError, import_employees
+
+
+class Command(BaseCommand):
+    help = (
+        'Create User + Employee rows from a CSV or XLSX file. Columns: username, password, '
+        'emp_name, email, department, phone, gender and optionally designation, status, '
+        'group (default Teacher) and date_of_joining (YYYY-MM-DD).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='.csv or .xlsx file')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help='rows validated and inserted per transaction')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='password hashing processes (default: number of CPUs, 1 = no pool)')
+        parser.add_argument('--dry-run', action='store_true', help='validate only, write nothing')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], 'rb') as fileobj:
+                report = import_employees(
+                    fileobj, options['path'],
+                    batch_size=options['batch_size'],
+                    workers=options['workers'],
+                    dry_run=options['dry_run'],
+                )
+        except (OSError, OnboardingError) as exc:
+            raise CommandError(exc)
+
+        for row_number, message in report.errors:
+            self.stderr.write(f'row {row_number}: {message}')
+
+        verb = 'Validated' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {report.created} employee(s), {report.failed} row(s) rejected.'
+        ))
@@ -0,0 +1,150 @@
+import datetime
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connections
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from sparkapp import analytics
+from sparkapp.models import Department, Employee, Event, EventType, Venue
+
+PROFILES = ('default', 'production')
+
+
+class Command(BaseCommand):
+    help = (
+        'Load test concurrent add_event_participation submissions against a scratch '
+        'SQLite database, once per database profile (SPARKAPP_DB_PROFILE), and '
+        'compare throughput, latency and "database is locked" errors.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16, help='concurrent teachers submitting')
+        parser.add_argument('--requests', type=int, default=40, help='submissions per thread')
+        parser.add_argument('--profile', choices=PROFILES, action='append',
+                            help='profile(s) to run (default: all)')
+        parser.add_argument('--worker', action='store_true', help='internal: run one profile in this process')
+
+    def handle(self, *args, **options):
+        if connections['default'].vendor != 'sqlite':
+            raise CommandError('load_test_participations only supports SQLite.')
+        if options['worker']:
+            self.stdout.write(json.dumps(self.run_load(options['threads'], options['requests'])))
+            return
+
+        # Each profile runs in a fresh process: the database settings are
+        # read once, when Django starts.
+        results = {}
+        for profile in options['profile'] or PROFILES:
+            self.stdout.write(f'Running the {profile} profile...')
+            with tempfile.TemporaryDirectory() as tmp:
+                env = dict(os.environ, SPARKAPP_DB_PROFILE=profile,
+                           SPARKAPP_DB_NAME=os.path.join(tmp, 'load_test.sqlite3'))
+                process = subprocess.run(
+                    [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'load_test_participations', '--worker',
+                     '--threads', str(options['threads']), '--requests', str(options['requests'])],
+                    env=env, capture_output=True, text=True,
+                )
+            if process.returncode:
+                raise CommandError(f'The {profile} run failed:\n{process.stderr}')
+            results[profile] = json.loads(process.stdout.strip().splitlines()[-1])
+
+        self.stdout.write('')
+        self.stdout.write(f'{"profile":<12}{"ok":>7}{"locked":>8}{"failed":>8}{"req/s":>9}{"p50 ms":>9}{"p95 ms":>9}')
+        for profile, result in results.items():
+            self.stdout.write(
+                f'{profile:<12}{result["ok"]:>7}{result["locked"]:>8}{result["failed"]:>8}'
+                f'{result["throughput"]:>9.1f}{result["p50_ms"]:>9.1f}{result["p95_ms"]:>9.1f}'
+            )
+
+    # ---- Worker ---- #
+    def run_load(self, threads, requests):
+        call_command('migrate', verbosity=0, interactive=False)
+        users, events = self.seed(threads, requests)
+        url = reverse('manage_event_participation')
+        host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS and settings.ALLOWED_HOSTS[0] != '*' else 'localhost'
+
+        clients = []
+        for user in users:
+            client = Client(HTTP_HOST=host)
+            client.force_login(user)
+            clients.append(client)
+        close_old_connections()
+
+        results = {'ok': 0, 'locked': 0, 'failed': 0}
+        latencies = []
+        lock = threading.Lock()
+        start = threading.Barrier(threads)
+
+        def submit(client):
+            start.wait()
+            for event in events:
+                began = time.perf_counter()
+                try:
+                    response = client.post(url, {'event_id': event})
+                    outcome = 'ok' if response.status_code == 302 else 'failed'
+                except OperationalError as exc:
+                    outcome = 'locked' if 'locked' in str(exc) else 'failed'
+                finally:
+                    # what the WSGI handler does after each request: closes
+                    # the connection unless CONN_MAX_AGE keeps it
+                    close_old_connections()
+                with lock:
+                    results[outcome] += 1
+                    latencies.append(time.perf_counter() - began)
+
+        workers = [threading.Thread(target=submit, args=(client,)) for client in clients]
+        began = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - began
+
+        latencies.sort()
+        return dict(
+            results,
+            profile=settings.SPARKAPP_DB_PROFILE,
+            seconds=elapsed,
+            throughput=results['ok'] / elapsed,
+            p50_ms=latencies[len(latencies) // 2] * 1000,
+            p95_ms=latencies[int(len(latencies) * 0.95)] * 1000,
+        )
+
+    def seed(self, threads, requests):
+        teacher_group, _ = Group.objects.get_or_create(name='Teacher')
+        department = Department.objects.create(dept_name='Load Test')
+        event_type = EventType.objects.create(type_description='Load Test')
+        venue = Venue.objects.create(name='Load Test Hall', address='Campus')
+
+        starts = timezone.now()
+        events = Event.objects.bulk_create([
+            Event(title=f'Load test event {i}', type_id=event_type, venue=venue,
+                  from_date=starts + datetime.timedelta(days=i), to_date=starts + datetime.timedelta(days=i, hours=2))
+            for i in range(requests)
+        ])
+        users = User.objects.bulk_create([
+            User(username=f'loadtest{i}', email=f'loadtest{i}@example.com', password='!')
+            for i in range(threads)
+        ])
+        User.groups.through.objects.bulk_create([
+            User.groups.through(user_id=user.pk, group_id=teacher_group.pk) for user in users
+        ])
+        Employee.objects.bulk_create([
+            Employee(user=user, emp_name=f'Load Test {i}', email_id=user.email, phn_no='9876543210',
+                     dept_id=department, gender='Other', status='Active')
+            for i, user in enumerate(users)
+        ])
+        analytics.rebuild()
+        return users, [event.pk for event in events]
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from sparkapp import analytics
+
+
+class Command(BaseCommand):
+    help = (
+        'Recount every principal dashboard metric from scratch. Only needed after '
+        'changes that bypass signals (bulk_create, queryset.update(), raw SQL).'
+    )
+
+    def handle(self, *args, **options):
+        analytics.rebuild()
+        self.stdout.write(self.style.SUCCESS('Analytics summary rebuilt.'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from sparkapp.search import directory_queryset, reindex_employees
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the employee directory search index (EmployeeSearchToken).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        employees = directory_queryset().order_by('pk')
+        total = 0
+        batch = []
+        for employee in employees.iterator(chunk_size=batch_size):
+            batch.append(employee)
+            if len(batch) >= batch_size:
+                reindex_employees(batch)
+                total += len(batch)
+                batch = []
+        reindex_employees(batch)
+        total += len(batch)
+        self.stdout.write(self.style.SUCCESS(f'Indexed {total} employees.'))
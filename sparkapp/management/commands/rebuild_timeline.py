@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from sparkapp import timeline
+
+
+class Command(BaseCommand):
+    help = (
+        'Recreate the activity timeline of every employee from the event participations '
+        'and role assignments. Only needed after changes that bypass signals '
+        '(bulk_create, queryset.update(), raw SQL).'
+    )
+
+    def handle(self, *args, **options):
+        count = timeline.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Activity timeline rebuilt: {count} entries.'))
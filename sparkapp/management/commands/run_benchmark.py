@@ -0,0 +1,65 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sparkapp import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive the main pages (and participation registration) with concurrent test '
+        'clients against a database filled by seed_bench, and report throughput, '
+        'latency percentiles and queries per request as JSON. Registrations are '
+        'written to the database, so use a scratch one.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', choices=list(benchmark.SCENARIOS), action='append',
+                            help='scenario(s) to run (default: all)')
+        parser.add_argument('--requests', type=int, default=200, help='requests per scenario (default: 200)')
+        parser.add_argument('--concurrency', type=int, default=8, help='requests in flight at once (default: 8)')
+        parser.add_argument('--seed', type=int, default=0, help='random seed for the users and pages picked')
+        parser.add_argument('--output', help='write the JSON results to this file instead of stdout')
+        parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+
+    def handle(self, *args, **options):
+        try:
+            result = benchmark.run(
+                scenarios=options['scenario'] or tuple(benchmark.SCENARIOS), requests=options['requests'],
+                concurrency=options['concurrency'], random_seed=options['seed'],
+            )
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(result, handle, indent=2)
+            self.stderr.write(f'Results written to {options["output"]}.')
+        else:
+            self.stdout.write(json.dumps(result, indent=2))
+
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as handle:
+                baseline = json.load(handle)
+        self.report(result, baseline)
+
+    def report(self, result, baseline):
+        # the table goes to stderr, so stdout stays valid JSON
+        before = (baseline or {}).get('scenarios', {})
+        self.stderr.write('')
+        self.stderr.write(f'{"scenario":<24}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"queries":>9}{"errors":>8}')
+        for scenario, row in result['scenarios'].items():
+            line = (f'{scenario:<24}{row["p50_ms"] or 0:>9.1f}{row["p95_ms"] or 0:>9.1f}{row["p99_ms"] or 0:>9.1f}'
+                    f'{row["queries_mean"] or 0:>9.1f}{row["errors"]:>8}')
+            previous = before.get(scenario)
+            if previous and previous.get('p50_ms'):
+                line += f'   p50 {self.change(previous["p50_ms"], row["p50_ms"])} vs {baseline.get("commit") or "baseline"}'
+            self.stderr.write(line)
+        total = f'{"(all) req/s":<24}{result["throughput"]:>9.1f}'
+        if baseline and baseline.get('throughput'):
+            total += f'   {self.change(baseline["throughput"], result["throughput"])}'
+        self.stderr.write(total)
+
+    def change(self, before, after):
+        return f'{(after - before) / before * 100:+.0f}%'
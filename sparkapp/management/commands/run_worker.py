@@ -0,0 +1,112 @@
+import logging
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections
+
+from sparkapp import tasks
+
+logger = logging.getLogger('sparkapp.tasks')
+
+MAINTENANCE_INTERVAL = 60  # seconds between checks for lost tasks and old results
+
+
+class Command(BaseCommand):
+    help = (
+        'Run queued background tasks (sparkapp/tasks.py): profile picture variants, '
+        'reports prepared in the background... Stops cleanly on SIGTERM / Ctrl+C '
+        'once the running tasks are done.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help='tasks run at once per process (default: 4)')
+        parser.add_argument('--processes', type=int, default=1,
+                            help='worker processes, each with --threads threads (default: 1)')
+        parser.add_argument('--poll', type=float, default=1.0, help='seconds between polls of an empty queue')
+        parser.add_argument('--burst', action='store_true', help='exit once no task is due')
+
+    def handle(self, *args, **options):
+        if options['processes'] > 1:
+            self.run_processes(options)
+        else:
+            self.run_threads(max(1, options['threads']), options['poll'], options['burst'])
+
+    def run_processes(self, options):
+        command = [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'run_worker',
+                   '--threads', str(options['threads']), '--poll', str(options['poll'])]
+        if options['burst']:
+            command.append('--burst')
+        children = [subprocess.Popen(command) for _ in range(options['processes'])]
+
+        def forward(signum, frame):
+            for child in children:
+                child.send_signal(signum)
+
+        signal.signal(signal.SIGTERM, forward)
+        signal.signal(signal.SIGINT, forward)
+        for child in children:
+            child.wait()
+
+    def run_threads(self, threads, poll, burst):
+        stop = threading.Event()
+        previous = {signum: signal.signal(signum, lambda signum, frame: stop.set())
+                    for signum in (signal.SIGTERM, signal.SIGINT)}
+        try:
+            self.maintenance()
+            workers = [threading.Thread(target=self.work, args=(stop, poll, burst)) for _ in range(threads)]
+            for worker in workers:
+                worker.start()
+            self.stdout.write(f'Worker running with {threads} thread(s).')
+
+            last_maintenance = time.monotonic()
+            while any(worker.is_alive() for worker in workers):
+                stop.wait(0.1 if burst else 1)
+                if time.monotonic() - last_maintenance > MAINTENANCE_INTERVAL:
+                    self.maintenance()
+                    last_maintenance = time.monotonic()
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+            close_old_connections()
+
+    def maintenance(self):
+        try:
+            requeued, purged = tasks.requeue_stale(), tasks.purge()
+        except DatabaseError:
+            logger.exception('Task queue maintenance failed')
+            return
+        finally:
+            close_old_connections()
+        if requeued:
+            self.stderr.write(f'{requeued} task(s) left by a stopped worker put back in the queue.')
+        if purged:
+            self.stdout.write(f'{purged} old task(s) deleted.')
+
+    def work(self, stop, poll, burst):
+        worker = tasks.worker_name()
+        while not stop.is_set():
+            try:
+                task = tasks.claim(worker)
+                if task is None:
+                    if burst:
+                        break
+                    stop.wait(poll)
+                    continue
+                began = time.perf_counter()
+                tasks.execute(task)
+                self.stdout.write(
+                    f'{task.name} #{task.pk}: {task.status} in {time.perf_counter() - began:.2f}s '
+                    f'(attempt {task.attempts} of {task.max_attempts})'
+                )
+            except DatabaseError:
+                # e.g. "database is locked" past the busy timeout: try again later
+                logger.exception('Polling the task queue failed')
+                stop.wait(poll)
+            finally:
+                # as the request handler does: drop broken or expired connections
+                close_old_connections()
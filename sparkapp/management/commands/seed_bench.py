@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sparkapp import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill an empty (scratch) database with a synthetic institution at production '
+        'scale for run_benchmark: departments, thousands of staff with their users and '
+        'groups, tens of thousands of events, participations and role assignments. '
+        f'Every bench user logs in with the password "{benchmark.PASSWORD}".'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--departments', type=int, default=12)
+        parser.add_argument('--teachers', type=int, default=2000)
+        parser.add_argument('--events', type=int, default=20000)
+        parser.add_argument('--participations', type=int, default=25, help='average per teacher (default: 25)')
+        parser.add_argument('--roles', type=int, default=3, help='average role assignments per teacher (default: 3)')
+        parser.add_argument('--upcoming', type=float, default=0.02,
+                            help='share of the events still open for registration (default: 0.02)')
+        parser.add_argument('--seed', type=int, default=0, help='random seed; the same seed gives the same data')
+
+    def handle(self, *args, **options):
+        began = time.perf_counter()
+        try:
+            counts = benchmark.seed(
+                departments=options['departments'], teachers=options['teachers'], events=options['events'],
+                participations=options['participations'], roles=options['roles'],
+                upcoming=options['upcoming'], random_seed=options['seed'],
+            )
+        except ValueError as exc:
+            raise CommandError(exc)
+        summary = ', '.join(f'{count} {name.replace("_", " ")}' for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f'Seeded {summary} in {time.perf_counter() - began:.1f}s.'))
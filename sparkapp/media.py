@@ -0,0 +1,125 @@
+# sparkapp/media.py
+#
+# Sending stored files to the browser once a view has checked that the user
+# may see them. With a front proxy configured (SPARKAPP_MEDIA_ACCEL) the
+# response only names the file and the proxy sends the bytes, so a large PDF
+# doesn't hold a worker for the whole download. Without one, Django streams
+# the file itself and answers Range requests (resumed downloads, PDF viewers
+# fetching pages) and conditional GETs.
+
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe, quote_etag
+
+CHUNK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# Uploads keep the extension the uploader chose, so only types a browser
+# can't run script from are shown inline; anything else is downloaded.
+INLINE_TYPES = {'application/pdf', 'image/jpeg', 'image/png', 'image/webp'}
+
+
+def _file_etag(name, stat):
+    # Content-addressed names are their own validator
+    stem = os.path.splitext(os.path.basename(name))[0]
+    if len(stem) == 64:
+        return quote_etag(stem)
+    return quote_etag(f'{stat.st_mtime_ns:x}-{stat.st_size:x}')
+
+
+def _byte_range(request, etag, last_modified, size):
+    """
+    The single (start, end) range asked for, end inclusive, None to send the
+    whole file, or False when the range can't be satisfied.
+    """
+    header = request.META.get('HTTP_RANGE', '')
+    match = RANGE_RE.match(header.strip())
+    if not match or match.group(1) == match.group(2) == '':
+        return None  # no range, several ranges or garbage: send everything
+
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and if_range != etag:
+        # only a validator that still matches may resume a download
+        if parse_http_date_safe(if_range) != last_modified:
+            return None
+
+    first, last = match.groups()
+    if first == '':
+        # "bytes=-500": the last 500 bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _read_range(path, start, end):
+    with open(path, 'rb') as handle:
+        handle.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = handle.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def serve(request, storage, name, filename=None, cache_control='private, no-cache', accel=True):
+    """
+    Response sending the stored file ``name`` (from a FileSystemStorage) as
+    ``filename``. Raises FileNotFoundError if it's gone. ``accel=False`` for
+    files outside MEDIA_ROOT, which the front proxy can't reach.
+    """
+    path = storage.path(name)
+    stat = os.stat(path)
+    filename = filename or os.path.basename(name)
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    etag = _file_etag(name, stat)
+    last_modified = int(stat.st_mtime)
+
+    accel = accel and settings.SPARKAPP_MEDIA_ACCEL
+    if accel:
+        # The proxy does Range and conditional GET itself
+        response = HttpResponse(content_type=content_type)
+        if accel == 'nginx':
+            response['X-Accel-Redirect'] = quote(settings.SPARKAPP_MEDIA_ACCEL_PREFIX + name)
+        else:
+            response['X-Sendfile'] = path
+    else:
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            not_modified['Cache-Control'] = cache_control
+            return not_modified
+
+        byte_range = _byte_range(request, etag, last_modified, stat.st_size)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+        if byte_range is None:
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(_read_range(path, start, end), status=206, content_type=content_type)
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+            response['Content-Length'] = str(end - start + 1)
+        response['Accept-Ranges'] = 'bytes'
+
+    response['Content-Disposition'] = content_disposition_header(content_type not in INLINE_TYPES, filename)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = cache_control
+    response['X-Content-Type-Options'] = 'nosniff'
+    response['Content-Security-Policy'] = 'sandbox'
+    return response
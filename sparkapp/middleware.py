@@ -0,0 +1,156 @@
+# sparkapp/middleware.py
+
+import contextvars
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import FileResponse
+
+from . import routers
+
+logger = logging.getLogger('sparkapp.queries')
+
+
+class QueryRecorder:
+    """execute_wrapper that counts statements and times each one."""
+
+    def __init__(self, keep_slowest=3):
+        self.keep_slowest = keep_slowest
+        self.count = 0
+        self.total_time = 0.0
+        self.slowest = []  # list of (duration, alias, sql), longest first
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.total_time += duration
+            if self.keep_slowest:
+                alias = context['connection'].alias
+                self.slowest.append((duration, alias, sql))
+                self.slowest.sort(key=lambda item: item[0], reverse=True)
+                del self.slowest[self.keep_slowest:]
+
+
+# The recorder of the request being served. Queries run on whichever thread
+# holds a connection: the request's own, the thread sync_to_async hands ORM
+# calls to under ASGI, or the server's while a streamed body is read. The
+# context follows the request into all of them, so every connection gets
+# _record_query once, when it connects, and it looks the recorder up here.
+_recorder = contextvars.ContextVar('sparkapp_query_recorder', default=None)
+
+
+def _record_query(execute, sql, params, many, context):
+    recorder = _recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def _install_recorder(connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+class QueryCountMiddleware:
+    """
+    Records the number of SQL queries, total SQL time and the slowest
+    statements of every request. Enabled with SPARKAPP_QUERY_STATS = True.
+
+    The numbers are added to the response as X-Query-Count / X-Query-Time-Ms
+    headers and logged as one JSON line on the 'sparkapp.queries' logger.
+    A streamed body (exports) is read after the headers went out: its
+    headers count the view's queries only, the log line is written once the
+    body is done and counts those read while streaming too.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SPARKAPP_QUERY_STATS', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.keep_slowest = getattr(settings, 'SPARKAPP_QUERY_STATS_SLOWEST', 3)
+        connection_created.connect(_install_recorder, dispatch_uid='sparkapp_query_recorder')
+
+    def __call__(self, request):
+        for connection in connections.all(initialized_only=True):
+            _install_recorder(connection)  # connected before the middleware was set up
+        recorder = QueryRecorder(self.keep_slowest)
+        token = _recorder.set(recorder)
+        try:
+            response = self.get_response(request)
+        finally:
+            _recorder.reset(token)
+
+        total_ms = round(recorder.total_time * 1000, 3)
+        response['X-Query-Count'] = str(recorder.count)
+        response['X-Query-Time-Ms'] = str(total_ms)
+        if response.streaming and not response.is_async and not isinstance(response, FileResponse):
+            # a FileResponse body is a file, kept as is so the server can sendfile() it
+            response.streaming_content = self._recording(request, response, recorder, response.streaming_content)
+        else:
+            self.log(request, response, recorder)
+        return response
+
+    def _recording(self, request, response, recorder, content):
+        chunks = iter(content)
+        try:
+            while True:
+                # set around each read: between chunks the thread is the server's
+                token = _recorder.set(recorder)
+                try:
+                    chunk = next(chunks, None)
+                finally:
+                    _recorder.reset(token)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            self.log(request, response, recorder)
+
+    def log(self, request, response, recorder):
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'query_count': recorder.count,
+            'query_time_ms': round(recorder.total_time * 1000, 3),
+            'slowest': [
+                {'ms': round(duration * 1000, 3), 'db': alias, 'sql': sql}
+                for duration, alias, sql in recorder.slowest
+            ],
+        }))
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Sets up sparkapp.routers.ReplicaRouter for every request. A request that
+    writes pins its session to the primary for SPARKAPP_REPLICA_PIN_SECONDS,
+    so the user reads their own writes even while the replica lags behind.
+    Only active when a "replica" database is configured.
+    """
+    SESSION_KEY = '_sparkapp_primary_until'
+
+    def __init__(self, get_response):
+        if not routers.replica_configured():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.pin_seconds = getattr(settings, 'SPARKAPP_REPLICA_PIN_SECONDS', 10)
+
+    def __call__(self, request):
+        now = time.time()
+        state = routers.begin_request(pinned=request.session.get(self.SESSION_KEY, 0) > now)
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.end_request()
+        if state.wrote:
+            request.session[self.SESSION_KEY] = now + self.pin_seconds
+        return response
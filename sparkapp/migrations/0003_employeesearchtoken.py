@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:14
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# The tokenizer of sparkapp/search.py as of this migration, copied so later
+# changes to that module don't change what this migration does
+TOKEN_MAX_LENGTH = 100
+_SPLIT = re.compile(r'[^\w]+')
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return text.lower().strip()
+
+
+def tokenize(text):
+    return [word for word in _SPLIT.split(normalize(text)) if word]
+
+
+def build_search_index(apps, schema_editor):
+    Employee = apps.get_model('sparkapp', 'Employee')
+    EmployeeSearchToken = apps.get_model('sparkapp', 'EmployeeSearchToken')
+    db_alias = schema_editor.connection.alias
+
+    rows = []
+    for employee in Employee.objects.using(db_alias).select_related('user', 'dept_id').iterator():
+        values = [employee.emp_name, employee.email_id, employee.user.username]
+        if employee.dept_id_id:
+            values.append(employee.dept_id.dept_name)
+        tokens = {normalize(employee.email_id), normalize(employee.user.username)}
+        for value in values:
+            tokens.update(tokenize(value))
+        rows.extend(
+            EmployeeSearchToken(employee=employee, token=token[:TOKEN_MAX_LENGTH])
+            for token in sorted(tokens) if token
+        )
+    EmployeeSearchToken.objects.using(db_alias).bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sparkapp', '0002_employeeroleassignment_mode_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmployeeSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=100)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='sparkapp.employee')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['token', 'employee'], name='emp_search_token_idx')],
+            },
+        ),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:16
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def remove_duplicate_participations(apps, schema_editor):
+    # Keep the first registration of each (employee, event) pair so the
+    # unique constraint can be created.
+    EventParticipation = apps.get_model('sparkapp', 'EventParticipation')
+    participations = EventParticipation.objects.using(schema_editor.connection.alias)
+    keep = (
+        participations
+        .values('emp_id', 'event_id')
+        .annotate(first_id=Min('id'))
+        .values_list('first_id', flat=True)
+    )
+    participations.exclude(id__in=list(keep)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sparkapp', '0003_employeesearchtoken'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['dept_id', 'status'], name='employee_dept_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['emp_name'], name='employee_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='employeeroleassignment',
+            index=models.Index(fields=['emp_id', 'assigned_date'], name='role_assign_emp_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['from_date', 'to_date'], name='event_dates_idx'),
+        ),
+        migrations.RunPython(remove_duplicate_participations, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='eventparticipation',
+            constraint=models.UniqueConstraint(fields=('emp_id', 'event_id'), name='unique_event_participation'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sparkapp', '0004_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employee',
+            name='profile_pic_hash',
+            field=models.CharField(blank=True, editable=False, max_length=16),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sparkapp', '0005_employee_profile_pic_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(max_length=30)),
+                ('key', models.CharField(max_length=100)),
+                ('label', models.CharField(max_length=1000)),
+                ('value', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('metric', 'key'), name='unique_analytics_bucket')],
+            },
+        ),
+    ]
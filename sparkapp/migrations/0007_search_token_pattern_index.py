@@ -0,0 +1,31 @@
+from django.db import migrations
+
+INDEX_NAME = 'emp_search_token_like_idx'
+
+
+def create_pattern_index(apps, schema_editor):
+    # PostgreSQL only: its B-tree indexes serve LIKE 'prefix%' only with the
+    # pattern operator class. SQLite searches by range on emp_search_token_idx.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    EmployeeSearchToken = apps.get_model('sparkapp', 'EmployeeSearchToken')
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON {EmployeeSearchToken._meta.db_table} '
+        f'(token varchar_pattern_ops)'
+    )
+
+
+def drop_pattern_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sparkapp', '0006_analyticssummary'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_pattern_index, drop_pattern_index),
+    ]
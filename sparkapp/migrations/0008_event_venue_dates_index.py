@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sparkapp', '0007_search_token_pattern_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['venue', 'from_date', 'to_date'], name='event_venue_dates_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:37
+
+import sparkapp.documents
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sparkapp', '0008_event_venue_dates_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='employeeroleassignment',
+            name='document',
+            field=models.FileField(blank=True, null=True, storage=sparkapp.documents.DocumentStorage(), upload_to='role_documents/'),
+        ),
+        migrations.AlterField(
+            model_name='eventparticipation',
+            name='doc_link',
+            field=models.FileField(blank=True, null=True, storage=sparkapp.documents.DocumentStorage(), upload_to='participation_docs/'),
+        ),
+        migrations.CreateModel(
+            name='DocumentBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.PositiveBigIntegerField()),
+                ('refs', models.PositiveIntegerField(default=0)),
+                ('touched_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['refs', 'touched_at'], name='document_blob_orphan_idx')],
+            },
+        ),
+    ]
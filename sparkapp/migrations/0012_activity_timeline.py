@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:47
+
+import datetime
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def build_timeline(apps, schema_editor):
+    EventParticipation = apps.get_model('sparkapp', 'EventParticipation')
+    EmployeeRoleAssignment = apps.get_model('sparkapp', 'EmployeeRoleAssignment')
+    TimelineEntry = apps.get_model('sparkapp', 'TimelineEntry')
+    db_alias = schema_editor.connection.alias
+
+    def start_of_day(day):
+        return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min)) if day else None
+
+    rows = []
+    for participation in EventParticipation.objects.using(db_alias).select_related('event_id').iterator():
+        event = participation.event_id
+        rows.append(TimelineEntry(
+            employee_id=participation.emp_id_id, kind='participation', source_id=participation.pk,
+            occurred_at=event.from_date, ended_at=event.to_date, title=event.title,
+            detail=' · '.join(filter(None, [participation.role, participation.mode and participation.get_mode_display()])),
+            has_document=bool(participation.doc_link),
+        ))
+    for assignment in EmployeeRoleAssignment.objects.using(db_alias).select_related('role_id').iterator():
+        rows.append(TimelineEntry(
+            employee_id=assignment.emp_id_id, kind='role_assignment', source_id=assignment.pk,
+            occurred_at=start_of_day(assignment.assigned_date), ended_at=start_of_day(assignment.relieved_date),
+            title=assignment.role_id.role_name, detail=assignment.mode and assignment.get_mode_display() or '',
+            has_document=bool(assignment.document),
+        ))
+    TimelineEntry.objects.using(db_alias).bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sparkapp', '0011_task'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('participation', 'Event'), ('role_assignment', 'Role')], max_length=20)),
+                ('source_id', models.PositiveIntegerField()),
+                ('occurred_at', models.DateTimeField()),
+                ('ended_at', models.DateTimeField(blank=True, null=True)),
+                ('title', models.CharField(max_length=200)),
+                ('detail', models.CharField(blank=True, max_length=200)),
+                ('has_document', models.BooleanField(default=False)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to='sparkapp.employee')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['employee', 'occurred_at', 'id'], name='timeline_employee_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'source_id'), name='unique_timeline_source')],
+            },
+        ),
+        migrations.RunPython(build_timeline, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Catches the migrations up with the model, which dropped the 'online'
+    # default of EmployeeRoleAssignment.mode before any of this work. Django
+    # keeps defaults out of the database, so this changes nothing there.
+
+    dependencies = [
+        ('sparkapp', '0013_change_feed'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='employeeroleassignment',
+            name='mode',
+            field=models.CharField(blank=True, choices=[('online', 'Online'), ('offline', 'Offline')], max_length=10, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sparkapp', '0014_alter_employeeroleassignment_mode'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='timelineentry',
+            name='source_id',
+            field=models.PositiveBigIntegerField(),
+        ),
+    ]
@@ -1,6 +1,11 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import RegexValidator
+from django.utils import timezone
+
+from .documents import document_storage
 
 # Department model
 class Department(models.Model):
@@ -22,6 +27,8 @@ class Employee(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     emp_name = models.CharField(max_length=200)
     profile_pic = models.ImageField(upload_to='profile_pics/', null=True, blank=True)
+    # content hash of profile_pic, names its resized variants (see sparkapp/thumbnails.py)
+    profile_pic_hash = models.CharField(max_length=16, blank=True, editable=False)
     email_id = models.EmailField(unique=True)
 
     # Validate phone number format (example for Indian phone numbers)
@@ -38,6 +45,14 @@ class Employee(models.Model):
     residential_address = models.TextField(null=True,blank=True)
     status = models.CharField(max_length=50, choices=[('Active', 'Active'), ('Inactive', 'Inactive')],blank=True)
     designation_id = models.ForeignKey(Designation, on_delete=models.CASCADE,null=True,blank=True)
+    updated_at = models.DateTimeField(auto_now=True)  # change feed (sparkapp/sync.py)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['dept_id', 'status'], name='employee_dept_status_idx'),
+            models.Index(fields=['emp_name'], name='employee_name_idx'),  # directory / roster ordering
+            models.Index(fields=['updated_at', 'id'], name='employee_updated_idx'),
+        ]
 
     def __str__(self):
         designation = self.designation_id.designation_name if self.designation_id else "No Designation"
@@ -79,8 +94,15 @@ class EmployeeRoleAssignment(models.Model):
     role_id = models.ForeignKey(Role, on_delete=models.CASCADE)
     assigned_date = models.DateField()
     relieved_date = models.DateField(null=True, blank=True)
-    document = models.FileField(upload_to="role_documents/", null=True, blank=True)
+    document = models.FileField(upload_to="role_documents/", storage=document_storage, null=True, blank=True)
     mode = models.CharField(max_length=10, choices=MODE_CHOICES, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)  # change feed (sparkapp/sync.py)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['emp_id', 'assigned_date'], name='role_assign_emp_date_idx'),
+            models.Index(fields=['updated_at', 'id'], name='role_assign_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.emp_id.emp_name} - {self.role_id.role_name}"
@@ -94,6 +116,12 @@ class Event(models.Model):
     to_date = models.DateTimeField()    # Same as above
     venue = models.ForeignKey(Venue, on_delete=models.CASCADE)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['from_date', 'to_date'], name='event_dates_idx'),
+            models.Index(fields=['venue', 'from_date', 'to_date'], name='event_venue_dates_idx'),
+        ]
+
     def __str__(self):
         return self.title
     
@@ -125,7 +153,7 @@ class AdminEmployee(models.Model):
 class EventParticipation(models.Model):
     emp_id = models.ForeignKey('Employee', on_delete=models.CASCADE)
     event_id = models.ForeignKey('Event', on_delete=models.CASCADE)
-    doc_link = models.FileField(upload_to='participation_docs/', null=True, blank=True)
+    doc_link = models.FileField(upload_to='participation_docs/', storage=document_storage, null=True, blank=True)
     role = models.CharField(max_length=100)
 
     MODE_CHOICES = [
@@ -133,6 +161,164 @@ class EventParticipation(models.Model):
         ('Offline', 'Offline'),
     ]
     mode = models.CharField(max_length=10, choices=MODE_CHOICES, default='online', null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)  # change feed (sparkapp/sync.py)
+
+    class Meta:
+        constraints = [
+            # An employee takes part in an event once; the unique index also
+            # serves the (emp_id, event_id) lookups.
+            models.UniqueConstraint(fields=['emp_id', 'event_id'], name='unique_event_participation'),
+        ]
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='participation_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.emp_id.emp_name} - {self.event_id.title}"
+
+
+# Search index for the employee directory: one row per normalized word of an
+# employee's name, email, username and department. Kept in sync by signals
+# (see sparkapp/signals.py) and queried by sparkapp/search.py.
+class EmployeeSearchToken(models.Model):
+    employee = models.ForeignKey('Employee', on_delete=models.CASCADE, related_name='search_tokens')
+    token = models.CharField(max_length=100)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['token', 'employee'], name='emp_search_token_idx'),
+        ]
+
+    def __str__(self):
+        return self.token
+
+
+# Pre-computed counters for the principal dashboard, one row per (metric, key),
+# e.g. ('department', '3') -> participations of department 3. Maintained
+# incrementally by sparkapp/analytics.py.
+class AnalyticsSummary(models.Model):
+    metric = models.CharField(max_length=30)
+    key = models.CharField(max_length=100)
+    label = models.CharField(max_length=1000)
+    value = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['metric', 'key'], name='unique_analytics_bucket'),
+        ]
+
+    def __str__(self):
+        return f"{self.metric}: {self.label} = {self.value}"
+
+
+# One row per stored document blob (see sparkapp/documents.py): refs counts
+# the EmployeeRoleAssignment.document / EventParticipation.doc_link values
+# naming it, touched_at is the last time an upload wrote that content.
+class DocumentBlob(models.Model):
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField()
+    refs = models.PositiveIntegerField(default=0)
+    touched_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['refs', 'touched_at'], name='document_blob_orphan_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.refs} refs)"
+
+
+# A chunked upload in progress (see sparkapp/uploads.py). The bytes received
+# so far are in a partial file named after the id, ``offset`` of them.
+class ChunkedUpload(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True)  # expected digest, if the client sent one
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
+
+
+# A unit of background work (see sparkapp/tasks.py), run by
+# ``manage.py run_worker``. ``name`` is the dotted path of a @task function.
+class Task(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    name = models.CharField(max_length=200)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_at = models.DateTimeField(default=timezone.now)  # not before; pushed back between retries
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)  # who asked for it
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # the worker's poll: queued tasks that are due, oldest first
+            models.Index(fields=['status', 'run_at'], name='task_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
+# The activity timeline of an employee's page (see sparkapp/timeline.py): one
+# row per EventParticipation / EmployeeRoleAssignment, copied with the date
+# and labels it is shown with, so a page is a single range scan of the
+# (employee, occurred_at, id) index. Kept in sync by signals.
+class TimelineEntry(models.Model):
+    PARTICIPATION = 'participation'
+    ROLE_ASSIGNMENT = 'role_assignment'
+    KIND_CHOICES = [(PARTICIPATION, 'Event'), (ROLE_ASSIGNMENT, 'Role')]
+
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='timeline')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    source_id = models.PositiveBigIntegerField()  # pk of the participation / assignment
+    occurred_at = models.DateTimeField()
+    ended_at = models.DateTimeField(null=True, blank=True)
+    title = models.CharField(max_length=200)
+    detail = models.CharField(max_length=200, blank=True)
+    has_document = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'source_id'], name='unique_timeline_source'),
+        ]
+        indexes = [
+            models.Index(fields=['employee', 'occurred_at', 'id'], name='timeline_employee_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.occurred_at:%Y-%m-%d} {self.title}"
+
+
+# Deletions of the rows the change feed publishes (see sparkapp/sync.py), so
+# a consumer that only asks for what changed also learns what went away.
+class SyncTombstone(models.Model):
+    resource = models.CharField(max_length=30)
+    object_id = models.PositiveBigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['resource', 'deleted_at', 'id'], name='tombstone_resource_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.resource} #{self.object_id} deleted {self.deleted_at:%Y-%m-%d %H:%M}"
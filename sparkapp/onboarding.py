@@ -0,0 +1,323 @@
+# sparkapp/onboarding.py
+#
+# Bulk employee onboarding from a CSV or XLSX file.
+#
+# The file is read row by row (never fully in memory), rows are validated in
+# chunks against in-memory Department / Designation / Group lookup tables,
+# passwords are hashed in a process pool and each chunk is inserted with
+# bulk_create inside its own transaction. A bad row is reported and skipped,
+# it never aborts the run.
+
+import csv
+import datetime
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.password_validation import validate_password
+from django.contrib.auth.models import Group, User
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import DatabaseError, transaction
+from django.utils.dateparse import parse_date
+
+from .models import Department, Designation, Employee
+from .roles import ADMIN, PRINCIPAL, TEACHER
+from .search import reindex_employees
+
+try:
+    import openpyxl
+except ImportError:  # XLSX support is optional
+    openpyxl = None
+
+# phone and gender are required by Employee; bulk_create doesn't run model validation
+REQUIRED_COLUMNS = ('username', 'password', 'emp_name', 'email', 'department', 'phone', 'gender')
+OPTIONAL_COLUMNS = ('designation', 'status', 'group', 'date_of_joining')
+DEFAULT_GROUP = TEACHER
+ROLE_GROUPS = (ADMIN, TEACHER, PRINCIPAL)
+DEFAULT_BATCH_SIZE = 200
+
+GENDERS = {value for value, _ in Employee._meta.get_field('gender').choices}
+STATUSES = {value for value, _ in Employee._meta.get_field('status').choices}
+PHONE_VALIDATOR = Employee.phone_validator
+# The fields text columns are stored in. bulk_create runs none of their
+# checks, and a value the database refuses would fail the whole batch.
+COLUMN_FIELDS = {
+    'username': User._meta.get_field('username'),
+    'emp_name': Employee._meta.get_field('emp_name'),
+    'email': Employee._meta.get_field('email_id'),
+    'phone': Employee._meta.get_field('phn_no'),
+}
+
+
+class OnboardingError(Exception):
+    """The file itself can't be imported (unknown format, missing columns...)."""
+
+
+class ImportReport:
+    def __init__(self):
+        self.created = 0
+        self.errors = []  # (row number, message)
+
+    def add_error(self, row_number, message):
+        self.errors.append((row_number, message))
+
+    @property
+    def failed(self):
+        return len({row_number for row_number, _ in self.errors})
+
+
+# ---- Reading ---- #
+def read_rows(fileobj, filename, required=REQUIRED_COLUMNS):
+    """
+    Check the header for the ``required`` columns and return an iterator of
+    (row number, dict) for the data rows (the header is row 1).
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.csv':
+        rows = _read_csv(fileobj)
+    elif extension in ('.xlsx', '.xlsm'):
+        rows = _read_xlsx(fileobj)
+    else:
+        raise OnboardingError(f'Unsupported file type "{extension}", upload a .csv or .xlsx file.')
+
+    header = next(rows, None)
+    if header is None:
+        raise OnboardingError('The file is empty.')
+    header = [str(name or '').strip().lower() for name in header]
+    missing = [name for name in required if name not in header]
+    if missing:
+        raise OnboardingError('Missing column(s): ' + ', '.join(missing))
+
+    return _data_rows(rows, header)
+
+
+def _data_rows(rows, header):
+    for row_number, values in enumerate(rows, start=2):
+        values = ['' if value is None else str(value).strip() for value in values]
+        if not any(values):
+            continue  # blank line
+        yield row_number, dict(zip(header, values))
+
+
+def _read_csv(fileobj):
+    if isinstance(fileobj.read(0), bytes):
+        fileobj = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    yield from csv.reader(fileobj)
+
+
+def _read_xlsx(fileobj):
+    if openpyxl is None:
+        raise OnboardingError('XLSX import needs the "openpyxl" package, upload a .csv file instead.')
+    workbook = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        for values in workbook.active.iter_rows(values_only=True):
+            yield [_xlsx_value(value) for value in values]
+    finally:
+        workbook.close()
+
+
+def _xlsx_value(value):
+    # Cells come back typed: dates as datetime, phone numbers as int/float
+    if isinstance(value, datetime.datetime):
+        value = value.date()
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+# ---- Validation ---- #
+class Lookups:
+    """Name -> object tables, loaded once per import."""
+
+    def __init__(self):
+        self.departments = {d.dept_name.strip().lower(): d for d in Department.objects.all()}
+        self.designations = {d.designation_name.strip().lower(): d for d in Designation.objects.all()}
+        # only the groups the app knows as roles; a typo must not create a new one
+        self.groups = {g.name.lower(): g for g in Group.objects.filter(name__in=ROLE_GROUPS)}
+
+
+def clean_row(row, lookups):
+    """Return (cleaned data, list of error messages) for one row."""
+    errors = []
+    data = {name: row.get(name, '') for name in REQUIRED_COLUMNS + OPTIONAL_COLUMNS}
+
+    for name in REQUIRED_COLUMNS:
+        if not data[name]:
+            errors.append(f'{name} is required')
+
+    for name, field in COLUMN_FIELDS.items():
+        if len(data[name]) > field.max_length:
+            errors.append(f'{name} can be at most {field.max_length} characters')
+        elif name == 'username' and data[name]:
+            try:
+                field.run_validators(data[name])  # letters, digits and @.+-_ only
+            except ValidationError as exc:
+                errors.extend(f'invalid username "{data[name]}": {message}' for message in exc.messages)
+
+    if data['email']:
+        try:
+            validate_email(data['email'])
+        except ValidationError:
+            errors.append(f'invalid email "{data["email"]}"')
+        data['email'] = data['email'].lower()
+
+    if data['password']:
+        # the AUTH_PASSWORD_VALIDATORS the registration forms apply
+        try:
+            validate_password(data['password'], user=User(username=data['username'], email=data['email']))
+        except ValidationError as exc:
+            errors.extend(exc.messages)
+
+    department = lookups.departments.get(data['department'].lower())
+    if data['department'] and department is None:
+        errors.append(f'unknown department "{data["department"]}"')
+    data['department'] = department
+
+    designation = None
+    if data['designation']:
+        designation = lookups.designations.get(data['designation'].lower())
+        if designation is None:
+            errors.append(f'unknown designation "{data["designation"]}"')
+    data['designation'] = designation
+
+    if data['phone']:
+        try:
+            PHONE_VALIDATOR(data['phone'])
+        except ValidationError:
+            errors.append(f'invalid phone number "{data["phone"]}"')
+
+    if data['gender'] and data['gender'].title() not in GENDERS:
+        errors.append(f'gender must be one of {", ".join(sorted(GENDERS))}')
+    data['gender'] = data['gender'].title()
+
+    if data['status'] and data['status'].title() not in STATUSES:
+        errors.append(f'status must be one of {", ".join(sorted(STATUSES))}')
+    data['status'] = data['status'].title() or 'Active'
+
+    group = lookups.groups.get((data['group'] or DEFAULT_GROUP).lower())
+    if group is None:
+        errors.append(f'group must be one of {", ".join(ROLE_GROUPS)}')
+    data['group'] = group
+
+    if data['date_of_joining']:
+        try:
+            data['date_of_joining'] = parse_date(data['date_of_joining'][:10])
+        except ValueError:
+            data['date_of_joining'] = None
+        if data['date_of_joining'] is None:
+            errors.append('date_of_joining must be YYYY-MM-DD')
+    else:
+        data['date_of_joining'] = None
+
+    return data, errors
+
+
+# ---- Import ---- #
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _init_worker():
+    # Needed when worker processes are spawned rather than forked
+    django.setup()
+
+
+def import_employees(fileobj, filename, batch_size=DEFAULT_BATCH_SIZE, workers=None, dry_run=False):
+    """Import employees from an uploaded CSV/XLSX file and return an ImportReport."""
+    report = ImportReport()
+    lookups = Lookups()
+    rows = read_rows(fileobj, filename)  # raises OnboardingError for a bad header
+
+    workers = os.cpu_count() if workers is None else workers
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) if workers > 1 else None
+    try:
+        for chunk in _chunks(rows, batch_size):
+            valid = _validate_chunk(chunk, lookups, report)
+            if valid and not dry_run:
+                _insert_chunk(valid, lookups, report, pool)
+            elif dry_run:
+                report.created += len(valid)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return report
+
+
+def _validate_chunk(chunk, lookups, report):
+    cleaned = []
+    for row_number, row in chunk:
+        data, errors = clean_row(row, lookups)
+        for message in errors:
+            report.add_error(row_number, message)
+        if not errors:
+            cleaned.append((row_number, data))
+
+    # Duplicates against the database: one query per column for the whole chunk
+    usernames = set(User.objects.filter(
+        username__in=[data['username'] for _, data in cleaned]).values_list('username', flat=True))
+    emails = set(Employee.objects.filter(
+        email_id__in=[data['email'] for _, data in cleaned]).values_list('email_id', flat=True))
+    emails |= set(User.objects.filter(
+        email__in=[data['email'] for _, data in cleaned]).values_list('email', flat=True))
+
+    valid = []
+    for row_number, data in cleaned:
+        if data['username'] in usernames:
+            report.add_error(row_number, f'username "{data["username"]}" already exists')
+        elif data['email'] in emails:
+            report.add_error(row_number, f'email "{data["email"]}" already exists')
+        else:
+            # also catches duplicates further down in the same file
+            usernames.add(data['username'])
+            emails.add(data['email'])
+            valid.append((row_number, data))
+    return valid
+
+
+def _insert_chunk(valid, lookups, report, pool):
+    passwords = [data['password'] for _, data in valid]
+    if pool is not None:
+        hashes = list(pool.map(make_password, passwords, chunksize=max(1, len(passwords) // 8)))
+    else:
+        hashes = [make_password(password) for password in passwords]
+
+    try:
+        with transaction.atomic():
+            users = User.objects.bulk_create([
+                User(username=data['username'], email=data['email'], password=password_hash)
+                for (_, data), password_hash in zip(valid, hashes)
+            ])
+            employees = Employee.objects.bulk_create([
+                Employee(
+                    user=user,
+                    emp_name=data['emp_name'],
+                    email_id=data['email'],
+                    phn_no=data['phone'],
+                    dept_id=data['department'],
+                    designation_id=data['designation'],
+                    gender=data['gender'],
+                    status=data['status'],
+                    date_of_joining=data['date_of_joining'],
+                )
+                for (_, data), user in zip(valid, users)
+            ])
+            User.groups.through.objects.bulk_create([
+                User.groups.through(user_id=user.pk, group_id=data['group'].pk)
+                for (_, data), user in zip(valid, users)
+            ])
+            # bulk_create doesn't send post_save, keep the directory index in step
+            reindex_employees(employees)
+    except DatabaseError as exc:
+        for row_number, _ in valid:
+            report.add_error(row_number, f'not imported, the batch failed: {exc}')
+        return
+
+    report.created += len(valid)
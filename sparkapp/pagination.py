@@ -0,0 +1,98 @@
+# sparkapp/pagination.py
+#
+# Keyset ("seek") pagination. Instead of OFFSET, each page remembers the sort
+# key of its last row and the next page starts strictly after it, so deep
+# pages cost the same as the first one and rows don't shift between pages.
+
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), cls=DjangoJSONEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Return the list of key values stored in the cursor, or None if it is invalid."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+def after_key(ordering, values):
+    """Condition for the rows that sort after the key ``values`` in ``ordering``."""
+    # (a, b, c) > (x, y, z)  ==  a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)
+    condition = Q()
+    equal = {}
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= Q(**equal, **{f'{name}__{lookup}': value})
+        equal[name] = value
+    return condition
+
+
+def keyset_page(queryset, ordering, cursor=None, page_size=25):
+    """
+    Return (rows, next_cursor) for one page of ``queryset``.
+
+    ``ordering`` must end with a unique field (usually the primary key) so the
+    order is total. ``next_cursor`` is None on the last page. A cursor that
+    doesn't fit ``ordering`` (tampered with, or from another list) gives the
+    first page.
+    """
+    queryset = queryset.order_by(*ordering)
+    values = _checked_key(queryset.model, ordering, decode_cursor(cursor))
+    if values is not None:
+        queryset = queryset.filter(after_key(ordering, values))
+
+    rows = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor(_key_of(last, ordering))
+    return rows, next_cursor
+
+
+def _checked_key(model, ordering, values):
+    """``values`` converted to the types of the ordering fields, or None if they don't fit."""
+    if values is None or len(values) != len(ordering):
+        return None
+    checked = []
+    for field, value in zip(ordering, values):
+        if value is None:
+            return None  # no ordering column is nullable
+        try:
+            checked.append(_model_field(model, field.lstrip('-')).to_python(value))
+        except (ValidationError, ValueError, TypeError):
+            return None
+    return checked
+
+
+def _model_field(model, name):
+    *relations, name = name.split('__')
+    for relation in relations:
+        model = model._meta.get_field(relation).related_model
+    field = model._meta.get_field(name)
+    return field.target_field if field.is_relation else field
+
+
+def _key_of(row, ordering):
+    key = []
+    for field in ordering:
+        value = row
+        for part in field.lstrip('-').split('__'):
+            value = value[part] if isinstance(value, dict) else getattr(value, part)
+        key.append(value)
+    return key
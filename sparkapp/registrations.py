@@ -0,0 +1,103 @@
+# sparkapp/registrations.py
+#
+# Registering many employees for one event at once, e.g. a whole department
+# for a workshop. The employees already registered are subtracted as a set
+# (one query for the event's participants, not one lookup per employee) and
+# the rest are inserted with bulk_create in one transaction.
+#
+# bulk_create sends no signals, so the rows the signals would have derived
+# are written here in bulk too: the timeline entries (sparkapp/timeline.py)
+# and the analytics buckets the new rows count in (sparkapp/analytics.py).
+# Bulk registrations carry no document, so no blob reference changes.
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import analytics, timeline
+from .models import Employee, EventParticipation
+from .onboarding import read_rows
+
+BATCH_SIZE = 500
+DEFAULT_ROLE = 'Participant'
+
+
+class RegistrationReport:
+    def __init__(self):
+        self.created = 0
+        self.already_registered = 0
+        self.unknown = []  # (row number, username) of the uploaded list
+
+    @property
+    def selected(self):
+        return self.created + self.already_registered
+
+
+def employees_from_file(fileobj, filename, report):
+    """
+    Primary keys of the employees listed by username in an uploaded CSV or
+    XLSX file; unknown usernames go to ``report.unknown``.
+    """
+    rows = {}
+    for row_number, row in read_rows(fileobj, filename, required=('username',)):
+        if row['username']:
+            rows.setdefault(row['username'], row_number)
+
+    usernames = list(rows)
+    found = {}
+    for start in range(0, len(usernames), BATCH_SIZE):  # stays under SQLite's variable limit
+        found.update(
+            Employee.objects.filter(user__username__in=usernames[start:start + BATCH_SIZE])
+            .values_list('user__username', 'pk')
+        )
+    report.unknown = sorted((row_number, username) for username, row_number in rows.items() if username not in found)
+    return set(found.values())
+
+
+def select_employees(department=None, designation=None, employee_ids=None):
+    """Primary keys of the active employees matching every given criterion."""
+    employees = Employee.objects.exclude(status='Inactive')
+    if department is not None:
+        employees = employees.filter(dept_id=department)
+    if designation is not None:
+        employees = employees.filter(designation_id=designation)
+    selected = set(employees.values_list('pk', flat=True))
+    return selected if employee_ids is None else selected & set(employee_ids)
+
+
+def register(event, employee_ids, role=DEFAULT_ROLE, mode='Online', report=None):
+    """Register the employees for ``event``, skipping the ones already registered."""
+    report = report or RegistrationReport()
+    employee_ids = set(employee_ids)
+    with transaction.atomic():
+        registered = set(EventParticipation.objects.filter(event_id=event).values_list('emp_id', flat=True))
+        new_ids = employee_ids - registered
+        report.already_registered = len(employee_ids & registered)
+        if not new_ids:
+            return report
+
+        # ignore_conflicts: someone registering themselves meanwhile isn't an error
+        started = timezone.now()
+        new_ids = sorted(new_ids)
+        EventParticipation.objects.bulk_create(
+            (EventParticipation(emp_id_id=pk, event_id=event, role=role, mode=mode) for pk in new_ids),
+            batch_size=BATCH_SIZE, ignore_conflicts=True,
+        )
+
+        # the inserted rows, with their primary keys: updated_at (auto_now)
+        # tells them from a registration that won the race before the insert
+        created = []
+        for start in range(0, len(new_ids), BATCH_SIZE):
+            created.extend(
+                EventParticipation.objects
+                .filter(event_id=event, emp_id__in=new_ids[start:start + BATCH_SIZE], updated_at__gte=started)
+                .select_related('event_id').annotate(dept=F('emp_id__dept_id'))
+            )
+        report.created = len(created)
+        timeline.save_entries([timeline.participation_entry(participation) for participation in created])
+        analytics.mark_dirty(analytics.DEPARTMENT, *{participation.dept for participation in created})
+        analytics.mark_dirty(analytics.EVENT_TYPE, event.type_id_id)
+        analytics.mark_dirty(analytics.MONTH, analytics.month_key(event.from_date))
+        analytics.mark_dirty(analytics.MODE, *{analytics.mode_key(participation.mode) for participation in created})
+    return report
+
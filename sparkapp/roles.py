@@ -0,0 +1,49 @@
+# sparkapp/roles.py
+#
+# One place to answer "which groups is this user in?".
+# The group names are loaded once per request (memoized on the user object)
+# and kept in the cache between requests, so the context processors, the
+# user_passes_test predicates and the index redirect don't each hit the DB.
+
+from django.core.cache import cache
+
+ADMIN = 'Admin'
+TEACHER = 'Teacher'
+PRINCIPAL = 'Principal'
+
+ROLE_CACHE_TIMEOUT = 60 * 60  # 1 hour, membership changes invalidate it anyway
+_MEMO_ATTR = '_sparkapp_roles'
+
+
+def role_cache_key(user_id):
+    return f'sparkapp:roles:{user_id}'
+
+
+def get_user_roles(user):
+    """Return a frozenset with the names of the groups the user belongs to."""
+    if user is None or not user.is_authenticated:
+        return frozenset()
+
+    roles = getattr(user, _MEMO_ATTR, None)
+    if roles is not None:
+        return roles
+
+    key = role_cache_key(user.pk)
+    roles = cache.get(key)
+    if roles is None:
+        roles = frozenset(user.groups.values_list('name', flat=True))
+        cache.set(key, roles, ROLE_CACHE_TIMEOUT)
+
+    setattr(user, _MEMO_ATTR, roles)
+    return roles
+
+
+def has_role(user, name):
+    return name in get_user_roles(user)
+
+
+def invalidate_user_roles(*user_ids):
+    # Drop the cached role sets for the given users (called from signals)
+    user_ids = [pk for pk in user_ids if pk is not None]
+    if user_ids:
+        cache.delete_many([role_cache_key(pk) for pk in user_ids])
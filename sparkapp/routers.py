@@ -0,0 +1,114 @@
+# sparkapp/routers.py
+#
+# Read-replica routing. Writes always go to the primary ("default"). Reads
+# go to the replica only inside views marked with @replica_reads (dashboards,
+# listings, exports) and only when the session hasn't written recently, so a
+# teacher who just registered for an event doesn't read a replica that
+# hasn't caught up yet. ReplicaRoutingMiddleware (sparkapp/middleware.py)
+# keeps track of that per session.
+
+import contextvars
+import functools
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA_DB_ALIAS = 'replica'
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+class RoutingState:
+    """Routing state of the current request."""
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned          # the session wrote recently: read from the primary
+        self.read_replica = False     # inside a @replica_reads view
+        self.wrote = False            # this request wrote to the primary
+
+
+_state = contextvars.ContextVar('sparkapp_routing_state', default=None)
+
+
+def replica_configured():
+    return REPLICA_DB_ALIAS in settings.DATABASES
+
+
+def begin_request(pinned):
+    state = RoutingState(pinned)
+    _state.set(state)
+    return state
+
+
+def end_request():
+    _state.set(None)
+
+
+def replica_reads(view):
+    """
+    Let ``view`` read from the replica (unless the session is pinned to the
+    primary) when it's called with GET or HEAD. Other methods read from the
+    primary: a form validated against a lagging replica would pass its
+    uniqueness checks for rows created moments ago.
+    """
+
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            state = _state.get()
+            if state is None or request.method not in SAFE_METHODS:
+                return await view(request, *args, **kwargs)
+            previous, state.read_replica = state.read_replica, True
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                state.read_replica = previous
+
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        state = _state.get()
+        if state is None or request.method not in SAFE_METHODS:
+            return view(request, *args, **kwargs)
+        previous, state.read_replica = state.read_replica, True
+        try:
+            response = view(request, *args, **kwargs)
+        finally:
+            state.read_replica = previous
+        if response.streaming:
+            # the rows of a streamed export are read after the view returned
+            response.streaming_content = _reading_replica(response.streaming_content, state)
+        return response
+
+    return wrapper
+
+
+def _reading_replica(content, state):
+    # runs after the middleware finished the request, bring its state back
+    previous_state = _state.get()
+    _state.set(state)
+    state.read_replica = True
+    try:
+        yield from content
+    finally:
+        state.read_replica = False
+        _state.set(previous_state)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is not None and state.read_replica and not state.pinned and not state.wrote:
+            return REPLICA_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # same data on both, objects read from the replica can be saved
+        return True
@@ -0,0 +1,82 @@
+# sparkapp/search.py
+#
+# Server-side search for the employee directory. Words are normalized
+# (lower case, accents stripped) and stored in EmployeeSearchToken, so a
+# prefix search is a range scan on the token index instead of a LIKE over
+# the whole staff table.
+
+import re
+import unicodedata
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Employee, EmployeeSearchToken
+
+TOKEN_MAX_LENGTH = EmployeeSearchToken._meta.get_field('token').max_length
+_SPLIT = re.compile(r'[^\w]+')
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return text.lower().strip()
+
+
+def tokenize(text):
+    return [word for word in _SPLIT.split(normalize(text)) if word]
+
+
+def tokens_for(employee):
+    values = [employee.emp_name, employee.email_id, employee.user.username]
+    if employee.dept_id_id:
+        values.append(employee.dept_id.dept_name)
+
+    tokens = set()
+    for value in values:
+        tokens.update(tokenize(value))
+    # whole email / username too, so "jane.doe@" keeps matching as typed
+    tokens.add(normalize(employee.email_id))
+    tokens.add(normalize(employee.user.username))
+    return {token[:TOKEN_MAX_LENGTH] for token in tokens if token}
+
+
+def reindex_employees(employees):
+    employees = list(employees)
+    if not employees:
+        return
+    EmployeeSearchToken.objects.filter(employee__in=employees).delete()
+    EmployeeSearchToken.objects.bulk_create([
+        EmployeeSearchToken(employee=employee, token=token)
+        for employee in employees
+        for token in sorted(tokens_for(employee))
+    ])
+
+
+def directory_queryset():
+    return Employee.objects.select_related('user', 'dept_id')
+
+
+def search_employees(query, mode='prefix'):
+    """
+    Employees matching every word of ``query``.
+
+    mode='prefix' matches the start of any word (uses the token index),
+    mode='contains' matches anywhere inside a word.
+    """
+    employees = directory_queryset()
+    for term in tokenize(query):
+        term = term[:TOKEN_MAX_LENGTH]
+        if mode == 'contains':
+            match = Q(token__contains=term)
+        elif connection.vendor == 'postgresql':
+            # U+FFFF doesn't sort last under PostgreSQL's locale collations;
+            # LIKE 'term%' uses the varchar_pattern_ops index instead (0007)
+            match = Q(token__startswith=term)
+        else:
+            # token >= term AND token < term + U+FFFF is a prefix range the index can seek
+            match = Q(token__gte=term, token__lt=term + '\uffff')
+        employees = employees.filter(
+            pk__in=EmployeeSearchToken.objects.filter(match).values('employee_id')
+        )
+    return employees
@@ -0,0 +1,287 @@
+# sparkapp/signals.py
+
+from django.contrib.auth.models import Group, User
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import analytics, documents, sync, tasks, timeline
+from .backends import invalidate_cached_users
+from .caching import CACHED_MODELS, bump_model_version
+from .models import (
+    Department, Designation, Employee, EmployeeRoleAssignment, Event, EventParticipation, EventType, Role, TimelineEntry,
+)
+from .roles import invalidate_user_roles
+from .search import directory_queryset, reindex_employees
+from .thumbnails import generate_employee_variants, variants_exist
+
+
+# ---- Role cache invalidation ---- #
+@receiver(m2m_changed, sender=User.groups.through)
+def user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+
+    if not reverse:
+        # user.groups.add(...) / remove(...) / clear()
+        invalidate_user_roles(instance.pk)
+    elif action == 'pre_clear':
+        # group.user_set.clear(): pk_set is not given, collect the members first
+        invalidate_user_roles(*instance.user_set.values_list('pk', flat=True))
+    else:
+        # group.user_set.add(...) / remove(...)
+        invalidate_user_roles(*(pk_set or ()))
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    # A renamed or deleted group changes the role set of all its members
+    if instance.pk is not None and not kwargs.get('created'):
+        invalidate_user_roles(*instance.user_set.values_list('pk', flat=True))
+
+
+# ---- Cached logged-in users (sparkapp/backends.py) ---- #
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def cached_user_changed(sender, instance, **kwargs):
+    # any save: sessions are checked against the cached password hash
+    invalidate_cached_users(instance.pk)
+
+
+@receiver(post_save, sender=Employee)
+@receiver(post_delete, sender=Employee)
+def cached_user_employee_changed(sender, instance, **kwargs):
+    invalidate_cached_users(instance.user_id)
+
+
+@receiver(post_save, sender=Department)
+@receiver(post_save, sender=Designation)
+def cached_user_labels_changed(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        field = 'dept_id' if sender is Department else 'designation_id'
+        invalidate_cached_users(*Employee.objects.filter(**{field: instance}).values_list('user_id', flat=True))
+
+
+# ---- Employee directory search index ---- #
+@receiver(post_save, sender=Employee)
+def employee_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        reindex_employees([instance])
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, **kwargs):
+    # The username is part of the index; a brand new user has no Employee yet
+    if not created and not raw:
+        reindex_employees(directory_queryset().filter(user=instance))
+
+
+@receiver(post_save, sender=Department)
+def department_saved(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        reindex_employees(directory_queryset().filter(dept_id=instance))
+
+
+# ---- Profile picture variants ---- #
+@receiver(post_save, sender=Employee)
+def employee_profile_pic_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    name = instance.profile_pic.name if instance.profile_pic else ''
+    if name and variants_exist(name, instance.profile_pic_hash):
+        return
+    if instance.profile_pic_hash:
+        # the hash is of another picture: show the original until the new
+        # variants exist; update() so this receiver doesn't run again
+        Employee.objects.filter(pk=instance.pk).update(profile_pic_hash='')
+        instance.profile_pic_hash = ''
+        invalidate_cached_users(instance.user_id)
+    if name:
+        # resizing a phone photo takes a while, a worker does it
+        tasks.enqueue(generate_employee_variants, args=[instance.pk])
+
+
+# ---- Principal dashboard analytics ---- #
+def _remember_previous(instance, *fields):
+    # Values as stored before this save, to know which buckets an edit moves rows out of
+    previous = {}
+    if instance.pk is not None:
+        previous = type(instance)._default_manager.filter(pk=instance.pk).values(*fields).first() or {}
+    instance._analytics_previous = previous
+
+
+@receiver(pre_save, sender=EventParticipation)
+def participation_pre_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance._analytics_previous = analytics.participation_buckets(instance.pk) if instance.pk else {}
+
+
+@receiver(post_save, sender=EventParticipation)
+def participation_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_analytics_previous', {})
+    current = analytics.participation_buckets(instance.pk)
+    for metric in set(previous) | set(current):
+        analytics.mark_dirty(metric, previous.get(metric), current.get(metric))
+
+
+@receiver(pre_delete, sender=EventParticipation)
+def participation_deleted(sender, instance, **kwargs):
+    for metric, key in analytics.participation_buckets(instance.pk).items():
+        analytics.mark_dirty(metric, key)
+
+
+@receiver(pre_save, sender=Employee)
+def employee_pre_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _remember_previous(instance, 'dept_id')
+
+
+@receiver(post_save, sender=Employee)
+def employee_department_changed(sender, instance, raw=False, **kwargs):
+    previous = getattr(instance, '_analytics_previous', {})
+    if not raw and previous and previous['dept_id'] != instance.dept_id_id:
+        analytics.mark_dirty(analytics.DEPARTMENT, previous['dept_id'], instance.dept_id_id)
+
+
+@receiver(pre_save, sender=Event)
+def event_pre_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _remember_previous(instance, 'type_id', 'from_date')
+
+
+@receiver(post_save, sender=Event)
+def event_saved(sender, instance, raw=False, **kwargs):
+    previous = getattr(instance, '_analytics_previous', {})
+    if raw or not previous:
+        return  # a new event has no participations yet
+    if previous['type_id'] != instance.type_id_id:
+        analytics.mark_dirty(analytics.EVENT_TYPE, previous['type_id'], instance.type_id_id)
+    old_month, new_month = analytics.month_key(previous['from_date']), analytics.month_key(instance.from_date)
+    if old_month != new_month:
+        analytics.mark_dirty(analytics.MONTH, old_month, new_month)
+
+
+@receiver(pre_save, sender=EmployeeRoleAssignment)
+def role_assignment_pre_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _remember_previous(instance, 'role_id')
+
+
+@receiver(post_save, sender=EmployeeRoleAssignment)
+def role_assignment_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        previous = getattr(instance, '_analytics_previous', {})
+        analytics.mark_dirty(analytics.ACTIVE_ROLE, previous.get('role_id'), instance.role_id_id)
+
+
+@receiver(pre_delete, sender=EmployeeRoleAssignment)
+def role_assignment_deleted(sender, instance, **kwargs):
+    analytics.mark_dirty(analytics.ACTIVE_ROLE, instance.role_id_id)
+
+
+@receiver(post_save, sender=Department)
+@receiver(post_save, sender=EventType)
+@receiver(post_save, sender=Role)
+def analytics_label_changed(sender, instance, created, raw=False, **kwargs):
+    # Renames only change the label of the bucket
+    metric = {Department: analytics.DEPARTMENT, EventType: analytics.EVENT_TYPE, Role: analytics.ACTIVE_ROLE}[sender]
+    if not created and not raw:
+        analytics.mark_dirty(metric, instance.pk)
+
+
+# ---- Document blob reference counts ---- #
+DOCUMENT_FIELDS = {EmployeeRoleAssignment: 'document', EventParticipation: 'doc_link'}
+
+
+@receiver(pre_save, sender=EmployeeRoleAssignment)
+@receiver(pre_save, sender=EventParticipation)
+def document_pre_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    field = DOCUMENT_FIELDS[sender]
+    previous = ''
+    if instance.pk is not None:
+        previous = sender._default_manager.filter(pk=instance.pk).values_list(field, flat=True).first() or ''
+    instance._previous_document = previous
+
+
+@receiver(post_save, sender=EmployeeRoleAssignment)
+@receiver(post_save, sender=EventParticipation)
+def document_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    current = getattr(instance, DOCUMENT_FIELDS[sender]).name or ''
+    previous = getattr(instance, '_previous_document', '')
+    if current != previous:
+        documents.acquire(current)
+        documents.release(previous)
+    instance._previous_document = current
+
+
+@receiver(post_delete, sender=EmployeeRoleAssignment)
+@receiver(post_delete, sender=EventParticipation)
+def document_deleted(sender, instance, **kwargs):
+    documents.release(getattr(instance, DOCUMENT_FIELDS[sender]).name or '')
+
+
+# ---- Employee activity timeline ---- #
+TIMELINE_KINDS = {EventParticipation: TimelineEntry.PARTICIPATION, EmployeeRoleAssignment: TimelineEntry.ROLE_ASSIGNMENT}
+
+
+@receiver(post_save, sender=EventParticipation)
+def timeline_participation_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        timeline.save_entries([timeline.participation_entry(instance)])
+
+
+@receiver(post_save, sender=EmployeeRoleAssignment)
+def timeline_role_assignment_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        timeline.save_entries([timeline.role_assignment_entry(instance)])
+
+
+@receiver(post_delete, sender=EmployeeRoleAssignment)
+@receiver(post_delete, sender=EventParticipation)
+def timeline_source_deleted(sender, instance, **kwargs):
+    timeline.remove(TIMELINE_KINDS[sender], instance.pk)
+
+
+@receiver(post_save, sender=Event)
+def timeline_event_saved(sender, instance, created, raw=False, **kwargs):
+    # one UPDATE for every participant, however many there are
+    if not created and not raw:
+        TimelineEntry.objects.filter(
+            kind=TimelineEntry.PARTICIPATION,
+            source_id__in=EventParticipation.objects.filter(event_id=instance).values('pk'),
+        ).update(occurred_at=instance.from_date, ended_at=instance.to_date, title=instance.title)
+
+
+@receiver(post_save, sender=Role)
+def timeline_role_saved(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        TimelineEntry.objects.filter(
+            kind=TimelineEntry.ROLE_ASSIGNMENT,
+            source_id__in=EmployeeRoleAssignment.objects.filter(role_id=instance).values('pk'),
+        ).update(title=instance.role_name)
+
+
+# ---- Change feed tombstones (sparkapp/sync.py) ---- #
+@receiver(post_delete, sender=Employee)
+@receiver(post_delete, sender=EmployeeRoleAssignment)
+@receiver(post_delete, sender=EventParticipation)
+def sync_row_deleted(sender, instance, **kwargs):
+    sync.record_deletion(instance)
+
+
+# ---- Reference table caches ---- #
+def reference_table_changed(sender, **kwargs):
+    # After commit, so no request can cache the old rows under the new version
+    transaction.on_commit(lambda: bump_model_version(sender))
+
+
+for _model in CACHED_MODELS:
+    post_save.connect(reference_table_changed, sender=_model, dispatch_uid=f'cache-version-save-{_model.__name__}')
+    post_delete.connect(reference_table_changed, sender=_model, dispatch_uid=f'cache-version-delete-{_model.__name__}')
@@ -0,0 +1,117 @@
+# sparkapp/sync.py
+#
+# Change feed for external HR / payroll systems. Instead of downloading every
+# employee, role assignment and participation on each poll, a consumer keeps
+# the cursor of its last page and asks for what changed since.
+#
+# A change is a row whose updated_at moved (auto_now, set by save() and
+# bulk_create) or a SyncTombstone written when a row is deleted
+# (sparkapp/signals.py). Both are read in (timestamp, id) order on their own
+# index and merged, so a page is two range scans wherever the consumer is.
+# The cursor holds the position reached in each of the two streams.
+#
+# Rows are only published once they are SPARKAPP_SYNC_SETTLE_SECONDS old: a
+# transaction that is still open takes its updated_at before it commits, and
+# could otherwise land behind a cursor that was already handed out.
+
+import datetime
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Employee, EmployeeRoleAssignment, EventParticipation, SyncTombstone
+from .pagination import after_key, decode_cursor, encode_cursor
+
+RESOURCES = {
+    'employees': (Employee, [
+        'user', 'emp_name', 'email_id', 'phn_no', 'gender', 'DOB', 'date_of_joining', 'status',
+        'dept_id', 'designation_id', 'current_address', 'residential_address',
+    ]),
+    'role-assignments': (EmployeeRoleAssignment, ['emp_id', 'role_id', 'assigned_date', 'relieved_date', 'mode']),
+    'participations': (EventParticipation, ['emp_id', 'event_id', 'role', 'mode']),
+}
+RESOURCE_NAMES = {model: name for name, (model, _) in RESOURCES.items()}
+CHANGED_ORDERING = ('updated_at', 'id')
+DELETED_ORDERING = ('deleted_at', 'id')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _position(row, field):
+    # full precision: the JSON encoder would cut microseconds to milliseconds
+    return [row[field].isoformat(), row['id']]
+
+
+def _decode(resource, cursor):
+    """(changed position, deleted position) stored in ``cursor``, each [timestamp, id] or None."""
+    if not cursor:
+        return None, None
+    values = decode_cursor(cursor)
+    if not values or len(values) != 3 or values[0] != resource or not all(map(_valid_position, values[1:])):
+        raise InvalidCursor('The cursor is invalid or belongs to another resource.')
+    return values[1:]
+
+
+def _valid_position(position):
+    if position is None:
+        return True
+    return (
+        isinstance(position, list) and len(position) == 2 and isinstance(position[1], int)
+        and isinstance(position[0], str) and parse_datetime(position[0]) is not None
+    )
+
+
+def _stream(queryset, ordering, position, limit):
+    if position is not None:
+        queryset = queryset.filter(after_key(ordering, position))
+    return list(queryset.order_by(*ordering)[:limit])
+
+
+def changes(resource, cursor=None, page_size=None, now=None):
+    """
+    One page of the changes of ``resource`` after ``cursor``, oldest first:
+    {'changes': [...], 'cursor': ..., 'has_more': bool}. Keep the cursor for
+    the next poll even when has_more is false.
+    """
+    model, fields = RESOURCES[resource]
+    page_size = min(page_size or settings.SPARKAPP_SYNC_PAGE_SIZE, settings.SPARKAPP_SYNC_PAGE_SIZE)
+    changed_at, deleted_at = _decode(resource, cursor)
+    settled = (now or timezone.now()) - datetime.timedelta(seconds=settings.SPARKAPP_SYNC_SETTLE_SECONDS)
+
+    changed = _stream(
+        model.objects.filter(updated_at__lt=settled).values('id', 'updated_at', *fields),
+        CHANGED_ORDERING, changed_at, page_size + 1,
+    )
+    deleted = _stream(
+        SyncTombstone.objects.filter(resource=resource, deleted_at__lt=settled).values('id', 'object_id', 'deleted_at'),
+        DELETED_ORDERING, deleted_at, page_size + 1,
+    )
+
+    merged = sorted(
+        [(row['updated_at'], 0, row) for row in changed] + [(row['deleted_at'], 1, row) for row in deleted],
+        key=lambda item: (item[0], item[1], item[2]['id']),
+    )
+    page = merged[:page_size]
+    items = []
+    for _, is_deletion, row in page:
+        if is_deletion:
+            items.append({'op': 'delete', 'id': row['object_id'], 'at': row['deleted_at']})
+            deleted_at = _position(row, 'deleted_at')
+        else:
+            data = {field: row[field] for field in fields}
+            items.append({'op': 'upsert', 'id': row['id'], 'at': row['updated_at'], 'data': data})
+            changed_at = _position(row, 'updated_at')
+
+    return {
+        'resource': resource,
+        'changes': items,
+        'cursor': encode_cursor([resource, changed_at, deleted_at]),
+        'has_more': len(merged) > page_size,
+    }
+
+
+def record_deletion(instance):
+    SyncTombstone.objects.create(resource=RESOURCE_NAMES[type(instance)], object_id=instance.pk)
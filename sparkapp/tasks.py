@@ -0,0 +1,165 @@
+# sparkapp/tasks.py
+#
+# A small background task queue kept in the database (the Task model), so it
+# needs nothing besides SQLite. Views enqueue work and return at once;
+# ``manage.py run_worker`` runs it.
+#
+#     @task(max_attempts=3)
+#     def generate_profile_variants(employee_id): ...
+#
+#     enqueue(generate_profile_variants, args=[employee.pk], user=request.user)
+#
+# Workers claim a task with a conditional UPDATE (status queued -> running),
+# which only one of them can win, so no row locks are needed. A task that
+# raises is retried after an exponential backoff until max_attempts, and
+# tasks left running by a worker that died are put back in the queue.
+# Arguments and results go through JSON; tasks look rows up by id.
+
+import datetime
+import logging
+import random
+import socket
+import threading
+import traceback
+from importlib import import_module
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+def task(max_attempts=3):
+    """Register a function as a task, under its dotted path."""
+
+    def decorator(func):
+        func.task_name = f'{func.__module__}.{func.__qualname__}'
+        func.max_attempts = max_attempts
+        _registry[func.task_name] = func
+        return func
+
+    return decorator
+
+
+def result_storage():
+    """Where tasks keep result files: SPARKAPP_PRIVATE_ROOT, served only by views.task_result."""
+    return FileSystemStorage(location=settings.SPARKAPP_PRIVATE_ROOT)
+
+
+def get_task(name):
+    if name not in _registry:
+        # a worker may not have imported the module defining it yet
+        module, _, _ = name.rpartition('.')
+        try:
+            import_module(module)
+        except ImportError:
+            pass
+    return _registry.get(name)
+
+
+def enqueue(func, args=(), kwargs=None, user=None, delay=None):
+    """Queue ``func`` (a @task) to run in a worker; returns the Task."""
+    task_row = Task.objects.create(
+        name=func.task_name, args=list(args), kwargs=kwargs or {},
+        max_attempts=func.max_attempts, user=user if user is not None and user.is_authenticated else None,
+        run_at=timezone.now() + (delay or datetime.timedelta(0)),
+    )
+    if settings.SPARKAPP_TASKS_EAGER:
+        # no worker (development): run it once the row is committed
+        transaction.on_commit(lambda: execute(claim(worker_name(), pk=task_row.pk)))
+    return task_row
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{threading.get_native_id()}'
+
+
+# ---- Running ---- #
+def claim(worker, pk=None):
+    """Take the oldest due task (or task ``pk``) for ``worker``, None if there is none."""
+    now = timezone.now()
+    candidates = Task.objects.filter(status=Task.QUEUED)
+    if pk is not None:
+        candidates = candidates.filter(pk=pk)
+    else:
+        candidates = candidates.filter(run_at__lte=now).order_by('run_at', 'pk')
+    for candidate in candidates.values_list('pk', flat=True)[:10]:
+        # another worker may take it first, then try the next one
+        claimed = Task.objects.filter(pk=candidate, status=Task.QUEUED).update(
+            status=Task.RUNNING, locked_by=worker, locked_at=now, attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Task.objects.get(pk=candidate)
+    return None
+
+
+def backoff(attempts):
+    """Delay before retry number ``attempts``: doubling from the base, capped, with jitter."""
+    delay = min(settings.SPARKAPP_TASKS_BACKOFF * 2 ** (attempts - 1), settings.SPARKAPP_TASKS_BACKOFF_MAX)
+    return datetime.timedelta(seconds=delay * random.uniform(0.5, 1))
+
+
+def execute(task_row):
+    """Run a claimed task and record how it went. Returns the task."""
+    if task_row is None:
+        return None
+    func = get_task(task_row.name)
+    try:
+        if func is None:
+            raise LookupError(f'Unknown task {task_row.name}')
+        result = func(*task_row.args, **task_row.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning('Task %s #%s failed (attempt %s of %s)',
+                       task_row.name, task_row.pk, task_row.attempts, task_row.max_attempts, exc_info=True)
+        if func is not None and task_row.attempts < task_row.max_attempts:
+            changes = dict(status=Task.QUEUED, run_at=timezone.now() + backoff(task_row.attempts))
+        else:
+            changes = dict(status=Task.FAILED, finished_at=timezone.now())
+        changes.update(error=error, locked_by='', locked_at=None)
+    else:
+        changes = dict(status=Task.DONE, result=result, error='', locked_by='', locked_at=None,
+                       finished_at=timezone.now())
+    Task.objects.filter(pk=task_row.pk).update(**changes)
+    for field, value in changes.items():
+        setattr(task_row, field, value)
+    return task_row
+
+
+def run_pending(worker=None):
+    """Run every due task in this thread, until the queue is empty. Returns how many ran."""
+    worker = worker or worker_name()
+    count = 0
+    while execute(claim(worker)) is not None:
+        count += 1
+    return count
+
+
+def requeue_stale():
+    """Put back tasks whose worker stopped answering; they count as a failed attempt."""
+    cutoff = timezone.now() - datetime.timedelta(seconds=settings.SPARKAPP_TASKS_TIMEOUT)
+    stale = Task.objects.filter(status=Task.RUNNING, locked_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Task.FAILED, error='The worker running this task stopped.', finished_at=timezone.now(),
+        locked_by='', locked_at=None,
+    )
+    requeued = stale.update(status=Task.QUEUED, run_at=timezone.now(), locked_by='', locked_at=None)
+    return requeued + failed
+
+
+def purge():
+    """Delete finished tasks older than SPARKAPP_TASKS_KEEP_DAYS, with their result files."""
+    cutoff = timezone.now() - datetime.timedelta(days=settings.SPARKAPP_TASKS_KEEP_DAYS)
+    old = Task.objects.filter(status__in=[Task.DONE, Task.FAILED], finished_at__lt=cutoff)
+    storage = result_storage()
+    for result in old.values_list('result', flat=True).iterator():
+        if isinstance(result, dict) and result.get('file'):
+            storage.delete(result['file'])
+    return old.delete()[0]
@@ -0,0 +1,61 @@
+from django import template
+from django.templatetags.static import static
+from django.forms.utils import flatatt
+from django.urls import reverse
+from django.utils.html import format_html
+
+from sparkapp.thumbnails import pick_variant
+
+register = template.Library()
+
+DEFAULT_PICTURE = 'sparkapp/default.webp'  # a static file, uploads are never served from MEDIA_URL
+
+
+def _variant_url(employee, digest, size, extension):
+    # served by views.profile_picture, which checks the user is logged in
+    return reverse('profile_picture_variant', args=[employee.pk, digest, size, extension])
+
+
+def _srcset(employee, digest, display_size, extension):
+    entries = []
+    seen = set()
+    for density in (1, 2):
+        size = pick_variant(display_size, density)
+        if size not in seen:
+            seen.add(size)
+            entries.append(f'{_variant_url(employee, digest, size, extension)} {density}x')
+    return ', '.join(entries)
+
+
+@register.simple_tag
+def profile_picture(employee, size, **attrs):
+    """
+    Render an employee's profile picture at ``size`` CSS pixels, using the
+    smallest resized variant that is sharp at 1x and 2x:
+
+        {% profile_picture user.employee 40 class="user-avatar" %}
+
+    Falls back to the original upload while its variants don't exist yet,
+    and to the default picture when there is no employee or no upload.
+    """
+    size = int(size)
+    attrs.setdefault('alt', 'Profile Picture')
+    attrs.update(width=size, height=size)
+
+    profile_pic = getattr(employee, 'profile_pic', None)
+    if not profile_pic:
+        attrs['alt'] = 'Default Profile Picture'
+        return format_html('<img src="{}"{}>', static(DEFAULT_PICTURE), flatatt(attrs))
+
+    digest = getattr(employee, 'profile_pic_hash', '')
+    if not digest:
+        return format_html('<img src="{}"{}>', reverse('profile_picture', args=[employee.pk]), flatatt(attrs))
+
+    src = _variant_url(employee, digest, pick_variant(size), 'jpg')
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}"><img src="{}" srcset="{}"{}></picture>',
+        _srcset(employee, digest, size, 'webp'),
+        src,
+        _srcset(employee, digest, size, 'jpg'),
+        flatatt(attrs),
+    )
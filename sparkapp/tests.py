@@ -1,3 +1,1941 @@
-from django.test import TestCase
+import contextvars
+import csv
+import datetime
+import hashlib
+import importlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections
+from django.template import Context, Template
+from django.conf import settings
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.test import (
+    AsyncRequestFactory, Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from .models import (
+    ChunkedUpload, Department, Designation, DocumentBlob, Employee, EmployeeRoleAssignment, Event,
+    EventParticipation, EventType, Role, SyncTombstone, Task, TimelineEntry, Venue,
+)
+from . import analytics, backends, benchmark, calendar, documents, registrations, tasks, thumbnails, timeline, uploads, views
+from .caching import cached_objects, model_version
+from .forms import EmployeeForm, EventForm
+from .middleware import QueryCountMiddleware, ReplicaRoutingMiddleware
+from .pagination import encode_cursor
+from .routers import ReplicaRouter, replica_reads
+from .onboarding import openpyxl
+
+TEACHERS = 40
+EVENTS = 15
+
+# Seeding creates dozens of users, don't pay the real PBKDF2 cost for each
+fast_hasher = override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+
+
+def seed_institution(teachers=TEACHERS, events=EVENTS):
+    """Create a small but realistic institution and return the login users."""
+    groups = {name: Group.objects.create(name=name) for name in ('Admin', 'Teacher', 'Principal')}
+
+    departments = Department.objects.bulk_create(
+        [Department(dept_name=name) for name in ('Computer Science', 'Physics', 'Commerce', 'English')]
+    )
+    designations = Designation.objects.bulk_create(
+        [Designation(designation_name=name) for name in ('Assistant Professor', 'Associate Professor', 'Professor')]
+    )
+    event_types = EventType.objects.bulk_create(
+        [EventType(type_description=name) for name in ('Workshop', 'FDP', 'Seminar')]
+    )
+    venues = Venue.objects.bulk_create(
+        [Venue(name=f'Hall {i}', address='Main Block') for i in range(3)]
+    )
+    roles = Role.objects.bulk_create(
+        [Role(role_name=name, role_description=name) for name in ('HOD', 'Coordinator', 'Examiner')]
+    )
+
+    start = timezone.now() - datetime.timedelta(days=365)
+    event_rows = Event.objects.bulk_create([
+        Event(
+            title=f'Event {i}',
+            type_id=event_types[i % len(event_types)],
+            from_date=start + datetime.timedelta(days=7 * i),
+            to_date=start + datetime.timedelta(days=7 * i + 1),
+            venue=venues[i % len(venues)],
+        )
+        for i in range(events)
+    ])
+
+    def make_user(username, group):
+        user = User.objects.create_user(username=username, email=f'{username}@example.com', password='pass12345')
+        user.groups.add(groups[group])
+        return user
+
+    teacher_users = []
+    employees = []
+    for i in range(teachers):
+        user = make_user(f'teacher{i}', 'Teacher')
+        teacher_users.append(user)
+        employees.append(Employee(
+            user=user,
+            emp_name=f'Teacher {i}',
+            email_id=f'teacher{i}@example.com',
+            phn_no='9876543210',
+            dept_id=departments[i % len(departments)],
+            designation_id=designations[i % len(designations)],
+            gender='Female' if i % 2 else 'Male',
+            status='Active',
+        ))
+    employees = Employee.objects.bulk_create(employees)
+
+    EventParticipation.objects.bulk_create([
+        EventParticipation(emp_id=emp, event_id=event_rows[(i + j) % len(event_rows)], role='Participant', mode='Online')
+        for i, emp in enumerate(employees)
+        for j in range(min(5, events))
+    ])
+    EmployeeRoleAssignment.objects.bulk_create([
+        EmployeeRoleAssignment(
+            emp_id=emp, role_id=roles[(i + j) % len(roles)],
+            assigned_date=datetime.date(2020 + j, 6, 1), mode='offline',
+        )
+        for i, emp in enumerate(employees)
+        for j in range(3)
+    ])
+
+    admin = make_user('admin', 'Admin')
+    Employee.objects.create(
+        user=admin, emp_name='Admin', email_id='admin@example.com', phn_no='9876543210',
+        dept_id=departments[0], gender='Male', status='Active',
+    )
+    principal = make_user('principal', 'Principal')
+    timeline.rebuild()  # the participations and assignments were bulk created
+    return {
+        'admin': admin,
+        'principal': principal,
+        'teacher': teacher_users[0],
+        'department': departments[0],
+        'designation': designations[0],
+        'event_type': event_types[0],
+    }
+
+
+@fast_hasher
+class RoleContextTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_institution(teachers=2, events=1)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.data['admin'])
+
+    def group_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        return response, [query for query in queries if 'auth_group' in query['sql']]
+
+    def test_flags_come_from_one_group_query(self):
+        # the view's user_passes_test and the three context processors share it
+        response, queries = self.group_queries(reverse('admin_dashboard'))
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(
+            (response.context['is_admin'], response.context['is_teacher'], response.context['is_principal']),
+            (True, False, False),
+        )
+        response, queries = self.group_queries(reverse('admin_dashboard'))
+        self.assertEqual(queries, [])  # cached between requests
+        self.assertTrue(response.context['is_admin'])
+
+    def test_membership_change_updates_the_flags(self):
+        self.client.get(reverse('admin_dashboard'))
+        self.data['admin'].groups.add(Group.objects.get(name='Teacher'))
+        response, queries = self.group_queries(reverse('admin_dashboard'))
+        self.assertEqual(len(queries), 1)
+        self.assertTrue(response.context['is_teacher'])
+
+
+@fast_hasher
+class QueryBudgetTests(TestCase):
+    """
+    Every page has a query budget. A template change that adds a lazy FK
+    access (an N+1 over the seeded rows) blows the budget and fails here.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_institution()
+
+    def setUp(self):
+        cache.clear()
+
+    def assertQueryBudget(self, user, url, budget, status=200):
+        client = Client()
+        client.force_login(self.data[user])
+        client.get(url)  # warm the per-user caches (role set, ...)
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(url)
+        self.assertEqual(response.status_code, status, url)
+        self.assertLessEqual(
+            len(ctx.captured_queries), budget,
+            '%s issued %d queries (budget %d):\n%s' % (
+                url, len(ctx.captured_queries), budget,
+                '\n'.join(q['sql'] for q in ctx.captured_queries),
+            ),
+        )
+
+    def test_admin_pages(self):
+        budgets = {
+            reverse('admin_dashboard'): 1,
+            reverse('manage_admin_employee'): 3,
+            reverse('employee_search') + '?q=teach': 3,
+            reverse('manage_designation'): 1,
+            reverse('add_designation'): 1,
+            reverse('edit_designation', args=[self.data['designation'].pk]): 2,
+            reverse('manage_event_type'): 1,
+            reverse('add_event_type'): 1,
+            reverse('edit_event_type', args=[self.data['event_type'].pk]): 2,
+            reverse('manage_department'): 1,
+            reverse('add_department'): 1,
+            reverse('edit_department', args=[self.data['department'].pk]): 2,
+            reverse('manage_venue'): 1,
+            reverse('manage_role'): 1,
+            reverse('manage_event'): 1,
+            reverse('add_emp'): 1,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                self.assertQueryBudget('admin', url, budget)
+
+    def test_teacher_pages(self):
+        teacher = self.data['teacher']
+        budgets = {
+            reverse('teacher_dashboard'): 2,
+            reverse('manage_event_participation'): 1,
+            reverse('manage_role_assignment'): 2,
+            reverse('edit_employee', args=[teacher.pk]): 5,
+            reverse('add_emp'): 1,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                self.assertQueryBudget('teacher', url, budget)
+
+    def test_principal_pages(self):
+        budgets = {
+            reverse('principal_dashboard'): 2,
+            reverse('teacher_details', args=[self.data['teacher'].pk]): 3,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                self.assertQueryBudget('principal', url, budget)
+
+    def test_index_redirects_without_group_queries(self):
+        self.assertQueryBudget('teacher', reverse('index'), 1, status=302)
+
+
+@fast_hasher
+class PrincipalRosterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_institution(events=1)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.data['principal'])
+
+    def test_keyset_pages_cover_roster_once(self):
+        seen = []
+        url = reverse('principal_dashboard')
+        while url:
+            response = self.client.get(url)
+            seen.extend(emp.pk for emp in response.context['teachers'])
+            next_query = response.context['next_query']
+            url = reverse('principal_dashboard') + '?' + next_query if next_query else None
+
+        expected = Employee.objects.filter(user__groups__name='Teacher').order_by('emp_name', 'id')
+        self.assertEqual(seen, list(expected.values_list('pk', flat=True)))
+
+    def test_filters_are_applied(self):
+        department = self.data['department']
+        response = self.client.get(reverse('principal_dashboard'), {'dept': department.pk, 'status': 'Active'})
+        teachers = response.context['teachers']
+        self.assertTrue(teachers)
+        self.assertTrue(all(emp.dept_id_id == department.pk for emp in teachers))
+
+        response = self.client.get(reverse('principal_dashboard'), {'status': 'Inactive'})
+        self.assertEqual(response.context['teachers'], [])
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        first = self.client.get(reverse('principal_dashboard'))
+        broken = self.client.get(reverse('principal_dashboard'), {'after': '!!not-a-cursor'})
+        self.assertEqual(first.context['teachers'], broken.context['teachers'])
+
+    def test_tampered_cursor_falls_back_to_first_page(self):
+        first = self.client.get(reverse('principal_dashboard'))
+        for values in (['a', 'b'], [None, 1], ['x', {'id': 1}]):
+            response = self.client.get(reverse('principal_dashboard'), {'after': encode_cursor(values)})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(first.context['teachers'], response.context['teachers'])
+
+
+@fast_hasher
+class EmployeeSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_institution(teachers=30, events=1)
+        call_command('rebuild_employee_search', stdout=StringIO())
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.data['admin'])
+
+    def search(self, **params):
+        return self.client.get(reverse('employee_search'), params).json()
+
+    def test_prefix_search_over_name_email_username_and_department(self):
+        self.assertEqual([r['emp_name'] for r in self.search(q='teacher 12')['results']], ['Teacher 12'])
+        self.assertEqual([r['username'] for r in self.search(q='teacher7@example')['results']], ['teacher7'])
+        physics = self.search(q='phys')['results']
+        self.assertTrue(physics)
+        self.assertTrue(all(r['department'] == 'Physics' for r in physics))
+        self.assertEqual(self.search(q='nobody')['results'], [])
+
+    def test_contains_mode(self):
+        self.assertEqual(self.search(q='ysic')['results'], [])
+        self.assertTrue(self.search(q='ysic', mode='contains')['results'])
+
+    def test_results_are_paginated(self):
+        first = self.search(q='teacher')
+        self.assertEqual(len(first['results']), 25)
+        second = self.search(q='teacher', after=first['next'])
+        self.assertIsNone(second['next'])
+        names = [r['emp_name'] for r in first['results'] + second['results']]
+        self.assertEqual(len(set(names)), 30)
+
+    def test_tampered_cursor_falls_back_to_first_page(self):
+        response = self.client.get(reverse('employee_search'), {'q': 'teacher', 'after': encode_cursor(['a', 'b'])})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], self.search(q='teacher')['results'])
+
+    def test_html_fragment(self):
+        response = self.client.get(reverse('employee_search'), {'q': 'teacher 3', 'format': 'html'})
+        self.assertContains(response, '<td>teacher3</td>', html=True)
+        self.assertNotIn('X-Next-Cursor', response)
+
+    def test_index_follows_renames(self):
+        department = self.data['department']
+        department.dept_name = 'Data Science'
+        department.save()
+        self.assertTrue(self.search(q='data sci')['results'])
+
+        user = self.data['teacher']
+        user.username = 'zed'
+        user.save()
+        self.assertEqual([r['user_id'] for r in self.search(q='zed')['results']], [user.pk])
+
+    def test_requires_admin(self):
+        self.client.force_login(self.data['teacher'])
+        self.assertEqual(self.client.get(reverse('employee_search'), {'q': 'x'}).status_code, 302)
+
+
+@fast_hasher
+class HotPathIndexTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_institution(teachers=2, events=2)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_duplicate_participation_is_rejected(self):
+        teacher = self.data['teacher']
+        event = EventParticipation.objects.filter(emp_id__user=teacher).first().event_id
+        # only upcoming events can be picked
+        Event.objects.filter(pk=event.pk).update(
+            from_date=timezone.now() + datetime.timedelta(days=1), to_date=timezone.now() + datetime.timedelta(days=2))
+        self.client.force_login(teacher)
+
+        response = self.client.post(reverse('manage_event_participation'), {'event_id': event.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertFormError(response.context['form'], 'event_id', 'You are already registered for this event.')
+        self.assertEqual(EventParticipation.objects.filter(emp_id__user=teacher, event_id=event).count(), 1)
+
+
+ONBOARDING_CSV = (
+    'username,password,emp_name,email,department,phone,designation,gender,group,date_of_joining\n'
+    'new1,secret-pass,New One,new1@example.com,physics,9876543210,Professor,female,Teacher,2024-06-01\n'
+    'new2,short,New Two,new2@example.com,Physics,9876543211,,male,,\n'
+    'new3,secret-pass,New Three,new3@example.com,Astrology,9876543212,,male,,\n'
+    'teacher0,secret-pass,Taken,taken@example.com,Physics,9876543213,,male,,\n'
+    'new4,secret-pass,New Four,new4@example.com,Commerce,9876543214,,male,Principal,\n'
+    'new5,secret-pass,New Five,new4@example.com,Commerce,9876543215,,male,,\n'
+)
+
+
+@fast_hasher
+class BulkOnboardingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_institution(teachers=2, events=1)
+
+    def setUp(self):
+        cache.clear()
+
+    def upload(self, content, name='staff.csv', **extra):
+        self.client.force_login(self.data['admin'])
+        upload = SimpleUploadedFile(name, content.encode() if isinstance(content, str) else content)
+        return self.client.post(reverse('import_employees'), {'file': upload, **extra})
+
+    def test_valid_rows_are_created_and_bad_rows_reported(self):
+        with self.settings(SPARKAPP_ONBOARDING_WORKERS=1):
+            response = self.upload(ONBOARDING_CSV)
+        report = response.context['report']
+        self.assertEqual(report.created, 2)
+        self.assertEqual(sorted({row for row, _ in report.errors}), [3, 4, 5, 7])
+
+        employee = Employee.objects.select_related('user', 'dept_id', 'designation_id').get(user__username='new1')
+        self.assertEqual(employee.dept_id.dept_name, 'Physics')
+        self.assertEqual(employee.designation_id.designation_name, 'Professor')
+        self.assertEqual(employee.gender, 'Female')
+        self.assertEqual(employee.date_of_joining, datetime.date(2024, 6, 1))
+        self.assertTrue(employee.user.check_password('secret-pass'))
+        self.assertEqual(list(employee.user.groups.values_list('name', flat=True)), ['Teacher'])
+        self.assertEqual(
+            list(User.objects.get(username='new4').groups.values_list('name', flat=True)), ['Principal'],
+        )
+        # the directory search index is filled for bulk-created rows too
+        self.assertTrue(employee.search_tokens.filter(token='new1').exists())
+
+    def test_dry_run_writes_nothing(self):
+        response = self.upload(ONBOARDING_CSV, dry_run='on')
+        self.assertEqual(response.context['report'].created, 2)
+        self.assertFalse(User.objects.filter(username__startswith='new').exists())
+
+    def test_groups_and_passwords_are_validated(self):
+        response = self.upload(
+            'username,password,emp_name,email,department,phone,gender,group\n'
+            'typo1,secret-pass,Typo One,typo1@example.com,Physics,9876543210,Male,Teachr\n'
+            'weak1,12345678,Weak One,weak1@example.com,Physics,9876543211,Male,Teacher\n'
+            'like1,like1like,Like One,like1@example.com,Physics,9876543212,Male,\n'
+            'good1,secret-pass,Good One,good1@example.com,Physics,9876543213,Male,admin\n'
+        )
+        report = response.context['report']
+        self.assertEqual(report.created, 1)
+        self.assertEqual(sorted({row for row, _ in report.errors}), [2, 3, 4])
+        self.assertIn('group must be one of Admin, Teacher, Principal', dict(report.errors)[2])
+        self.assertFalse(Group.objects.filter(name__iexact='teachr').exists())
+        self.assertEqual(list(User.objects.get(username='good1').groups.values_list('name', flat=True)), ['Admin'])
+
+    def test_required_employee_fields(self):
+        response = self.upload(
+            'username,password,emp_name,email,department,phone,gender\n'
+            'nophone,secret-pass,No Phone,nophone@example.com,Physics,,Male\n'
+            'nogender,secret-pass,No Gender,nogender@example.com,Physics,9876543210,\n'
+        )
+        errors = dict(response.context['report'].errors)
+        self.assertIn('phone is required', errors[2])
+        self.assertIn('gender is required', errors[3])
+        self.assertFalse(Employee.objects.filter(user__username__startswith='no').exists())
+
+    def test_values_that_do_not_fit_their_field_reject_only_their_row(self):
+        with self.settings(SPARKAPP_ONBOARDING_WORKERS=1):
+            response = self.upload(
+                'username,password,emp_name,email,department,phone,gender\n'
+                f'{"u" * 151},secret-pass,Long Username,long@example.com,Physics,9876543210,Male\n'
+                'bad name!,secret-pass,Bad Username,bad@example.com,Physics,9876543211,Male\n'
+                f'longname,secret-pass,{"N" * 201},longname@example.com,Physics,9876543212,Male\n'
+                'fine1,secret-pass,Fine One,fine1@example.com,Physics,9876543213,Male\n'
+            )
+        report = response.context['report']
+        self.assertEqual(report.created, 1)
+        errors = dict(report.errors)
+        self.assertIn('username can be at most 150 characters', errors[2])
+        self.assertIn('invalid username "bad name!"', errors[3])
+        self.assertIn('emp_name can be at most 200 characters', errors[4])
+        self.assertTrue(User.objects.filter(username='fine1').exists())
+
+    def test_bad_header_and_file_type(self):
+        response = self.upload('name,email\nx,y\n')
+        self.assertFormError(response.context['form'], 'file', 'Missing column(s): username, password, emp_name, department, phone, gender')
+        response = self.upload('whatever', name='staff.txt')
+        self.assertIsNone(response.context['report'])
+
+    def test_command_with_password_hashing_pool(self):
+        rows = ''.join(
+            f'bulk{i},secret-pass,Bulk {i},bulk{i}@example.com,English,98765432{i:02},Other\n' for i in range(12)
+        )
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as handle:
+            handle.write('username,password,emp_name,email,department,phone,gender\n' + rows)
+        self.addCleanup(os.remove, handle.name)
+
+        out = StringIO()
+        call_command('import_employees', handle.name, batch_size=5, workers=2, stdout=out, stderr=StringIO())
+        self.assertIn('Imported 12 employee(s), 0 row(s) rejected.', out.getvalue())
+        self.assertEqual(Employee.objects.filter(dept_id__dept_name='English', user__username__startswith='bulk').count(), 12)
+
+    @skipUnless(openpyxl, 'openpyxl is not installed')
+    def test_xlsx_upload(self):
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.append(['username', 'password', 'emp_name', 'email', 'department', 'phone', 'gender', 'date_of_joining'])
+        sheet.append(['xl1', 'secret-pass', 'Xl One', 'xl1@example.com', 'Physics', 9876543210, 'Female',
+                      datetime.datetime(2023, 1, 2)])
+        buffer = BytesIO()
+        workbook.save(buffer)
+
+        with self.settings(SPARKAPP_ONBOARDING_WORKERS=1):
+            response = self.upload(buffer.getvalue(), name='staff.xlsx')
+        self.assertEqual(response.context['report'].errors, [])
+        employee = Employee.objects.get(user__username='xl1')
+        self.assertEqual((employee.phn_no, employee.date_of_joining), ('9876543210', datetime.date(2023, 1, 2)))
+
+
+def make_photo(width=600, height=300, orientation=None):
+    # left half red, right half blue, so a rotation is visible in the output
+    image = Image.new('RGB', (width, height), 'red')
+    image.paste('blue', (width // 2, 0, width, height))
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    exif[0x010F] = 'PhoneMaker'  # camera make, must not survive
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', exif=exif.tobytes())
+    return SimpleUploadedFile('photo.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+
+@fast_hasher
+class ProfilePictureVariantTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_institution(teachers=1, events=1)
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        override = self.settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.employee = Employee.objects.get(user=self.data['teacher'])
+
+    def save_picture(self, photo):
+        self.employee.profile_pic = photo
+        self.employee.save()
+        tasks.run_pending()  # what run_worker does
+        self.employee.refresh_from_db()
+
+    def test_variants_are_generated_by_a_task(self):
+        self.employee.profile_pic = make_photo(orientation=6)  # "rotate 90° clockwise"
+        self.employee.save()
+        self.assertEqual(self.employee.profile_pic_hash, '')  # queued, not done in the request
+        self.assertEqual(tasks.run_pending(), 1)
+        self.employee.refresh_from_db()
+        digest = self.employee.profile_pic_hash
+        self.assertEqual(len(digest), thumbnails.HASH_LENGTH)
+
+        name = self.employee.profile_pic.name
+        for variant in thumbnails.variant_names(name, digest):
+            self.assertTrue(default_storage.exists(variant), variant)
+
+        with default_storage.open(thumbnails.variant_name(name, digest, 128, 'jpg')) as handle:
+            image = Image.open(handle)
+            image.load()
+        self.assertEqual(image.size, (128, 128))
+        self.assertNotIn(0x010F, image.getexif())
+        # after the rotation the red half is on top
+        top, bottom = image.getpixel((64, 5)), image.getpixel((64, 122))
+        self.assertGreater(top[0], top[2])
+        self.assertGreater(bottom[2], bottom[0])
+
+        with default_storage.open(thumbnails.variant_name(name, digest, 40, 'webp')) as handle:
+            self.assertEqual(Image.open(handle).format, 'WEBP')
+
+    def test_small_images_are_not_upscaled(self):
+        self.save_picture(make_photo(100, 80))
+        name, digest = self.employee.profile_pic.name, self.employee.profile_pic_hash
+        with default_storage.open(thumbnails.variant_name(name, digest, 512, 'jpg')) as handle:
+            self.assertEqual(Image.open(handle).size, (80, 80))
+
+    def test_template_tag(self):
+        template = Template('{% load profile_pics %}{% profile_picture employee 40 class="avatar" %}')
+        self.assertIn('default.webp', template.render(Context({'employee': ''})))
+
+        self.save_picture(make_photo())
+        html = template.render(Context({'employee': self.employee}))
+        name, digest = self.employee.profile_pic.name, self.employee.profile_pic_hash
+        self.assertIn('<source type="image/webp" srcset="%s 1x, %s 2x">' % (
+            reverse('profile_picture_variant', args=[self.employee.pk, digest, 40, 'webp']),
+            reverse('profile_picture_variant', args=[self.employee.pk, digest, 128, 'webp']),
+        ), html)
+        self.assertIn('class="avatar"', html)
+
+        self.client.force_login(self.data['teacher'])
+        response = self.client.get(reverse('profile_picture_variant', args=[self.employee.pk, digest, 128, 'webp']))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        with default_storage.open(thumbnails.variant_name(name, digest, 128, 'webp')) as handle:
+            self.assertEqual(b''.join(response.streaming_content), handle.read())
+        stale = reverse('profile_picture_variant', args=[self.employee.pk, '0' * thumbnails.HASH_LENGTH, 128, 'webp'])
+        self.assertEqual(self.client.get(stale).status_code, 404)
+
+    def test_command_resumes_missing_variants(self):
+        self.save_picture(make_photo())
+        name, digest = self.employee.profile_pic.name, self.employee.profile_pic_hash
+        default_storage.delete(thumbnails.variant_name(name, digest, 512, 'webp'))
+        Employee.objects.filter(pk=self.employee.pk).update(profile_pic_hash='')
+
+        out = StringIO()
+        call_command('generate_profile_thumbnails', workers=1, stdout=out)
+        self.assertIn('1 profile picture(s) to process.', out.getvalue())
+        self.employee.refresh_from_db()
+        self.assertEqual(self.employee.profile_pic_hash, digest)
+        self.assertTrue(thumbnails.variants_exist(name, digest))
+
+        out = StringIO()
+        call_command('generate_profile_thumbnails', workers=1, stdout=out)
+        self.assertIn('0 profile picture(s) to process.', out.getvalue())
+
+    def test_command_reports_a_failing_picture_and_goes_on(self):
+        self.save_picture(make_photo())
+        Employee.objects.filter(pk=self.employee.pk).update(profile_pic_hash='')
+
+        out, err = StringIO(), StringIO()
+        with mock.patch('sparkapp.management.commands.generate_profile_thumbnails.generate_variants',
+                        side_effect=Image.DecompressionBombError('too many pixels')):
+            call_command('generate_profile_thumbnails', workers=1, stdout=out, stderr=err)
+        self.assertIn(f'employee {self.employee.pk}: DecompressionBombError: too many pixels', err.getvalue())
+        self.assertIn('Generated variants for 0 picture(s), 1 failed.', out.getvalue())
+
+    def test_hash_of_a_replaced_picture_is_not_saved(self):
+        self.save_picture(make_photo())
+        name, digest = self.employee.profile_pic.name, self.employee.profile_pic_hash
+        cache.set(backends.user_cache_key(self.employee.user_id), 'cached user')
+        self.assertFalse(thumbnails.save_hash(self.employee.pk, self.employee.user_id, 'profile_pics/old.jpg', 'f' * 16))
+        self.assertEqual(Employee.objects.get(pk=self.employee.pk).profile_pic_hash, digest)
+
+        self.assertTrue(thumbnails.save_hash(self.employee.pk, self.employee.user_id, name, digest))
+        self.assertIsNone(cache.get(backends.user_cache_key(self.employee.user_id)))
+
+
+@fast_hasher
+class PrincipalAnalyticsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_institution(teachers=12, events=6)
+
+    def setUp(self):
+        cache.clear()
+        analytics.rebuild()
+
+    def counts(self, metric):
+        return dict(analytics.dashboard_summary()[metric])
+
+    def test_summary_matches_source_tables(self):
+        by_department = self.counts(analytics.DEPARTMENT)
+        for department in Department.objects.all():
+            expected = EventParticipation.objects.filter(emp_id__dept_id=department).count()
+            self.assertEqual(by_department.get(department.dept_name, 0), expected)
+        self.assertEqual(self.counts(analytics.MODE), {'Online': EventParticipation.objects.count()})
+        self.assertEqual(sum(self.counts(analytics.MONTH).values()), EventParticipation.objects.count())
+        # every seeded assignment started in the past and is still open
+        self.assertEqual(
+            sum(self.counts(analytics.ACTIVE_ROLE).values()),
+            EmployeeRoleAssignment.objects.values('role_id', 'emp_id').distinct().count(),
+        )
+
+    def test_incremental_updates(self):
+        department = self.data['department']
+        before = self.counts(analytics.DEPARTMENT)[department.dept_name]
+        employee = Employee.objects.filter(dept_id=department).first()
+        event = Event.objects.exclude(eventparticipation__emp_id=employee).first()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            participation = EventParticipation.objects.create(
+                emp_id=employee, event_id=event, role='Participant', mode='Offline')
+        self.assertEqual(self.counts(analytics.DEPARTMENT)[department.dept_name], before + 1)
+        self.assertEqual(self.counts(analytics.MODE)['Offline'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            participation.mode = 'Online'
+            participation.save()
+        self.assertNotIn('Offline', self.counts(analytics.MODE))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            department.dept_name = 'Renamed'
+            department.save()
+        self.assertEqual(self.counts(analytics.DEPARTMENT)['Renamed'], before + 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            participation.delete()
+        self.assertEqual(self.counts(analytics.DEPARTMENT)['Renamed'], before)
+
+    def test_blank_and_missing_modes_share_a_bucket(self):
+        EventParticipation.objects.filter(pk__in=EventParticipation.objects.values('pk')[:2]).update(mode='')
+        EventParticipation.objects.filter(pk__in=EventParticipation.objects.exclude(mode='').values('pk')[:1]).update(mode=None)
+        analytics.rebuild()
+        self.assertEqual(self.counts(analytics.MODE)['Unknown'], 3)
+        analytics.refresh(analytics.MODE, [analytics.mode_key('')])
+        self.assertEqual(self.counts(analytics.MODE)['Unknown'], 3)
+
+    def test_relieved_roles_are_not_active(self):
+        assignment = EmployeeRoleAssignment.objects.select_related('role_id').first()
+        role_name = assignment.role_id.role_name
+        before = self.counts(analytics.ACTIVE_ROLE)[role_name]
+        with self.captureOnCommitCallbacks(execute=True):
+            assignment.relieved_date = datetime.date(2000, 1, 1)
+            assignment.save()
+        self.assertEqual(self.counts(analytics.ACTIVE_ROLE)[role_name], before - 1)
+
+    def test_dashboard_is_served_from_cache(self):
+        analytics.dashboard_summary()
+        with self.assertNumQueries(0):
+            analytics.dashboard_summary()
+
+
+@fast_hasher
+class ReportExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_institution(teachers=8, events=6)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.data['principal'])
+
+    def export(self, name, **params):
+        response = self.client.get(reverse(name), params)
+        self.assertTrue(response.streaming)
+        body = b''.join(response.streaming_content).decode()
+        return list(csv.reader(StringIO(body)))
+
+    def test_participation_csv(self):
+        rows = self.export('export_participations')
+        self.assertEqual(rows[0][:4], ['Employee', 'Email', 'Department', 'Event'])
+        self.assertEqual(len(rows) - 1, EventParticipation.objects.count())
+
+        department = self.data['department']
+        rows = self.export('export_participations', department=department.pk, mode='online')
+        self.assertEqual(len(rows) - 1, EventParticipation.objects.filter(emp_id__dept_id=department).count())
+        self.assertTrue(all(row[2] == department.dept_name for row in rows[1:]))
+
+        event = Event.objects.order_by('from_date')[2]
+        day = timezone.localdate(event.from_date)
+        rows = self.export('export_participations', from_date=day, to_date=day)
+        self.assertEqual({row[3] for row in rows[1:]}, {event.title})
+
+    def test_role_assignment_csv_filters_by_period(self):
+        rows = self.export('export_role_assignments', from_date='2021-01-01', to_date='2021-12-31')
+        # seeded assignments start on June 1st of 2020-2022 and are never relieved
+        self.assertEqual({row[4] for row in rows[1:]}, {'2020-06-01', '2021-06-01'})
+
+    def test_query_count_does_not_grow_with_rows(self):
+        with self.assertNumQueries(4):  # session, user, role set and the export itself
+            response = self.client.get(reverse('export_participations'))
+            b''.join(response.streaming_content)
+
+    def test_invalid_period_and_permissions(self):
+        response = self.client.get(reverse('export_participations'), {'from_date': '2024-02-01', 'to_date': '2024-01-01'})
+        self.assertEqual(response.status_code, 400)
+        self.client.force_login(self.data['teacher'])
+        self.assertEqual(self.client.get(reverse('export_participations')).status_code, 302)
+
+    @skipUnless(openpyxl, 'openpyxl is not installed')
+    def test_xlsx(self):
+        response = self.client.get(reverse('export_role_assignments'), {'format': 'xlsx'})
+        workbook = openpyxl.load_workbook(BytesIO(b''.join(response.streaming_content)), read_only=True)
+        rows = list(workbook.active.iter_rows(values_only=True))
+        self.assertEqual(rows[0][0], 'Employee')
+        self.assertEqual(len(rows) - 1, EmployeeRoleAssignment.objects.count())
+
+
+@fast_hasher
+class QueryCountMiddlewareTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_institution(teachers=3, events=2)
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(SPARKAPP_QUERY_STATS=True)
+    def test_headers_and_log_line(self):
+        client = Client()
+        client.force_login(self.data['principal'])
+        with self.assertLogs('sparkapp.queries', level='INFO') as logs:
+            response = client.get(reverse('principal_dashboard'))
+
+        self.assertGreater(int(response['X-Query-Count']), 0)
+        self.assertGreaterEqual(float(response['X-Query-Time-Ms']), 0)
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(record['path'], reverse('principal_dashboard'))
+        self.assertEqual(record['query_count'], int(response['X-Query-Count']))
+        self.assertLessEqual(len(record['slowest']), 3)
+
+    def test_disabled_by_default(self):
+        client = Client()
+        client.force_login(self.data['principal'])
+        response = client.get(reverse('principal_dashboard'))
+        self.assertNotIn('X-Query-Count', response)
+
+    @override_settings(SPARKAPP_QUERY_STATS=True)
+    def test_queries_on_other_threads_and_in_streamed_bodies(self):
+        def in_thread():
+            with connections['default'].cursor() as cursor:
+                cursor.execute('SELECT 1')
+            connections['default'].close()
+
+        def export(request):
+            # what sync_to_async(thread_sensitive=False) does: the context follows into the thread
+            thread = threading.Thread(target=contextvars.copy_context().run, args=(in_thread,))
+            thread.start()
+            thread.join()
+
+            def rows():
+                yield str(Employee.objects.count()).encode()
+                yield str(Event.objects.count()).encode()
+            return StreamingHttpResponse(rows())
+
+        with self.assertLogs('sparkapp.queries', level='INFO') as logs:
+            response = QueryCountMiddleware(export)(RequestFactory().get('/export/'))
+            self.assertEqual(logs.records, [])  # not before the body is sent
+            b''.join(response.streaming_content)
+        self.assertEqual(response['X-Query-Count'], '1')
+        self.assertEqual(json.loads(logs.records[-1].getMessage())['query_count'], 3)
+
+
+@fast_hasher
+class ReferenceCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_institution(teachers=3, events=4)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.data['admin'])
+
+    def test_list_fragment_is_cached_until_the_model_changes(self):
+        self.client.get(reverse('manage_designation'))
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('manage_designation'))
+        self.assertFalse([q for q in ctx.captured_queries if 'sparkapp_designation' in q['sql']])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Designation.objects.create(designation_name='Lecturer')
+        self.assertContains(self.client.get(reverse('manage_designation')), 'Lecturer')
+
+        designation = Designation.objects.get(designation_name='Lecturer')
+        with self.captureOnCommitCallbacks(execute=True):
+            designation.delete()
+        self.assertNotContains(self.client.get(reverse('manage_designation')), 'Lecturer')
+
+    def test_version_changes_only_for_the_saved_model(self):
+        departments = model_version(Department)
+        event_types = model_version(EventType)
+        with self.captureOnCommitCallbacks(execute=True):
+            Department.objects.create(dept_name='Chemistry')
+        self.assertNotEqual(model_version(Department), departments)
+        self.assertEqual(model_version(EventType), event_types)
+
+    def test_choice_fields_render_and_validate_from_cache(self):
+        department = self.data['department']
+        EventForm().as_p()  # warm
+        EmployeeForm().as_p()
+        with self.assertNumQueries(0):
+            html = EventForm().as_p()
+            form = EmployeeForm(data={'dept_id': department.pk})
+            form.is_valid()
+        self.assertIn(self.data['event_type'].type_description, html)
+        self.assertEqual(form.cleaned_data['dept_id'], department)
+
+        form = EmployeeForm(data={'dept_id': 999999})
+        self.assertIn('dept_id', form.errors)
+
+    def test_cached_querysets_are_told_apart(self):
+        by_name = cached_objects(Department.objects.order_by('dept_name'))
+        by_name_desc = cached_objects(Department.objects.order_by('-dept_name'))
+        self.assertEqual(by_name, list(reversed(by_name_desc)))
+
+
+class SqliteProductionProfileTests(SimpleTestCase):
+
+    def test_pragmas_are_set_on_new_connections(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            settings_dict = dict(
+                connections['default'].settings_dict,
+                NAME=os.path.join(tmp, 'production.sqlite3'),
+                OPTIONS=settings.SQLITE_PRODUCTION_OPTIONS,
+            )
+            wrapper = DatabaseWrapper(settings_dict, alias='production_profile')
+            conn = wrapper.get_new_connection(wrapper.get_connection_params())
+            def pragma(name):
+                return conn.execute(f'PRAGMA {name}').fetchone()[0]
+
+            try:
+                self.assertEqual(pragma('journal_mode'), 'wal')
+                self.assertEqual(pragma('synchronous'), 1)  # NORMAL
+                self.assertEqual(pragma('busy_timeout'), settings.SQLITE_PRODUCTION_PRAGMAS['busy_timeout'])
+                self.assertEqual(pragma('cache_size'), settings.SQLITE_PRODUCTION_PRAGMAS['cache_size'])
+                self.assertEqual(pragma('temp_store'), 2)  # MEMORY
+            finally:
+                conn.close()
+            self.assertEqual(wrapper.transaction_mode, 'IMMEDIATE')
+
+
+@mock.patch('sparkapp.routers.replica_configured', return_value=True)
+class ReplicaRoutingTests(SimpleTestCase):
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.session = {}
+
+    def request(self, view, method='get'):
+        """Run ``view`` through the middleware and return the alias it read from."""
+        used = []
+
+        def get_response(request):
+            return view(request, used)
+
+        request = getattr(RequestFactory(), method)('/')
+        request.session = self.session
+        ReplicaRoutingMiddleware(get_response)(request)
+        return used[0]
+
+    def listing(self, request, used):
+        used.append(self.router.db_for_read(Employee))
+        return HttpResponse()
+
+    def test_only_marked_views_read_from_the_replica(self, replica_configured):
+        self.assertEqual(self.request(replica_reads(self.listing)), 'replica')
+        self.assertEqual(self.request(self.listing), 'default')
+        self.assertEqual(self.router.db_for_read(Employee), 'default')  # outside a request
+
+    def test_form_posts_validate_against_the_primary(self, replica_configured):
+        self.assertEqual(self.request(replica_reads(self.listing), 'post'), 'default')
+        self.assertEqual(self.request(replica_reads(self.listing), 'head'), 'replica')
+
+    def test_session_reads_its_own_writes(self, replica_configured):
+        def register(request, used):
+            used.append(self.router.db_for_write(EventParticipation))
+            return HttpResponse()
+
+        self.assertEqual(self.request(register, 'post'), 'default')
+        # the replica may not have the new row yet: pinned to the primary
+        self.assertEqual(self.request(replica_reads(self.listing)), 'default')
+
+        self.session[ReplicaRoutingMiddleware.SESSION_KEY] = 0  # pin expired
+        self.assertEqual(self.request(replica_reads(self.listing)), 'replica')
+
+    def test_streamed_rows_are_read_from_the_replica(self, replica_configured):
+        def export(request, used):
+            def rows():
+                used.append(self.router.db_for_read(EventParticipation))
+                yield b'row'
+            return StreamingHttpResponse(rows())
+
+        used = []
+        request = RequestFactory().get('/')
+        request.session = self.session
+        response = ReplicaRoutingMiddleware(lambda request: replica_reads(export)(request, used))(request)
+        b''.join(response.streaming_content)
+        self.assertEqual(used, ['replica'])
+
+
+@fast_hasher
+class AsyncDashboardTests(TransactionTestCase):
+    # the views query from worker threads on connections of their own,
+    # which don't see the rows of a TestCase's open transaction
+
+    def setUp(self):
+        self.data = seed_institution(teachers=6, events=4)
+        cache.clear()
+
+    def request(self, role, path='/'):
+        user = self.data[role]
+        request = AsyncRequestFactory().get(path)
+        request.user = user
+        request.session = {}
+
+        async def auser():
+            return user
+        request.auser = auser
+        return request
+
+    async def test_teacher_details(self):
+        teacher = self.data['teacher']
+        response = await views.teacher_details_async(self.request('principal'), teacher.pk)
+        self.assertContains(response, 'Teacher 0')
+        participations = await EventParticipation.objects.filter(emp_id__user=teacher).acount()
+        self.assertEqual(response.content.decode().count('<td>Event '), participations)
+
+        with self.assertRaises(Http404):
+            await views.teacher_details_async(self.request('principal'), 999999)
+
+    async def test_dashboards(self):
+        response = await views.principal_dashboard_async(self.request('principal', '/?dept=%d' % self.data['department'].pk))
+        self.assertContains(response, 'Teacher 0')
+        self.assertNotContains(response, 'Teacher 1<')  # other department
+
+        response = await views.teacher_dashboard_async(self.request('teacher'))
+        self.assertContains(response, self.data['department'].dept_name)
+        response = await views.admin_dashboard_async(self.request('admin'))
+        self.assertEqual(response.status_code, 200)
+
+        response = await views.admin_dashboard_async(self.request('teacher'))
+        self.assertEqual(response.status_code, 302)  # not an admin
+
+    async def test_independent_queries_run_at_the_same_time(self):
+        # each waits for the other: run one after another, they would time out
+        both_running = threading.Barrier(2, timeout=5)
+
+        def waiting(func):
+            def wrapper(*args, **kwargs):
+                both_running.wait()
+                return func(*args, **kwargs)
+            return wrapper
+
+        with mock.patch.object(views, 'keyset_page', waiting(views.keyset_page)), \
+                mock.patch.object(views, '_principal_analytics', waiting(views._principal_analytics)):
+            response = await views.principal_dashboard_async(self.request('principal'))
+        self.assertContains(response, 'Teacher 0')
+
+
+@fast_hasher
+class EventCalendarTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_institution(teachers=2, events=2)
+        event_type, venue = EventType.objects.first(), Venue.objects.first()
+
+        def event(title, start, end):
+            return Event.objects.create(
+                title=title, type_id=event_type, venue=venue,
+                from_date=timezone.make_aware(datetime.datetime(*start)),
+                to_date=timezone.make_aware(datetime.datetime(*end)),
+            )
+        cls.before = event('Before', (2024, 2, 20, 9), (2024, 2, 29, 17))
+        cls.long = event('Long FDP', (2024, 1, 15, 9), (2024, 3, 5, 17))  # starts long before March
+        cls.inside = event('Inside', (2024, 3, 10, 9), (2024, 3, 10, 17))
+        cls.after = event('After', (2024, 4, 1, 0), (2024, 4, 2, 0))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.data['teacher'])
+
+    def titles(self, **params):
+        response = self.client.get(reverse('calendar_events'), params)
+        self.assertEqual(response.status_code, 200)
+        return [event['title'] for event in response.json()['events']]
+
+    def test_overlapping_events(self):
+        self.assertEqual(self.titles(view='month', date='2024-03-15'), ['Long FDP', 'Inside'])
+        self.assertEqual(self.titles(start='2024-02-29T12:00:00', end='2024-03-01'), ['Long FDP', 'Before'])
+        self.assertEqual(self.titles(view='week', date='2024-04-03'), ['After'])
+        self.assertEqual(
+            self.titles(view='term', date='2024-03-15'), ['Long FDP', 'Before', 'Inside', 'After'])
+
+    def test_bad_windows(self):
+        for params in ({'view': 'year'}, {'start': '2024-03-01'}, {'start': '2024-03-02', 'end': '2024-03-01'},
+                       {'start': '2020-01-01', 'end': '2024-01-01'}, {'date': 'soon'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(reverse('calendar_events'), params).status_code, 400)
+
+    def test_revalidation(self):
+        url = reverse('calendar_events') + '?view=month&date=2024-03-15'
+        response = self.client.get(url)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+
+        with self.assertNumQueries(1):  # the session, no event query (the user is cached)
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.inside.title = 'Moved'
+            self.inside.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Moved', [event['title'] for event in response.json()['events']])
+
+    def test_participation_form_offers_upcoming_events_only(self):
+        upcoming = Event.objects.create(
+            title='Next Week', type_id=self.inside.type_id, venue=self.inside.venue,
+            from_date=timezone.now() + datetime.timedelta(days=7),
+            to_date=timezone.now() + datetime.timedelta(days=8),
+        )
+        self.assertEqual(list(calendar.upcoming_events()), [upcoming])
+        response = self.client.get(reverse('manage_event_participation'))
+        self.assertContains(response, 'Next Week')
+        self.assertNotContains(response, 'Inside')
+
+
+class VenueBookingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_institution(teachers=1, events=0)
+        cls.event_type = EventType.objects.first()
+        cls.hall, cls.other_hall = Venue.objects.all()[:2]
+        cls.seminar = cls.book('Seminar', cls.hall, 3, 5)
+
+    @classmethod
+    def book(cls, title, venue, first_day, last_day):
+        return Event.objects.create(
+            title=title, type_id=cls.event_type, venue=venue,
+            from_date=timezone.make_aware(datetime.datetime(2024, 3, first_day)),
+            to_date=timezone.make_aware(datetime.datetime(2024, 3, last_day)),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def form(self, venue, from_date, to_date, instance=None, **extra):
+        return EventForm(data={
+            'title': 'Workshop', 'type_id': self.event_type.pk, 'venue': venue.pk,
+            'from_date': from_date, 'to_date': to_date, **extra,
+        }, instance=instance)
+
+    def test_form_rejects_double_booking(self):
+        for from_date, to_date in (('2024-03-04', '2024-03-04'), ('2024-03-01', '2024-03-03'),
+                                   ('2024-03-05', '2024-03-09'), ('2024-03-01', '2024-03-09')):
+            with self.subTest(from_date=from_date, to_date=to_date):
+                form = self.form(self.hall, from_date, to_date)
+                self.assertFalse(form.is_valid())
+                self.assertIn('Seminar', form.errors['venue'][0])
+
+        self.assertTrue(self.form(self.hall, '2024-03-06', '2024-03-07').is_valid())
+        self.assertTrue(self.form(self.other_hall, '2024-03-04', '2024-03-04').is_valid())
+        self.assertIn('to_date', self.form(self.hall, '2024-03-08', '2024-03-07').errors)
+
+    def test_editing_an_event_does_not_clash_with_itself(self):
+        self.assertTrue(self.form(self.hall, '2024-03-04', '2024-03-06', instance=self.seminar).is_valid())
+
+    def test_double_booking_can_be_confirmed(self):
+        self.assertTrue(self.form(self.hall, '2024-03-04', '2024-03-04', allow_double_booking='on').is_valid())
+
+    def test_edit_adding_no_new_clash_is_allowed(self):
+        parallel = self.book('Webinar', self.hall, 4, 4)  # saved before the check, or confirmed
+        self.assertTrue(self.form(self.hall, '2024-03-04', '2024-03-04', instance=parallel).is_valid())
+        self.book('Talk', self.hall, 8, 8)
+        form = self.form(self.hall, '2024-03-04', '2024-03-08', instance=parallel)
+        self.assertFalse(form.is_valid())
+        self.assertEqual(len(form.errors['venue']), 1)
+        self.assertIn('Talk', form.errors['venue'][0])
+
+    def test_sweep_matches_pairwise_check(self):
+        for title, venue, first_day, last_day in (
+            ('Workshop', self.hall, 5, 5), ('FDP', self.hall, 1, 20), ('Talk', self.hall, 21, 22),
+            ('Exam', self.other_hall, 4, 4), ('Viva', self.other_hall, 4, 6),
+        ):
+            self.book(title, venue, first_day, last_day)
+
+        events = list(Event.objects.all())
+        expected = {
+            frozenset((a.title, b.title))
+            for i, a in enumerate(events) for b in events[i + 1:]
+            if a.venue_id == b.venue_id and a.from_date <= b.to_date and b.from_date <= a.to_date
+        }
+        found = [frozenset((first[1], second[1])) for _, first, second in calendar.all_venue_conflicts()]
+        self.assertEqual(len(found), len(expected))
+        self.assertEqual(set(found), expected)
+
+        out = StringIO()
+        call_command('audit_venue_bookings', stdout=out)
+        self.assertIn(f'{len(expected)} double booking(s) found.', out.getvalue())
+
+
+@fast_hasher
+class DocumentStorageTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_institution(teachers=2, events=2)
+        cls.employees = list(Employee.objects.order_by('pk')[:2])
+        cls.events = list(Event.objects.order_by('pk'))
+        cls.role = Role.objects.first()
+        EventParticipation.objects.all().delete()
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        override = self.settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def participate(self, employee, event, content=b'%PDF-1.4 circular', name='circular.pdf'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return EventParticipation.objects.create(
+                emp_id=employee, event_id=event, role='Participant',
+                doc_link=SimpleUploadedFile(name, content, content_type='application/pdf'),
+            )
+
+    def blob_files(self):
+        root = documents.document_storage.path(documents.BLOB_DIR)
+        return sorted(
+            name for _, _, files in os.walk(root) for name in files
+        )
+
+    def test_identical_uploads_are_stored_once(self):
+        first = self.participate(self.employees[0], self.events[0])
+        second = self.participate(self.employees[1], self.events[0], name='Circular (1).PDF')
+        self.assertEqual(first.doc_link.name, second.doc_link.name)
+        self.assertTrue(first.doc_link.name.startswith('blobs/'))
+        self.assertEqual(len(self.blob_files()), 1)
+        self.assertEqual(DocumentBlob.objects.get().refs, 2)
+        with first.doc_link.open('rb') as handle:
+            self.assertEqual(handle.read(), b'%PDF-1.4 circular')
+
+    def test_blob_is_removed_with_its_last_reference(self):
+        first = self.participate(self.employees[0], self.events[0])
+        second = self.participate(self.employees[1], self.events[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(len(self.blob_files()), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertEqual(self.blob_files(), [])
+        self.assertFalse(DocumentBlob.objects.exists())
+
+    def test_replaced_document_is_released(self):
+        assignment = EmployeeRoleAssignment(
+            emp_id=self.employees[0], role_id=self.role, assigned_date=datetime.date(2024, 6, 1),
+            document=SimpleUploadedFile('order.pdf', b'first order'),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            assignment.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            assignment.document = SimpleUploadedFile('order.pdf', b'second order')
+            assignment.save()
+        blob = DocumentBlob.objects.get()
+        self.assertEqual((blob.name, blob.refs), (assignment.document.name, 1))
+        self.assertEqual(len(self.blob_files()), 1)
+
+    def test_collect_documents_moves_legacy_files_and_recounts(self):
+        for employee in self.employees:
+            name = default_storage.save('participation_docs/cert.pdf', SimpleUploadedFile('cert.pdf', b'legacy'))
+            EventParticipation.objects.filter(pk=self.participate(employee, self.events[1]).pk).update(doc_link=name)
+        orphan = self.participate(self.employees[0], self.events[0], content=b'orphan')
+        EventParticipation.objects.filter(pk=orphan.pk).update(doc_link='')  # bypasses the signals
+
+        out = StringIO()
+        call_command('collect_documents', '--legacy', '--grace', '0', stdout=out)
+        names = set(EventParticipation.objects.values_list('doc_link', flat=True))
+        self.assertEqual(len(names), 2)  # the legacy certificate and the empty one
+        blob = DocumentBlob.objects.get()
+        self.assertIn(blob.name, names)
+        self.assertEqual(blob.refs, 2)
+        self.assertEqual(len(self.blob_files()), 1)
+        self.assertEqual(os.listdir(default_storage.path('participation_docs')), [])
+
+
+@fast_hasher
+class ProtectedMediaTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_institution(teachers=2, events=1)
+        cls.owner, cls.colleague = (Employee.objects.get(user__username=f'teacher{i}') for i in range(2))
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        override = self.settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.content = bytes(range(256)) * 400  # ~100 kB "certificate"
+        self.assignment = EmployeeRoleAssignment.objects.create(
+            emp_id=self.owner, role_id=Role.objects.get(role_name='HOD'), assigned_date=datetime.date(2024, 6, 1),
+            document=SimpleUploadedFile('order.pdf', self.content),
+        )
+        self.url = reverse('role_document', args=[self.assignment.pk])
+        self.client.force_login(self.owner.user)
+
+    def test_permissions(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response['Content-Disposition'], f'inline; filename="HOD - {self.owner.emp_name}.pdf"')
+
+        self.client.force_login(self.colleague.user)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.client.force_login(self.data['principal'])
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+    def test_media_url_serves_nothing(self):
+        with self.settings(DEBUG=True):
+            urlconf = importlib.reload(importlib.import_module('spark.urls'))
+        self.client.logout()
+        with self.settings(ROOT_URLCONF=urlconf):
+            self.assertEqual(self.client.get(settings.MEDIA_URL + self.assignment.document.name).status_code, 404)
+            self.assertEqual(self.client.get(self.url).status_code, 302)
+
+    def test_active_content_is_downloaded(self):
+        self.assertEqual(self.client.get(self.url)['Content-Security-Policy'], 'sandbox')
+
+        self.assignment.document = SimpleUploadedFile('order.html', b'<script>alert(1)</script>')
+        self.assignment.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response['Content-Disposition'], f'attachment; filename="HOD - {self.owner.emp_name}.html"')
+        self.assertEqual(response['X-Content-Type-Options'], 'nosniff')
+        self.assertEqual(response['Content-Security-Policy'], 'sandbox')
+
+    def test_range_and_conditional_requests(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.content)}')
+        self.assertEqual(b''.join(response.streaming_content), self.content[100:200])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(response.streaming_content), self.content[-10:])
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.content)}-').status_code, 416)
+
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag).status_code, 206)
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"').status_code, 200)
+
+    def test_proxy_sends_the_bytes(self):
+        with self.settings(SPARKAPP_MEDIA_ACCEL='nginx'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.assignment.document.name)
+        self.assertEqual(response.content, b'')
+
+        with self.settings(SPARKAPP_MEDIA_ACCEL='apache'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Sendfile'], self.assignment.document.path)
+
+
+@fast_hasher
+@override_settings(SPARKAPP_UPLOAD_MAX_SIZE=4096, SPARKAPP_UPLOAD_MAX_CHUNK=1024)
+class ChunkedUploadTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_institution(teachers=2, events=1)
+        cls.participation = EventParticipation.objects.filter(emp_id__user=cls.data['teacher']).first()
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        override = self.settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.client.force_login(self.data['teacher'])
+        self.content = os.urandom(2500)
+
+    def create(self, **fields):
+        fields = {'filename': 'scan.pdf', 'size': len(self.content),
+                  'sha256': hashlib.sha256(self.content).hexdigest(), **fields}
+        return self.client.post(reverse('upload_create'), fields)
+
+    def patch(self, url, offset, chunk):
+        return self.client.patch(url, chunk, content_type='application/offset+octet-stream',
+                                 headers={'Upload-Offset': str(offset)})
+
+    def test_resumable_upload_is_attached(self):
+        response = self.create()
+        self.assertEqual(response.status_code, 201)
+        url = response['Location']
+
+        self.assertEqual(self.patch(url, 0, self.content[:1000])['Upload-Offset'], '1000')
+        self.assertEqual(self.patch(url, 0, self.content[:1000]).status_code, 409)  # stale offset
+        self.assertEqual(self.client.get(url).json()['offset'], 1000)  # where to resume
+        self.assertEqual(self.patch(url, 1000, self.content[1000:2000])['Upload-Offset'], '2000')
+        finish = reverse('upload_finish', args=[response.json()['id']])
+        self.assertEqual(self.client.post(finish, {'target': 'participation', 'pk': self.participation.pk}).status_code, 409)
+        self.patch(url, 2000, self.content[2000:])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(finish, {'target': 'participation', 'pk': self.participation.pk})
+        self.assertEqual(response.status_code, 204)
+        self.participation.refresh_from_db()
+        self.assertEqual(self.participation.doc_link.name,
+                         documents.blob_name(hashlib.sha256(self.content).hexdigest(), 'scan.pdf'))
+        with self.participation.doc_link.open('rb') as handle:
+            self.assertEqual(handle.read(), self.content)
+        self.assertEqual(DocumentBlob.objects.get().refs, 1)
+        self.assertFalse(ChunkedUpload.objects.exists())
+        self.assertEqual(os.listdir(documents.document_storage.path(uploads.PARTIAL_DIR)), [])
+
+    def test_repeated_chunk_is_not_rewritten(self):
+        url = self.create()['Location']
+        stale = ChunkedUpload.objects.get()  # loaded before the first copy of the chunk landed
+        self.assertEqual(self.patch(url, 0, self.content[:1000])['Upload-Offset'], '1000')
+        with self.assertRaises(uploads.UploadError) as raised:
+            uploads.append(stale, 0, BytesIO(self.content[:1000]))
+        self.assertEqual(raised.exception.status, 409)
+        self.assertEqual(stale.offset, 0)
+        self.assertEqual(ChunkedUpload.objects.get().offset, 1000)
+        with open(uploads.partial_path(stale), 'rb') as partial:
+            self.assertEqual(partial.read(), self.content[:1000])
+
+    def test_limits(self):
+        self.assertEqual(self.create(size=5000).status_code, 413)
+        url = self.create()['Location']
+        self.assertEqual(self.patch(url, 0, self.content[:1025]).status_code, 413)
+        self.assertEqual(self.client.get(url).json()['offset'], 0)
+
+        stream = BytesIO(self.content[:1500])  # no Content-Length: stops while reading
+        upload = ChunkedUpload.objects.get()
+        with self.assertRaises(uploads.UploadError):
+            uploads.append(upload, 0, stream)
+        self.assertEqual(ChunkedUpload.objects.get().offset, 0)
+
+    def test_checksum_and_ownership(self):
+        response = self.create(sha256='0' * 64)
+        url, finish = response['Location'], reverse('upload_finish', args=[response.json()['id']])
+        for offset in range(0, len(self.content), 1000):
+            self.patch(url, offset, self.content[offset:offset + 1000])
+
+        other = EventParticipation.objects.exclude(emp_id__user=self.data['teacher']).first()
+        self.assertEqual(self.client.post(finish, {'target': 'participation', 'pk': other.pk}).status_code, 404)
+        response = self.client.post(finish, {'target': 'participation', 'pk': self.participation.pk})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ChunkedUpload.objects.exists())  # a corrupt upload is dropped
+
+        url = self.create()['Location']
+        self.client.force_login(User.objects.get(username='teacher1'))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+FLAKY_CALLS = []
+
+
+@tasks.task(max_attempts=2)
+def flaky_task(fail_times):
+    FLAKY_CALLS.append(fail_times)
+    if len(FLAKY_CALLS) <= fail_times:
+        raise RuntimeError('not yet')
+    return {'calls': len(FLAKY_CALLS)}
+
+
+@fast_hasher
+class TaskQueueTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_institution(teachers=3, events=3)
+
+    def setUp(self):
+        FLAKY_CALLS.clear()
+        media_root, private_root = tempfile.mkdtemp(), tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.addCleanup(shutil.rmtree, private_root)
+        override = self.settings(MEDIA_ROOT=media_root, SPARKAPP_PRIVATE_ROOT=private_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def make_due(self):
+        Task.objects.update(run_at=timezone.now())
+
+    def test_retries_with_backoff(self):
+        task = tasks.enqueue(flaky_task, args=[1])
+        with self.assertLogs('sparkapp.tasks', 'WARNING'):
+            self.assertEqual(tasks.run_pending(), 1)
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), (Task.QUEUED, 1))
+        self.assertIn('not yet', task.error)
+        self.assertGreater(task.run_at, timezone.now())  # backing off
+        self.assertEqual(tasks.run_pending(), 0)
+
+        self.make_due()
+        tasks.run_pending()
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts, task.result), (Task.DONE, 2, {'calls': 2}))
+
+    def test_gives_up_after_max_attempts(self):
+        task = tasks.enqueue(flaky_task, args=[5])
+        with self.assertLogs('sparkapp.tasks', 'WARNING') as logs:
+            for _ in range(3):
+                self.make_due()
+                tasks.run_pending()
+        self.assertEqual(len(logs.records), 2)
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), (Task.FAILED, 2))
+        self.assertEqual(len(FLAKY_CALLS), 2)
+
+    def test_claim_and_stale_tasks(self):
+        task = tasks.enqueue(flaky_task, args=[0])
+        self.assertEqual(tasks.claim('a').pk, task.pk)
+        self.assertIsNone(tasks.claim('b'))  # taken
+
+        Task.objects.filter(pk=task.pk).update(locked_at=timezone.now() - datetime.timedelta(hours=1))
+        self.assertEqual(tasks.requeue_stale(), 1)
+        self.assertEqual(tasks.claim('b').locked_by, 'b')
+
+    def test_report_prepared_in_the_background(self):
+        self.client.force_login(self.data['principal'])
+        response = self.client.post(reverse('export_participations'), {'format': 'csv', 'mode': 'online'})
+        self.assertEqual(response.status_code, 202)
+        task = Task.objects.get()
+        status_url = reverse('task_status', args=[task.pk])
+        self.assertEqual(self.client.get(status_url).json()['status'], Task.QUEUED)
+
+        self.assertEqual(tasks.run_pending(), 1)
+        status = self.client.get(status_url).json()
+        self.assertEqual(status['status'], Task.DONE)
+        response = self.client.get(status['download'])
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="event_participations.csv"')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[0], 'Employee')
+        self.assertEqual(len(lines) - 1, EventParticipation.objects.filter(mode__iexact='online').count())
+
+        self.client.force_login(self.data['teacher'])
+        self.assertEqual(self.client.get(status_url).status_code, 404)
+        self.assertEqual(self.client.get(status['download']).status_code, 404)
+
+        # kept out of MEDIA_ROOT under a name nobody can guess, and deleted with the task
+        task.refresh_from_db()
+        name = task.result['file']
+        self.assertRegex(name, r'^reports/[0-9a-f]{32}/event_participations\.csv$')
+        self.assertEqual(os.listdir(settings.MEDIA_ROOT), [])
+        self.assertTrue(tasks.result_storage().exists(name))
+        Task.objects.filter(pk=task.pk).update(finished_at=timezone.now() - datetime.timedelta(days=30))
+        self.assertEqual(tasks.purge(), 1)
+        self.assertFalse(tasks.result_storage().exists(name))
+
+
+@fast_hasher
+class ActivityTimelineTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_institution(teachers=4, events=3)
+        cls.employee = Employee.objects.get(user=cls.data['teacher'])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.data['principal'])
+
+    def entries(self):
+        return list(self.employee.timeline.order_by('-occurred_at', '-id').values_list('kind', 'title'))
+
+    def test_merges_participations_and_roles_newest_first(self):
+        response = self.client.get(reverse('teacher_details', args=[self.data['teacher'].pk]))
+        entries = response.context['timeline']
+        self.assertEqual(len(entries), 3 + 3)  # every event, three role assignments
+        dates = [entry.occurred_at for entry in entries]
+        self.assertEqual(dates, sorted(dates, reverse=True))
+        self.assertEqual({entry.kind for entry in entries}, {TimelineEntry.PARTICIPATION, TimelineEntry.ROLE_ASSIGNMENT})
+
+    def test_signals_keep_entries_in_sync(self):
+        event = Event.objects.create(
+            title='Late Workshop', type_id=self.data['event_type'], venue=Venue.objects.first(),
+            from_date=timezone.now(), to_date=timezone.now() + datetime.timedelta(hours=2),
+        )
+        participation = EventParticipation.objects.create(emp_id=self.employee, event_id=event, role='Speaker')
+        self.assertEqual(self.entries()[0], (TimelineEntry.PARTICIPATION, 'Late Workshop'))
+
+        event.title = 'Late Seminar'
+        event.from_date -= datetime.timedelta(days=3650)
+        event.save()
+        self.assertEqual(self.entries()[-1], (TimelineEntry.PARTICIPATION, 'Late Seminar'))
+
+        role = Role.objects.get(role_name='HOD')
+        role.role_name = 'Head of Department'
+        role.save()
+        self.assertEqual(
+            self.employee.timeline.filter(title='Head of Department').count(),
+            EmployeeRoleAssignment.objects.filter(emp_id=self.employee, role_id=role).count(),
+        )
+
+        participation.delete()
+        self.assertNotIn((TimelineEntry.PARTICIPATION, 'Late Seminar'), self.entries())
+        self.assertEqual(TimelineEntry.objects.count(), EventParticipation.objects.count() + EmployeeRoleAssignment.objects.count())
+
+    def test_keyset_pages_cover_timeline_once(self):
+        for day in range(30):
+            EmployeeRoleAssignment.objects.create(
+                emp_id=self.employee, role_id=Role.objects.first(), assigned_date=datetime.date(2000, 1, 1 + day % 2),
+            )
+        seen, cursor = [], None
+        while True:
+            with self.assertNumQueries(1):
+                entries, cursor = timeline.page(cursor, page_size=7, employee=self.employee)
+            seen.extend(entry.pk for entry in entries)
+            if cursor is None:
+                break
+        self.assertEqual(seen, [pk for _, pk in sorted(
+            self.employee.timeline.values_list('occurred_at', 'pk'), reverse=True)])
+
+        url = reverse('teacher_details', args=[self.data['teacher'].pk])
+        first = self.client.get(url)
+        for values in (['not a date', 1], ['2020-01-01T00:00:00+00:00', 'b'], ['a', 'b']):
+            broken = self.client.get(url, {'after': encode_cursor(values)})
+            self.assertEqual(broken.status_code, 200)
+            self.assertEqual(first.context['timeline'], broken.context['timeline'])
+
+    def test_rebuild_matches_signals(self):
+        TimelineEntry.objects.all().delete()
+        for row in [*EventParticipation.objects.all(), *EmployeeRoleAssignment.objects.all()]:
+            row.save()
+        maintained = sorted(TimelineEntry.objects.values_list('kind', 'source_id', 'occurred_at', 'title', 'detail'))
+        out = StringIO()
+        call_command('rebuild_timeline', stdout=out)
+        self.assertIn(f'{len(maintained)} entries', out.getvalue())
+        self.assertEqual(
+            sorted(TimelineEntry.objects.values_list('kind', 'source_id', 'occurred_at', 'title', 'detail')),
+            maintained,
+        )
+
+
+@fast_hasher
+class BenchmarkSeedTests(TestCase):
+
+    def test_seed_builds_a_consistent_institution(self):
+        counts = benchmark.seed(departments=3, teachers=20, events=60, participations=6, roles=2, upcoming=0.1)
+        self.assertEqual(counts['employees'], 20 + 4)  # three admins and the principal
+        self.assertEqual(counts['events'], 60)
+        self.assertEqual(Group.objects.get(name='Teacher').user_set.count(), 20)
+        self.assertEqual(calendar.upcoming_events().count(), 6)
+        # participations only in past events, so every teacher can still register for the upcoming ones
+        self.assertFalse(EventParticipation.objects.filter(event_id__in=calendar.upcoming_events()).exists())
+        self.assertGreaterEqual(counts['participations'], 20 * 3)
+        # the derived tables were rebuilt
+        self.assertEqual(TimelineEntry.objects.count(), counts['participations'] + counts['role_assignments'])
+        self.assertTrue(User.objects.get(username='bench-admin').check_password(benchmark.PASSWORD))
+
+        with self.assertRaises(ValueError):
+            benchmark.seed(teachers=1, events=1)
+
+    def test_summary_percentiles(self):
+        samples = [(ms / 1000, ms % 3, ms != 100) for ms in range(1, 101)]
+        summary = benchmark.summarize(samples, elapsed=2)
+        self.assertEqual((summary['p50_ms'], summary['p95_ms'], summary['p99_ms']), (50, 95, 99))
+        self.assertEqual((summary['requests'], summary['errors'], summary['throughput']), (100, 1, 50))
+        self.assertEqual(summary['queries_max'], 2)
+        self.assertIsNone(benchmark.summarize([], elapsed=1)['p50_ms'])
+
+
+# Cheap costs, these tests are about the policy, not the hashing
+cheap_hashers = override_settings(SPARKAPP_PBKDF2_ITERATIONS=1000, SPARKAPP_SCRYPT_WORK_FACTOR=2 ** 8)
+
+
+@cheap_hashers
+class PasswordPolicyTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def login(self, username, password, ip='10.1.1.1'):
+        return self.client.post(reverse('login'), {'username': username, 'password': password}, REMOTE_ADDR=ip)
+
+    def test_login_rehashes_with_the_preferred_algorithm_and_cost(self):
+        with self.settings(PASSWORD_HASHERS=[settings.PASSWORD_HASHER_CLASSES['pbkdf2']]):
+            user = User.objects.create_user('hashed', password='pass12345')
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1000$'))
+
+        with self.settings(SPARKAPP_PBKDF2_ITERATIONS=2000):
+            self.assertEqual(self.login('hashed', 'pass12345').status_code, 302)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$2000$'))
+
+        scrypt_first = [settings.PASSWORD_HASHER_CLASSES['scrypt'], settings.PASSWORD_HASHER_CLASSES['pbkdf2']]
+        with self.settings(PASSWORD_HASHERS=scrypt_first):
+            self.client.logout()
+            self.assertEqual(self.login('hashed', 'pass12345').status_code, 302)
+            user.refresh_from_db()
+            self.assertTrue(user.password.startswith('scrypt$256$'))
+            self.assertTrue(user.check_password('pass12345'))
+
+    @override_settings(SPARKAPP_LOGIN_THROTTLE_PER_USERNAME=3, SPARKAPP_LOGIN_THROTTLE_PER_IP=5)
+    def test_throttled_logins_are_refused_before_hashing(self):
+        User.objects.create_user('victim', password='pass12345')
+        User.objects.create_user('other', password='pass12345')
+        for _ in range(3):
+            self.assertContains(self.login('victim', 'guess'), 'Please enter a correct username')
+
+        with mock.patch('django.contrib.auth.backends.ModelBackend.authenticate') as authenticate:
+            response = self.login('Victim', 'pass12345')  # any case
+        self.assertContains(response, 'Too many failed logins')
+        authenticate.assert_not_called()
+
+        # the address has two failures left, then everyone behind it waits
+        self.assertEqual(self.login('other', 'pass12345').status_code, 302)
+        self.client.logout()
+        self.login('nobody', 'guess')
+        self.login('nobody', 'guess')
+        self.assertContains(self.login('other', 'pass12345'), 'Too many failed logins')
+        self.assertEqual(self.login('other', 'pass12345', ip='10.3.3.3').status_code, 302)
+
+    @override_settings(SPARKAPP_LOGIN_THROTTLE_PER_USERNAME=3, SPARKAPP_LOGIN_SLOWDOWN_PER_USERNAME=3)
+    def test_guesses_from_elsewhere_only_slow_a_user_down(self):
+        User.objects.create_user('admin2', password='pass12345')
+        with mock.patch('sparkapp.throttle.time.sleep') as sleep:
+            for n in range(3):
+                self.login('admin2', 'guess', ip=f'10.4.4.{n}')
+            sleep.assert_not_called()
+            self.assertContains(self.login('admin2', 'guess', ip='10.4.4.9'), 'Please enter a correct username')
+            sleep.assert_called_once_with(settings.SPARKAPP_LOGIN_SLOWDOWN_DELAY)
+            # the owner still gets in, only a little later
+            self.assertEqual(self.login('admin2', 'pass12345', ip='10.5.5.5').status_code, 302)
+        self.assertEqual(sleep.call_count, 2)
+
+    @override_settings(SPARKAPP_LOGIN_THROTTLE_PER_USERNAME=3)
+    def test_success_clears_the_username_count(self):
+        User.objects.create_user('forgetful', password='pass12345')
+        self.login('forgetful', 'guess')
+        self.login('forgetful', 'guess')
+        self.assertEqual(self.login('forgetful', 'pass12345').status_code, 302)
+        self.client.logout()
+        self.login('forgetful', 'guess')
+        self.login('forgetful', 'guess')
+        self.assertEqual(self.login('forgetful', 'pass12345').status_code, 302)
+
+
+@fast_hasher
+class CachedIdentityTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_institution(teachers=4, events=1)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cached_sessions_need_no_query_for_identity(self):
+        for engine in ('cached_db', 'signed_cookies'):
+            with self.subTest(engine=engine), self.settings(SESSION_ENGINE=f'django.contrib.sessions.backends.{engine}'):
+                client = Client()
+                client.force_login(self.data['teacher'])
+                client.get(reverse('teacher_dashboard'))  # warm the caches
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.get(reverse('manage_event_participation'))
+                self.assertContains(response, 'Welcome, Teacher0')
+                for query in queries:
+                    self.assertNotIn('auth_user', query['sql'])
+                    self.assertNotIn('django_session', query['sql'])
+                    self.assertNotIn('sparkapp_employee', query['sql'])
+
+    def test_changes_drop_the_cached_user(self):
+        user = self.data['teacher']
+        key = backends.user_cache_key(user.pk)
+        employee = backends.load_user(user.pk).employee
+        self.assertEqual(employee.dept_id.dept_name, 'Computer Science')
+
+        for change in (
+            lambda: employee.save(),
+            lambda: Department.objects.get(pk=employee.dept_id_id).save(),
+            lambda: Designation.objects.get(pk=employee.designation_id_id).save(),
+            lambda: User.objects.get(pk=user.pk).save(),
+        ):
+            backends.load_user(user.pk)
+            self.assertIsNotNone(cache.get(key))
+            change()
+            self.assertIsNone(cache.get(key))
+
+    def test_password_hash_is_not_cached(self):
+        user = self.data['teacher']
+        backends.load_user(user.pk)
+        cached = cache.get(backends.user_cache_key(user.pk))
+        self.assertNotIn(User.objects.get(pk=user.pk).password.encode(), pickle.dumps(cached))
+
+        user = backends.load_user(user.pk)
+        with self.assertNumQueries(1):
+            self.assertTrue(user.check_password('pass12345'))  # read when needed
+
+    def test_password_change_still_ends_other_sessions(self):
+        self.client.force_login(self.data['teacher'])
+        self.assertEqual(self.client.get(reverse('teacher_dashboard')).status_code, 200)
+        user = User.objects.get(pk=self.data['teacher'].pk)
+        user.set_password('a-new-password')
+        user.save()
+        self.assertEqual(self.client.get(reverse('teacher_dashboard')).status_code, 302)
+
+
+@fast_hasher
+class BulkParticipationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_institution(teachers=12, events=3)
+        now = timezone.now()
+        cls.event = Event.objects.create(
+            title='Department Workshop', type_id=cls.data['event_type'], venue=Venue.objects.first(),
+            from_date=now + datetime.timedelta(days=3), to_date=now + datetime.timedelta(days=4),
+        )
+
+    def setUp(self):
+        cache.clear()
+        analytics.rebuild()
+        self.client.force_login(self.data['admin'])
+
+    def post(self, **data):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('bulk_event_participation'), {
+                'event': self.event.pk, 'role': 'Participant', 'mode': 'Offline', **data,
+            })
+
+    def test_registers_a_department_once(self):
+        department = self.data['department']
+        members = set(Employee.objects.filter(dept_id=department).values_list('pk', flat=True))
+        already = Employee.objects.get(user=self.data['teacher'])
+        EventParticipation.objects.create(emp_id=already, event_id=self.event, role='Speaker', mode='Online')
+
+        response = self.post(department=department.pk)
+        self.assertContains(response, f'{len(members) - 1} registered')
+        self.assertEqual(
+            set(EventParticipation.objects.filter(event_id=self.event).values_list('emp_id', flat=True)), members,
+        )
+        self.assertEqual(EventParticipation.objects.get(emp_id=already, event_id=self.event).role, 'Speaker')
+        # what the signals would have maintained
+        self.assertEqual(TimelineEntry.objects.filter(title='Department Workshop').count(), len(members))
+        by_mode = dict(analytics.dashboard_summary()[analytics.MODE])
+        self.assertEqual(by_mode['Offline'], len(members) - 1)
+
+        response = self.post(department=department.pk)
+        self.assertContains(response, f'{len(members)} were already registered')
+        self.assertContains(response, '0 registered')
+
+    def test_self_registration_during_the_insert_is_not_counted(self):
+        members = sorted(Employee.objects.filter(dept_id=self.data['department']).values_list('pk', flat=True))
+        bulk_create = EventParticipation.objects.bulk_create
+
+        def racing_bulk_create(objs, **kwargs):
+            # the teacher's own registration lands between the check and the insert
+            EventParticipation.objects.create(emp_id_id=members[0], event_id=self.event, role='Speaker', mode='Online')
+            EventParticipation.objects.filter(emp_id_id=members[0], event_id=self.event).update(
+                updated_at=timezone.now() - datetime.timedelta(seconds=1))
+            return bulk_create(objs, **kwargs)
+
+        with mock.patch.object(EventParticipation.objects, 'bulk_create', racing_bulk_create):
+            report = registrations.register(self.event, members)
+        self.assertEqual(report.created, len(members) - 1)
+        self.assertEqual(EventParticipation.objects.get(emp_id_id=members[0], event_id=self.event).role, 'Speaker')
+
+    def test_queries_dont_grow_with_the_selection(self):
+        self.post(designation=self.data['designation'].pk)
+        EventParticipation.objects.filter(event_id=self.event).delete()
+        with CaptureQueriesContext(connection) as few:
+            self.post(designation=self.data['designation'].pk)
+        EventParticipation.objects.filter(event_id=self.event).delete()
+        with CaptureQueriesContext(connection) as many:
+            self.post(department='', designation='', file=SimpleUploadedFile(
+                'list.csv', ('username\n' + '\n'.join(f'teacher{i}' for i in range(12))).encode()))
+        self.assertEqual(EventParticipation.objects.filter(event_id=self.event).count(), 12)
+        self.assertLessEqual(len(many), len(few) + 1)  # + the username lookup
+
+    def test_uploaded_list_reports_unknown_usernames(self):
+        upload = SimpleUploadedFile('list.csv', b'username\nteacher1\nnobody\nteacher2\n')
+        response = self.post(file=upload)
+        self.assertContains(response, 'nobody')
+        self.assertEqual(
+            set(EventParticipation.objects.filter(event_id=self.event).values_list('emp_id__user__username', flat=True)),
+            {'teacher1', 'teacher2'},
+        )
+
+    def test_needs_a_selection(self):
+        response = self.post()
+        self.assertContains(response, 'Choose a department, a designation or upload a list')
+        self.assertFalse(EventParticipation.objects.filter(event_id=self.event).exists())
+
+
+@fast_hasher
+@override_settings(SPARKAPP_SYNC_SETTLE_SECONDS=0, SPARKAPP_SYNC_PAGE_SIZE=50)
+class ChangeFeedTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed_institution(teachers=6, events=3)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.data['admin'])
+
+    def feed(self, resource, cursor=None, limit=None):
+        params = {key: value for key, value in (('cursor', cursor), ('limit', limit)) if value}
+        response = self.client.get(reverse('sync_changes', args=[resource]), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def drain(self, resource, cursor=None, limit=None):
+        changes = []
+        while True:
+            page = self.feed(resource, cursor, limit)
+            changes += page['changes']
+            cursor = page['cursor']
+            if not page['has_more']:
+                return changes, cursor
+
+    def test_pages_cover_every_row_once(self):
+        changes, _ = self.drain('participations', limit=7)
+        self.assertEqual(
+            sorted(change['id'] for change in changes),
+            sorted(EventParticipation.objects.values_list('pk', flat=True)),
+        )
+
+    def test_only_deltas_after_the_cursor(self):
+        _, cursor = self.drain('employees')
+        _, participations_cursor = self.drain('participations')
+        self.assertEqual(self.feed('employees', cursor)['changes'], [])
+
+        employee = Employee.objects.get(user=self.data['teacher'])
+        employee.status = 'Inactive'
+        employee.save()
+        removed = Employee.objects.exclude(pk=employee.pk).filter(user__username__startswith='teacher').first()
+        removed_pk = removed.pk
+        removed_participations = set(EventParticipation.objects.filter(emp_id=removed).values_list('pk', flat=True))
+        removed.delete()
+
+        changes, cursor = self.drain('employees', cursor)
+        self.assertEqual(
+            [(change['op'], change['id']) for change in changes],
+            [('upsert', employee.pk), ('delete', removed_pk)],
+        )
+        self.assertEqual(changes[0]['data']['status'], 'Inactive')
+        self.assertEqual(self.feed('employees', cursor)['changes'], [])
+        # the deleted employee's participations went with it
+        participation_changes, _ = self.drain('participations', participations_cursor)
+        self.assertEqual({change['op'] for change in participation_changes}, {'delete'})
+        self.assertEqual({change['id'] for change in participation_changes}, removed_participations)
+        self.assertEqual(SyncTombstone.objects.count(), len(removed_participations) + 1 + 3)  # + its role assignments
+
+    def test_upsert_after_delete_keeps_order(self):
+        _, cursor = self.drain('participations')
+        participation = EventParticipation.objects.first()
+        participation.delete()
+        participation.pk = None
+        participation.save()
+        changes, _ = self.drain('participations', cursor)
+        self.assertEqual([change['op'] for change in changes], ['delete', 'upsert'])
+
+    def test_unsettled_changes_wait(self):
+        with self.settings(SPARKAPP_SYNC_SETTLE_SECONDS=60):
+            self.assertEqual(self.feed('role-assignments')['changes'], [])
+
+    def test_rejects_bad_requests(self):
+        _, cursor = self.drain('employees')
+        response = self.client.get(reverse('sync_changes', args=['participations']), {'cursor': cursor})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('sync_changes', args=['employees']), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(reverse('sync_changes', args=['events'])).status_code, 404)
+        self.client.force_login(self.data['teacher'])
+        self.assertEqual(self.client.get(reverse('sync_changes', args=['employees'])).status_code, 302)
@@ -0,0 +1,79 @@
+# sparkapp/throttle.py
+#
+# Login throttling. Checking a password costs a deliberately slow hash, so a
+# credential-stuffing burst would keep every worker busy hashing. Failed
+# logins are counted in the cache in fixed windows: per client address, per
+# (address, username) and per username. Once either of the first two counts
+# reaches its limit the authentication backend (sparkapp/backends.py)
+# refuses the attempt before any hash is computed. The username count only
+# slows further attempts down: refusing on it would let anyone lock any
+# account, the admin's included, out with a few wrong guesses. A successful
+# login clears the username's counts.
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def client_ip(request):
+    if request is None:
+        return ''
+    value = request.META.get(settings.SPARKAPP_LOGIN_CLIENT_IP_HEADER, '')
+    return value.split(',')[0].strip()  # X-Forwarded-For: client, proxy1, ...
+
+
+def _username_digest(username):
+    return hashlib.sha256(username.strip().lower().encode()).hexdigest()[:32]
+
+
+def _blocking_keys(request, username):
+    keys = {}
+    ip = client_ip(request)
+    if ip and username and settings.SPARKAPP_LOGIN_THROTTLE_PER_USERNAME:
+        keys[f'sparkapp:login-failures:ip-user:{ip}:{_username_digest(username)}'] = (
+            settings.SPARKAPP_LOGIN_THROTTLE_PER_USERNAME)
+    if ip and settings.SPARKAPP_LOGIN_THROTTLE_PER_IP:
+        keys[f'sparkapp:login-failures:ip:{ip}'] = settings.SPARKAPP_LOGIN_THROTTLE_PER_IP
+    return keys
+
+
+def _slowdown_key(username):
+    if username and settings.SPARKAPP_LOGIN_SLOWDOWN_PER_USERNAME:
+        return f'sparkapp:login-failures:user:{_username_digest(username)}'
+    return None
+
+
+def is_throttled(request, username):
+    keys = _blocking_keys(request, username)
+    counts = cache.get_many(list(keys))
+    return any(counts.get(key, 0) >= limit for key, limit in keys.items())
+
+
+def slow_down(username):
+    """Wait SPARKAPP_LOGIN_SLOWDOWN_DELAY seconds if ``username`` failed too often lately, from anywhere."""
+    key = _slowdown_key(username)
+    if key and cache.get(key, 0) >= settings.SPARKAPP_LOGIN_SLOWDOWN_PER_USERNAME:
+        time.sleep(settings.SPARKAPP_LOGIN_SLOWDOWN_DELAY)
+
+
+def record_failure(request, username):
+    keys = list(_blocking_keys(request, username))
+    if _slowdown_key(username):
+        keys.append(_slowdown_key(username))
+    for key in keys:
+        # add() starts the window, which doesn't move with later failures
+        if not cache.add(key, 1, settings.SPARKAPP_LOGIN_THROTTLE_WINDOW):
+            try:
+                cache.incr(key)
+            except ValueError:  # the window ended in between
+                cache.add(key, 1, settings.SPARKAPP_LOGIN_THROTTLE_WINDOW)
+
+
+def clear(request, username):
+    # the address count stays: it's shared by everyone behind the address
+    keys = [key for key in _blocking_keys(request, username) if ':ip-user:' in key]
+    if _slowdown_key(username):
+        keys.append(_slowdown_key(username))
+    cache.delete_many(keys)
@@ -0,0 +1,118 @@
+# sparkapp/thumbnails.py
+#
+# Resized copies of Employee.profile_pic. Every upload gets square 40px,
+# 128px and 512px variants in WebP and JPEG, written next to the original as
+#
+#     profile_pics/<name>.<content hash>.<size>.<webp|jpg>
+#
+# The content hash is kept on Employee.profile_pic_hash, so the variant names
+# can be worked out when rendering without touching the storage.
+
+import hashlib
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .backends import invalidate_cached_users
+from .models import Employee
+from .tasks import task
+
+SIZES = (40, 128, 512)
+FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpg', 'JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+)
+HASH_LENGTH = 16
+
+
+def content_hash(name, storage=default_storage):
+    # Streamed in chunks, the original may be a multi-MB phone photo
+    digest = hashlib.sha256()
+    with storage.open(name, 'rb') as original:
+        for chunk in iter(lambda: original.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+def variant_name(name, digest, size, extension):
+    stem = os.path.splitext(name)[0]
+    return f'{stem}.{digest}.{size}.{extension}'
+
+
+def variant_names(name, digest):
+    return [variant_name(name, digest, size, extension) for size in SIZES for extension, _, _ in FORMATS]
+
+
+def variants_exist(name, digest, storage=default_storage):
+    return bool(digest) and all(storage.exists(variant) for variant in variant_names(name, digest))
+
+
+def generate_variants(name, storage=default_storage):
+    """
+    Write the missing variants of the image stored as ``name`` and return its
+    content hash. Returns '' if the file isn't a readable image.
+    """
+    try:
+        digest = content_hash(name, storage)
+    except OSError:  # the original is gone
+        return ''
+    missing = [
+        (size, extension, pil_format, options)
+        for size in SIZES
+        for extension, pil_format, options in FORMATS
+        if not storage.exists(variant_name(name, digest, size, extension))
+    ]
+    if not missing:
+        return digest
+
+    try:
+        with storage.open(name, 'rb') as original, Image.open(original) as image:
+            image = ImageOps.exif_transpose(image)  # phones store rotation in EXIF
+            image = image.convert('RGB')
+    except (UnidentifiedImageError, OSError):
+        return ''
+
+    for size, extension, pil_format, options in missing:
+        side = min(size, image.width, image.height)  # never upscale
+        resized = ImageOps.fit(image, (side, side), Image.Resampling.LANCZOS)
+        resized.info = {}  # drop EXIF / ICC / comments from the copy
+
+        buffer = BytesIO()
+        resized.save(buffer, pil_format, **options)
+        target = variant_name(name, digest, size, extension)
+        # save() may pick another name if the target appeared meanwhile; the
+        # content is identical, so just keep the existing file in that case.
+        if not storage.exists(target):
+            storage.save(target, ContentFile(buffer.getvalue()))
+    return digest
+
+
+def save_hash(employee_id, user_id, name, digest):
+    """Record ``digest`` for the picture ``name``, unless the employee has replaced it meanwhile."""
+    if Employee.objects.filter(pk=employee_id, profile_pic=name).update(profile_pic_hash=digest):
+        invalidate_cached_users(user_id)  # the avatar in base.html
+        return True
+    return False  # the new picture has its own task
+
+
+@task()
+def generate_employee_variants(employee_id):
+    """Task: variants of the employee's current picture; saves and returns its hash."""
+    name, user_id = Employee.objects.filter(pk=employee_id).values_list('profile_pic', 'user_id').first() or ('', None)
+    if not name:
+        return ''
+    digest = generate_variants(name)
+    save_hash(employee_id, user_id, name, digest)
+    return digest
+
+
+def pick_variant(display_size, density=1):
+    """Smallest variant that covers ``display_size`` CSS pixels at ``density``."""
+    needed = display_size * density
+    for size in SIZES:
+        if size >= needed:
+            return size
+    return SIZES[-1]
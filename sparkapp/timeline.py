@@ -0,0 +1,81 @@
+# sparkapp/timeline.py
+#
+# The activity timeline of an employee's page: event participations and
+# role assignments merged into one list, newest first. Each of them is
+# copied into TimelineEntry with the date and labels it is shown with, and
+# signals (sparkapp/signals.py) keep the copies in sync, so a page of the
+# timeline is one query on the (employee, occurred_at, id) index however
+# long the history is. Pages are keyset pages (sparkapp/pagination.py).
+
+import datetime
+import itertools
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import EmployeeRoleAssignment, EventParticipation, TimelineEntry
+from .pagination import keyset_page
+
+PAGE_SIZE = 25
+ORDERING = ('-occurred_at', '-id')
+UPDATE_FIELDS = ['employee', 'occurred_at', 'ended_at', 'title', 'detail', 'has_document']
+
+
+def _start_of_day(day):
+    if day is None:
+        return None
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def participation_entry(participation):
+    event = participation.event_id
+    return TimelineEntry(
+        employee_id=participation.emp_id_id, kind=TimelineEntry.PARTICIPATION, source_id=participation.pk,
+        occurred_at=event.from_date, ended_at=event.to_date, title=event.title,
+        detail=' · '.join(filter(None, [participation.role, participation.mode and participation.get_mode_display()])),
+        has_document=bool(participation.doc_link),
+    )
+
+
+def role_assignment_entry(assignment):
+    return TimelineEntry(
+        employee_id=assignment.emp_id_id, kind=TimelineEntry.ROLE_ASSIGNMENT, source_id=assignment.pk,
+        occurred_at=_start_of_day(assignment.assigned_date), ended_at=_start_of_day(assignment.relieved_date),
+        title=assignment.role_id.role_name, detail=assignment.mode and assignment.get_mode_display() or '',
+        has_document=bool(assignment.document),
+    )
+
+
+def save_entries(entries):
+    """Insert the entries, or update the ones already there for the same source row."""
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=500, update_conflicts=True,
+        unique_fields=['kind', 'source_id'], update_fields=UPDATE_FIELDS,
+    )
+
+
+def remove(kind, source_id):
+    TimelineEntry.objects.filter(kind=kind, source_id=source_id).delete()
+
+
+def rebuild(batch_size=1000):
+    """Recreate every entry from the source tables; returns how many there are."""
+    entries = itertools.chain(
+        map(participation_entry, EventParticipation.objects.select_related('event_id').iterator(batch_size)),
+        map(role_assignment_entry, EmployeeRoleAssignment.objects.select_related('role_id').iterator(batch_size)),
+    )
+    count = 0
+    with transaction.atomic():
+        TimelineEntry.objects.all().delete()
+        while batch := list(itertools.islice(entries, batch_size)):
+            TimelineEntry.objects.bulk_create(batch)
+            count += len(batch)
+    return count
+
+
+def page(cursor=None, page_size=PAGE_SIZE, **filters):
+    """
+    (entries, next_cursor) for one page of the timeline selected by
+    ``filters``, e.g. page(cursor, employee=employee).
+    """
+    return keyset_page(TimelineEntry.objects.filter(**filters), ORDERING, cursor, page_size)
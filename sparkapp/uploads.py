@@ -0,0 +1,163 @@
+# sparkapp/uploads.py
+#
+# Resumable uploads of large documents, modelled on tus: the client creates
+# an upload with the total size (and optionally the SHA-256 it expects),
+# PATCHes chunks at the offset the server reports, and on a dropped
+# connection asks for that offset and carries on from there. Chunks are
+# appended to a partial file straight from the request stream, the limits
+# are checked while reading, never after buffering a whole chunk. Finishing
+# verifies the checksum and attaches the file to its row through
+# DocumentStorage, which moves the partial file into the blob store.
+
+import datetime
+import os
+import re
+
+from django.conf import settings
+from django.core.files import File, locks
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from .documents import CHUNK_SIZE, document_storage, file_digest
+from .models import ChunkedUpload, EmployeeRoleAssignment, EventParticipation
+
+PARTIAL_DIR = 'uploads'
+SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+# What an upload can be attached to: model -> its document field
+TARGETS = {
+    'participation': (EventParticipation, 'doc_link'),
+    'role_assignment': (EmployeeRoleAssignment, 'document'),
+}
+
+
+class UploadError(Exception):
+    """The request can't be applied to the upload; ``status`` is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class PartialFile(File):
+    # Storages move a file that has a temporary_file_path instead of copying it
+    def __init__(self, path, name):
+        super().__init__(open(path, 'rb'), name)
+        self.path = path
+
+    def temporary_file_path(self):
+        return self.path
+
+
+def partial_path(upload):
+    return document_storage.path(f'{PARTIAL_DIR}/{upload.pk}.part')
+
+
+def create(user, filename, size, sha256=''):
+    filename = get_valid_filename(os.path.basename(filename or ''))
+    if not filename:
+        raise UploadError('A file name is required.')
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise UploadError('"size" must be the total size in bytes.')
+    if size <= 0:
+        raise UploadError('"size" must be the total size in bytes.')
+    if size > settings.SPARKAPP_UPLOAD_MAX_SIZE:
+        raise UploadError(f'Files can be at most {settings.SPARKAPP_UPLOAD_MAX_SIZE} bytes.', status=413)
+    sha256 = (sha256 or '').lower()
+    if sha256 and not SHA256_RE.match(sha256):
+        raise UploadError('"sha256" must be a hex SHA-256 digest.')
+
+    upload = ChunkedUpload.objects.create(user=user, filename=filename, size=size, sha256=sha256)
+    path = partial_path(upload)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+    return upload
+
+
+def append(upload, offset, stream, length=None):
+    """
+    Write the chunk read from ``stream`` at ``offset`` and return the new
+    offset. ``length`` is the announced chunk size (Content-Length), if any.
+    Whatever arrived before the client dropped is kept.
+    """
+    if offset != upload.offset:
+        raise UploadError(f'The upload is at offset {upload.offset}.', status=409)
+    limit = min(upload.size - offset, settings.SPARKAPP_UPLOAD_MAX_CHUNK)
+    if length is not None and length > limit:
+        raise UploadError(f'This chunk can be at most {limit} bytes.', status=413)
+
+    with open(partial_path(upload), 'r+b') as partial:
+        if not locks.lock(partial, locks.LOCK_EX | locks.LOCK_NB):
+            raise UploadError('Another chunk of this upload is being written.', status=423)
+        # a retry may have waited out the chunk it repeats: only the offset
+        # stored while we hold the lock says where the file ends
+        current = ChunkedUpload.objects.filter(pk=upload.pk).values_list('offset', flat=True).first()
+        if current is None:
+            raise UploadError('The upload no longer exists.', status=404)
+        if current != offset:
+            raise UploadError(f'The upload is at offset {current}.', status=409)
+        partial.truncate(offset)  # bytes past the offset were never acknowledged
+        partial.seek(offset)
+        written = 0
+        updated = 0
+        try:
+            while True:
+                # one byte over the limit is enough to know the chunk is too big
+                chunk = stream.read(min(CHUNK_SIZE, limit + 1 - written))
+                if not chunk:
+                    break
+                if written + len(chunk) > limit:
+                    partial.truncate(offset)
+                    written = 0
+                    raise UploadError(f'This chunk can be at most {limit} bytes.', status=413)
+                partial.write(chunk)
+                written += len(chunk)
+        finally:
+            partial.flush()
+            updated = ChunkedUpload.objects.filter(pk=upload.pk, offset=offset).update(offset=offset + written)
+            if updated:
+                upload.offset = offset + written
+    if not updated:
+        raise UploadError('The upload was changed while this chunk was written.', status=409)
+    return upload.offset
+
+
+def finish(upload, target, pk, user):
+    """Verify the complete upload and store it as the document of the ``target`` row ``pk`` of ``user``."""
+    if target not in TARGETS:
+        raise UploadError(f'"target" must be one of {", ".join(TARGETS)}.')
+    model, field = TARGETS[target]
+    row = model.objects.filter(pk=pk, emp_id__user=user).first()
+    if row is None:
+        raise UploadError('No such row of yours to attach the file to.', status=404)
+    if upload.offset != upload.size:
+        raise UploadError(f'The upload is at offset {upload.offset} of {upload.size}.', status=409)
+
+    path = partial_path(upload)
+    digest, size = file_digest(path)
+    if size != upload.size or (upload.sha256 and digest != upload.sha256):
+        discard(upload)
+        raise UploadError('The file does not match its checksum, upload it again.')
+
+    document = PartialFile(path, upload.filename)
+    try:
+        setattr(row, field, document)
+        row.save(update_fields=[field])
+    finally:
+        document.close()
+    discard(upload)
+    return row
+
+
+def discard(upload):
+    path = partial_path(upload)
+    if os.path.exists(path):
+        os.remove(path)
+    upload.delete()
+
+
+def expired():
+    cutoff = timezone.now() - datetime.timedelta(hours=settings.SPARKAPP_UPLOAD_EXPIRY_HOURS)
+    return ChunkedUpload.objects.filter(created_at__lt=cutoff)
@@ -1,13 +1,39 @@
+from django.conf import settings
 from django.urls import path
 from .views import add_emp  
 from . import views
 from django.contrib.auth import views as auth_views
 
+
+def dashboard_view(name):
+    # async variant under ASGI (spark/asgi.py), the sync view under WSGI
+    if settings.SPARKAPP_ASYNC_VIEWS:
+        return getattr(views, f'{name}_async')
+    return getattr(views, name)
+
+
 urlpatterns = [
     path('', views.index, name='index'),  # Home page (this is the root URL, so it will trigger 'index' view)
     #path('', auth_views.LoginView.as_view(template_name='login.html'), name='login'),
     path('register/', views.register, name='register'),
     path('manage-admin-employee/', views.manage_admin_employee, name='manage_admin_employee'),
+    path('employee-search/', views.employee_search, name='employee_search'),
+    path('import-employees/', views.import_employees, name='import_employees'),
+    path('reports/', views.reports, name='reports'),
+    path('reports/participations/', views.export_participations, name='export_participations'),
+    path('reports/role-assignments/', views.export_role_assignments, name='export_role_assignments'),
+    path('calendar/events/', views.calendar_events, name='calendar_events'),
+    path('documents/role-assignments/<int:pk>/', views.role_document, name='role_document'),
+    path('documents/participations/<int:pk>/', views.participation_document, name='participation_document'),
+    path('employees/<int:pk>/picture/', views.profile_picture, name='profile_picture'),
+    path('uploads/', views.upload_create, name='upload_create'),
+    path('uploads/<uuid:pk>/', views.upload_detail, name='upload_detail'),
+    path('uploads/<uuid:pk>/finish/', views.upload_finish, name='upload_finish'),
+    path('tasks/<int:pk>/', views.task_status, name='task_status'),
+    path('tasks/<int:pk>/result/', views.task_result, name='task_result'),
+    path('sync/<str:resource>/', views.sync_changes, name='sync_changes'),
+    path('employees/<int:pk>/picture/<str:digest>/<int:size>.<str:extension>',
+         views.profile_picture, name='profile_picture_variant'),
 
     path('manage-emp/', views.add_emp, name='manage_emp'),
     path('manage-department/', views.add_department, name='manage_department'),
@@ -17,6 +43,7 @@ urlpatterns = [
     path('manage-role-assignment/', views.add_role_assignment, name='manage_role_assignment'),
     path('manage-event/', views.add_event, name='manage_event'),
     path('manage-event-participation/', views.add_event_participation, name='manage_event_participation'),
+    path('manage-event-participation/bulk/', views.bulk_event_participation, name='bulk_event_participation'),
     #path('logout/', auth_views.LogoutView.as_view(), name='logout'),
     #path('logout-success/', views.logout_success, name='logout_success'),
     path('add_event_type/', views.add_event_type, name='add_event_type'),
@@ -26,9 +53,9 @@ urlpatterns = [
     path('add-designation/', views.add_designation, name='add_designation'),
     path('edit-designation/<int:designation_id>/', views.edit_designation, name='edit_designation'),
     path('delete-designation/<int:designation_id>/', views.delete_designation, name='delete_designation'),
-    path('admin-dashboard/', views.admin_dashboard, name='admin_dashboard'),
-    path('teacher-dashboard/', views.teacher_dashboard, name='teacher_dashboard'),
-    path('principal-dashboard/', views.principal_dashboard, name='principal_dashboard'),
+    path('admin-dashboard/', dashboard_view('admin_dashboard'), name='admin_dashboard'),
+    path('teacher-dashboard/', dashboard_view('teacher_dashboard'), name='teacher_dashboard'),
+    path('principal-dashboard/', dashboard_view('principal_dashboard'), name='principal_dashboard'),
     path('access-denied/', views.access_denied, name='access_denied'),
     #path('login/', auth_views.LoginView.as_view(template_name='login.html'), name='login'),
     path('departments/', views.manage_department, name='manage_department'),
@@ -36,7 +63,7 @@ urlpatterns = [
     path('departments/edit/<int:dept_id>/', views.edit_department, name='edit_department'),
     path('departments/delete/<int:dept_id>/', views.delete_department, name='delete_department'),
     path('add-employee/', add_emp, name='add_emp'),
-    path('teacher-details/<int:user_id>/', views.teacher_details, name='teacher_details'),
+    path('teacher-details/<int:user_id>/', dashboard_view('teacher_details'), name='teacher_details'),
     path('employee/edit/<int:employee_id>/', views.edit_employee, name='edit_employee'),
         path('password-change/', auth_views.PasswordChangeView.as_view(
         template_name='registration/password_change.html',
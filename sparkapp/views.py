@@ -4,27 +4,49 @@ from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
 from .forms import UserForm, EmployeeForm, DepartmentForm, DesignationForm, EventTypeForm, VenueForm, RoleForm,EmployeeForm, EmployeeRoleAssignmentForm, EventForm, EventParticipationForm
-from .models import Department, Designation, EventType, Role, EmployeeRoleAssignment, Event, EventParticipation
+from .models import Department, Designation, Employee, EventType, Role, EmployeeRoleAssignment, Event, EventParticipation, ChunkedUpload, Task
 from django.contrib.auth.models import User, Group
+from .roles import ADMIN, PRINCIPAL, TEACHER, get_user_roles, has_role
+from .pagination import keyset_page
+from .search import directory_queryset, search_employees
+import asyncio
+import os
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse, JsonResponse
+from django.conf import settings
+from django.db import connections
+from django.views.decorators.cache import cache_control
+from django.urls import reverse
+from django.views.decorators.http import condition, require_http_methods, require_POST
+from . import analytics, calendar, exports, media, onboarding, registrations, sync, tasks, thumbnails, timeline, uploads
+from .caching import cache_timeout, cached_objects, model_version
+from .routers import replica_reads
+from .forms import BulkParticipationForm, EmployeeImportForm, ReportFilterForm
 
 
 def admin_group_required(user):
-    return user.groups.filter(name='Admin').exists()
+    return has_role(user, ADMIN)
 
 def teacher_group_required(user):
-    return user.groups.filter(name='Teacher').exists()
+    return has_role(user, TEACHER)
 
 def principal_group_required(user):
-    return user.groups.filter(name='Principal').exists()
+    return has_role(user, PRINCIPAL)
+
+def report_group_required(user):
+    roles = get_user_roles(user)
+    return ADMIN in roles or PRINCIPAL in roles
 
 
 @login_required
 def index(request):
-    if request.user.groups.filter(name='Teacher').exists():
+    roles = get_user_roles(request.user)
+    if TEACHER in roles:
         return redirect('teacher_dashboard')
-    elif request.user.groups.filter(name='Admin').exists():
+    elif ADMIN in roles:
         return redirect('admin_dashboard')
-    elif request.user.groups.filter(name='Principal').exists():
+    elif PRINCIPAL in roles:
         return redirect('principal_dashboard')
     else:
         return render(request, 'index.html')
@@ -33,9 +55,10 @@ def index(request):
 # Add Employee
 @login_required
 def add_emp(request):
-    if request.user.groups.filter(name='Teacher').exists():
+    roles = get_user_roles(request.user)
+    if TEACHER in roles:
         full_form = True  # Teacher gets the full form
-    elif request.user.groups.filter(name='Admin').exists():
+    elif ADMIN in roles:
         full_form = False  # Admin gets a limited form
     else:
         return redirect('access_denied')  # Restrict other users
@@ -84,8 +107,13 @@ def add_department(request):
 @login_required
 @user_passes_test(admin_group_required)
 def manage_designation(request):
+    # Lazy: the rows are only queried when the cached fragment is stale
     designations = Designation.objects.all()
-    return render(request, 'manage_designation.html', {'designations': designations})
+    return render(request, 'manage_designation.html', {
+        'designations': designations,
+        'rows_version': model_version(Designation),
+        'rows_timeout': cache_timeout(),
+    })
 
 
 # Add Designation
@@ -131,7 +159,11 @@ def delete_designation(request, designation_id):
 @user_passes_test(admin_group_required)
 def manage_event_type(request):
     event_types = EventType.objects.all()
-    return render(request, 'manage_event_type.html', {'event_types': event_types})
+    return render(request, 'manage_event_type.html', {
+        'event_types': event_types,
+        'rows_version': model_version(EventType),
+        'rows_timeout': cache_timeout(),
+    })
 
 
 # Add Event Type
@@ -275,14 +307,48 @@ def add_event_participation(request):
         if form.is_valid():
             participation = form.save(commit=False)
             participation.emp_id = request.user.employee  # adjust this based on your setup
-            participation.save()
-            return redirect('teacher_dashboard')
+            already_registered = EventParticipation.objects.filter(
+                emp_id=participation.emp_id, event_id=participation.event_id,
+            ).exists()
+            if already_registered:
+                form.add_error('event_id', 'You are already registered for this event.')
+            else:
+                participation.save()
+                return redirect('teacher_dashboard')
     else:
         form = EventParticipationForm()
 
     return render(request, 'add_event_participation.html', {'form': form})
 
 
+# Registering a department / list of employees for an event
+@login_required
+@user_passes_test(admin_group_required)
+def bulk_event_participation(request):
+    report = None
+    if request.method == 'POST':
+        form = BulkParticipationForm(request.POST, request.FILES)
+        if form.is_valid():
+            data = form.cleaned_data
+            report = registrations.RegistrationReport()
+            try:
+                listed = None
+                if data['file']:
+                    listed = registrations.employees_from_file(data['file'].file, data['file'].name, report)
+            except onboarding.OnboardingError as exc:
+                form.add_error('file', str(exc))
+                report = None
+            else:
+                employee_ids = registrations.select_employees(data['department'], data['designation'], listed)
+                registrations.register(data['event'], employee_ids, role=data['role'], mode=data['mode'], report=report)
+                if report.created:
+                    messages.success(request, f'{report.created} employee(s) registered for {data["event"].title}.')
+    else:
+        form = BulkParticipationForm()
+
+    return render(request, 'bulk_event_participation.html', {'form': form, 'report': report})
+
+
 # Logout Views
 def logout_view(request):
     logout(request)
@@ -307,13 +373,6 @@ def teacher_dashboard(request):
     return render(request, 'teacher_dashboard.html')
 
 
-# Principal Dashboard View
-@login_required
-@user_passes_test(principal_group_required)
-def principal_dashboard(request):
-    return render(request, 'principal_dashboard.html')
-
-
 # Access Denied View
 @login_required
 def access_denied(request):
@@ -323,7 +382,11 @@ def access_denied(request):
 @user_passes_test(admin_group_required)
 def manage_department(request):
     departments = Department.objects.all()
-    return render(request, 'departments/manage_department.html', {'departments': departments})
+    return render(request, 'departments/manage_department.html', {
+        'departments': departments,
+        'rows_version': model_version(Department),
+        'rows_timeout': cache_timeout(),
+    })
 
 # Add Department
 @login_required
@@ -336,7 +399,7 @@ def add_department(request):
             form.save()
             return redirect('manage_department')  # Redirect to department management page
 
-    departments = Department.objects.all()  # Fetch all departments
+    departments = cached_objects(Department.objects.all())
     return render(request, 'departments/add_department.html', {'form': form, 'departments': departments})
 
 # Edit Department
@@ -363,34 +426,104 @@ def delete_department(request, dept_id):
     department = get_object_or_404(Department, dept_id=dept_id)
     department.delete()
     return redirect('manage_department')  # Redirect to manage_department
+# Principal Dashboard View
+ROSTER_PAGE_SIZE = 25
+ROSTER_ORDERING = ('emp_name', 'id')
+
+
 @login_required
 @user_passes_test(principal_group_required)
+@replica_reads
 def principal_dashboard(request):
-    teachers = User.objects.filter(groups__name='Teacher').select_related('employee')
-
-    return render(request, 'principal_dashboard.html', {
+    teachers, filters = _roster_queryset(request)
+    teachers, next_cursor = keyset_page(
+        teachers, ROSTER_ORDERING, request.GET.get('after'), ROSTER_PAGE_SIZE,
+    )
+    return render(request, 'principal_dashboard.html', _principal_context(
+        request, teachers, filters, next_cursor,
+        departments=cached_objects(Department.objects.order_by('dept_name')),
+        designations=cached_objects(Designation.objects.order_by('designation_name')),
+        analytics=_principal_analytics(),
+    ))
+
+
+def _roster_queryset(request):
+    # One query for the whole page: user, department and designation are joined in
+    teachers = (
+        Employee.objects
+        .filter(user__groups__name=TEACHER)
+        .select_related('user', 'dept_id', 'designation_id')
+    )
+
+    # Filters are applied in SQL, not in the browser
+    filters = {
+        'dept': request.GET.get('dept', ''),
+        'designation': request.GET.get('designation', ''),
+        'status': request.GET.get('status', ''),
+    }
+    if filters['dept'].isdigit():
+        teachers = teachers.filter(dept_id=filters['dept'])
+    if filters['designation'].isdigit():
+        teachers = teachers.filter(designation_id=filters['designation'])
+    if filters['status']:
+        teachers = teachers.filter(status=filters['status'])
+    return teachers, filters
+
+
+def _principal_context(request, teachers, filters, next_cursor, **extra):
+    next_query = None
+    if next_cursor:
+        params = request.GET.copy()
+        params['after'] = next_cursor
+        next_query = params.urlencode()
+    first_query = None
+    if 'after' in request.GET:
+        params = request.GET.copy()
+        del params['after']
+        first_query = params.urlencode()
+
+    return {
         'teachers': teachers,
-    })
+        'filters': filters,
+        'status_choices': Employee._meta.get_field('status').choices,
+        'next_query': next_query,
+        'first_query': first_query,
+        **extra,
+    }
+
+
+def _principal_analytics():
+    summary = analytics.dashboard_summary()
+    return {
+        'departments': summary[analytics.DEPARTMENT],
+        'event_types': summary[analytics.EVENT_TYPE],
+        'months': summary[analytics.MONTH][-12:],  # last twelve months with activity
+        'modes': summary[analytics.MODE],
+        'active_roles': summary[analytics.ACTIVE_ROLE],
+    }
 from django.shortcuts import render, get_object_or_404
 from sparkapp.models import Employee, EventParticipation, EmployeeRoleAssignment
 
+@replica_reads
 def teacher_details(request, user_id):
     # Fetch Employee based on User ID
-    employee = get_object_or_404(Employee, user__id=user_id)
+    employee = get_object_or_404(Employee.objects.select_related('dept_id', 'designation_id'), user__id=user_id)
 
-    # Fetch events the teacher participated in
-    event_participations = EventParticipation.objects.filter(emp_id=employee).select_related('event_id')
+    # One page of events and roles, newest first, from the timeline table
+    entries, next_cursor = timeline.page(request.GET.get('after'), employee=employee)
+    return render(request, 'teacher_details.html', _details_context(request, employee, entries, next_cursor))
 
-    # Fetch role assignments for the teacher
-    role_assignments = EmployeeRoleAssignment.objects.filter(emp_id=employee).select_related('role_id')
 
-    return render(request, 'teacher_details.html', {
+def _details_context(request, employee, entries, next_cursor):
+    return {
         'employee': employee,
-        'event_participations': event_participations,
-        'role_assignments': role_assignments
-    })
+        'timeline': entries,
+        'next_cursor': next_cursor,
+        'first_page': not request.GET.get('after'),
+    }
 
 
+@replica_reads
 def manage_admin_employee(request):
     if request.method == "POST":
         form = EmployeeForm(request.POST)
@@ -427,8 +560,122 @@ def manage_admin_employee(request):
     else:
         form = EmployeeForm()
 
-    employees = Employee.objects.select_related("dept_id").all()
-    return render(request, "manage_admin_employee.html", {"form": form, "employees": employees})
+    # Only the first page is rendered here, the search box pages through employee_search
+    employees, next_cursor = keyset_page(directory_queryset(), DIRECTORY_ORDERING, None, DIRECTORY_PAGE_SIZE)
+    return render(request, "manage_admin_employee.html", {
+        "form": form,
+        "employees": employees,
+        "next_cursor": next_cursor,
+    })
+
+
+# Bulk onboarding (CSV / XLSX upload)
+@login_required
+@user_passes_test(admin_group_required)
+def import_employees(request):
+    report = None
+    if request.method == 'POST':
+        form = EmployeeImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                report = onboarding.import_employees(
+                    upload.file, upload.name,
+                    workers=getattr(settings, 'SPARKAPP_ONBOARDING_WORKERS', 1),
+                    dry_run=form.cleaned_data['dry_run'],
+                )
+            except onboarding.OnboardingError as exc:
+                form.add_error('file', str(exc))
+            else:
+                if report.created and not form.cleaned_data['dry_run']:
+                    messages.success(request, f'{report.created} employee(s) imported.')
+    else:
+        form = EmployeeImportForm()
+
+    return render(request, 'import_employees.html', {'form': form, 'report': report})
+
+
+# Report exports
+@login_required
+@user_passes_test(report_group_required)
+def reports(request):
+    form = ReportFilterForm(initial={'format': 'csv'})
+    return render(request, 'reports.html', {'form': form, 'xlsx_available': exports.openpyxl is not None})
+
+
+def _export(request, report):
+    rows_for, filename, sheet_title = exports.REPORTS[report]
+    form = ReportFilterForm(request.POST if request.method == 'POST' else request.GET)
+    if not form.is_valid():
+        return render(request, 'reports.html', {'form': form, 'xlsx_available': exports.openpyxl is not None},
+                      status=400)
+
+    if request.method == 'POST':
+        # written by a worker; the page polls task_status for the download
+        task = tasks.enqueue(
+            exports.write_report,
+            args=[report, exports.filters_to_json(form.cleaned_data), form.cleaned_data['format']],
+            user=request.user,
+        )
+        return render(request, 'task_status.html', {'task': task, 'title': sheet_title}, status=202)
+
+    rows = rows_for(form.cleaned_data)
+    if form.cleaned_data['format'] == 'xlsx' and exports.openpyxl is not None:
+        return exports.xlsx_response(rows, filename, sheet_title)
+    return exports.csv_response(rows, filename)
+
+
+@login_required
+@user_passes_test(report_group_required)
+@require_http_methods(['GET', 'POST'])
+@replica_reads
+def export_participations(request):
+    return _export(request, 'participations')
+
+
+@login_required
+@user_passes_test(report_group_required)
+@require_http_methods(['GET', 'POST'])
+@replica_reads
+def export_role_assignments(request):
+    return _export(request, 'role_assignments')
+
+
+# Employee directory search (JSON or HTML rows)
+DIRECTORY_PAGE_SIZE = 25
+DIRECTORY_ORDERING = ('emp_name', 'id')
+
+
+@login_required
+@user_passes_test(admin_group_required)
+@replica_reads
+def employee_search(request):
+    query = request.GET.get('q', '')
+    mode = 'contains' if request.GET.get('mode') == 'contains' else 'prefix'
+    employees, next_cursor = keyset_page(
+        search_employees(query, mode), DIRECTORY_ORDERING, request.GET.get('after'), DIRECTORY_PAGE_SIZE,
+    )
+
+    if request.GET.get('format') == 'html':
+        response = render(request, 'employee_rows.html', {'employees': employees})
+        if next_cursor:
+            response['X-Next-Cursor'] = next_cursor
+        return response
+
+    return JsonResponse({
+        'results': [
+            {
+                'id': emp.pk,
+                'user_id': emp.user_id,
+                'username': emp.user.username,
+                'emp_name': emp.emp_name,
+                'email_id': emp.email_id,
+                'department': emp.dept_id.dept_name,
+            }
+            for emp in employees
+        ],
+        'next': next_cursor,
+    })
 
 
 from django.shortcuts import render, get_object_or_404, redirect
@@ -453,3 +700,298 @@ def edit_employee(request, employee_id):
         form = EmployeeEditForm(instance=employee)
 
     return render(request, 'edit_employee.html', {'form': form})
+
+
+# ---- Event calendar ---- #
+# The feed changes only when events, event types or venues do, so clients
+# revalidate with If-None-Match / If-Modified-Since and mostly get a 304
+# without a single query.
+
+def _calendar_etag(request, *args, **kwargs):
+    try:
+        return calendar.feed_etag(*calendar.parse_window(request.GET))
+    except calendar.WindowError:
+        return None
+
+
+def _calendar_last_modified(request, *args, **kwargs):
+    return calendar.feed_changed_at()
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_calendar_etag, last_modified_func=_calendar_last_modified)
+def calendar_events(request):
+    """Events overlapping ?start=&end= or the ?view=week|month|term around ?date=, as JSON."""
+    try:
+        start, end = calendar.parse_window(request.GET)
+    except calendar.WindowError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return JsonResponse(calendar.feed(start, end))
+
+
+# ---- Protected media ---- #
+# Documents and profile pictures go through these views instead of MEDIA_URL,
+# so the permission check happens here; media.serve() then hands the bytes
+# to the front proxy when one is configured (SPARKAPP_MEDIA_ACCEL).
+
+def _serve_upload(request, field_file, filename=None, **kwargs):
+    if not field_file:
+        raise Http404
+    try:
+        return media.serve(request, field_file.storage, field_file.name, filename, **kwargs)
+    except FileNotFoundError:
+        raise Http404
+
+
+def _document_filename(field_file, *parts):
+    return ' - '.join(parts) + os.path.splitext(field_file.name)[1]
+
+
+@login_required
+def role_document(request, pk):
+    assignment = get_object_or_404(
+        EmployeeRoleAssignment.objects.select_related('emp_id', 'role_id')
+        .only('document', 'emp_id__user_id', 'emp_id__emp_name', 'role_id__role_name'),
+        pk=pk,
+    )
+    # 404 rather than 403: don't tell others which documents exist
+    if assignment.emp_id.user_id != request.user.pk and not report_group_required(request.user):
+        raise Http404
+    filename = _document_filename(assignment.document, assignment.role_id.role_name, assignment.emp_id.emp_name)
+    return _serve_upload(request, assignment.document, filename)
+
+
+@login_required
+def participation_document(request, pk):
+    participation = get_object_or_404(
+        EventParticipation.objects.select_related('emp_id', 'event_id')
+        .only('doc_link', 'emp_id__user_id', 'emp_id__emp_name', 'event_id__title'),
+        pk=pk,
+    )
+    if participation.emp_id.user_id != request.user.pk and not report_group_required(request.user):
+        raise Http404
+    filename = _document_filename(participation.doc_link, participation.event_id.title, participation.emp_id.emp_name)
+    return _serve_upload(request, participation.doc_link, filename)
+
+
+@login_required
+def profile_picture(request, pk, digest=None, size=None, extension=None):
+    """The uploaded picture, or one of its resized variants (see thumbnails.py)."""
+    employee = get_object_or_404(Employee.objects.only('profile_pic', 'profile_pic_hash'), pk=pk)
+    if digest is None:
+        return _serve_upload(request, employee.profile_pic)
+
+    extensions = [extension for extension, _, _ in thumbnails.FORMATS]
+    if not employee.profile_pic or digest != employee.profile_pic_hash \
+            or size not in thumbnails.SIZES or extension not in extensions:
+        raise Http404
+    name = thumbnails.variant_name(employee.profile_pic.name, digest, size, extension)
+    try:
+        return media.serve(
+            request, employee.profile_pic.storage, name,
+            # the hash is in the URL: a new picture gets new URLs
+            cache_control='private, max-age=31536000, immutable',
+        )
+    except FileNotFoundError:
+        raise Http404
+
+
+# ---- Chunked uploads ---- #
+# POST uploads/ (filename, size, sha256) creates an upload, PATCH
+# uploads/<id>/ with an Upload-Offset header appends the body, GET/HEAD
+# tell the offset to resume from, POST uploads/<id>/finish/ (target, pk)
+# attaches the file to the user's participation or role assignment.
+
+def _upload_state(upload, status=200):
+    response = JsonResponse({
+        'id': str(upload.pk),
+        'filename': upload.filename,
+        'size': upload.size,
+        'offset': upload.offset,
+        'url': reverse('upload_detail', args=[upload.pk]),
+    }, status=status)
+    response['Upload-Offset'] = str(upload.offset)
+    response['Upload-Length'] = str(upload.size)
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+@login_required
+@require_POST
+def upload_create(request):
+    try:
+        upload = uploads.create(
+            request.user, request.POST.get('filename'), request.POST.get('size'), request.POST.get('sha256'),
+        )
+    except uploads.UploadError as exc:
+        return JsonResponse({'error': str(exc)}, status=exc.status)
+    response = _upload_state(upload, status=201)
+    response['Location'] = reverse('upload_detail', args=[upload.pk])
+    return response
+
+
+@login_required
+@require_http_methods(['GET', 'HEAD', 'PATCH', 'DELETE'])
+def upload_detail(request, pk):
+    upload = get_object_or_404(ChunkedUpload, pk=pk, user=request.user)
+    if request.method == 'DELETE':
+        uploads.discard(upload)
+        return HttpResponse(status=204)
+    if request.method == 'PATCH':
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+            length = int(request.headers['Content-Length']) if request.headers.get('Content-Length') else None
+        except ValueError:
+            return JsonResponse({'error': 'Send the chunk offset in the Upload-Offset header.'}, status=400)
+        try:
+            # request.read(): straight from the socket, never into request.body
+            uploads.append(upload, offset, request, length)
+        except uploads.UploadError as exc:
+            return JsonResponse({'error': str(exc)}, status=exc.status)
+    return _upload_state(upload)
+
+
+@login_required
+@require_POST
+def upload_finish(request, pk):
+    upload = get_object_or_404(ChunkedUpload, pk=pk, user=request.user)
+    try:
+        uploads.finish(upload, request.POST.get('target'), request.POST.get('pk'), request.user)
+    except uploads.UploadError as exc:
+        return JsonResponse({'error': str(exc)}, status=exc.status)
+    except ValueError:
+        return JsonResponse({'error': '"pk" must be the id of the row to attach the file to.'}, status=400)
+    return HttpResponse(status=204)
+
+
+# ---- Background tasks ---- #
+def _own_task(request, pk):
+    task = get_object_or_404(Task, pk=pk)
+    if task.user_id != request.user.pk and not admin_group_required(request.user):
+        raise Http404
+    return task
+
+
+@login_required
+def task_status(request, pk):
+    """How a queued task is doing, as JSON; ``download`` once a task's file is ready."""
+    task = _own_task(request, pk)
+    data = {
+        'id': task.pk,
+        'status': task.status,
+        'attempts': task.attempts,
+        'max_attempts': task.max_attempts,
+        'created_at': task.created_at.isoformat(),
+        'finished_at': task.finished_at.isoformat() if task.finished_at else None,
+    }
+    if task.status == Task.DONE and isinstance(task.result, dict) and task.result.get('file'):
+        data['download'] = reverse('task_result', args=[task.pk])
+    if task.status == Task.FAILED:
+        data['error'] = 'The task failed, please try again.'  # the traceback stays in the database
+    response = JsonResponse(data)
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+@login_required
+def task_result(request, pk):
+    task = _own_task(request, pk)
+    if task.status != Task.DONE or not isinstance(task.result, dict) or not task.result.get('file'):
+        raise Http404
+    try:
+        return media.serve(request, tasks.result_storage(), task.result['file'], task.result.get('filename'),
+                           accel=False)
+    except FileNotFoundError:
+        raise Http404
+
+
+# ---- Change feed ---- #
+@login_required
+@user_passes_test(report_group_required)
+def sync_changes(request, resource):
+    """The changes of ``resource`` since ``?cursor=``, as JSON (see sparkapp/sync.py)."""
+    # Read from the primary: a lagging replica could hide rows the cursor then skips
+    if resource not in sync.RESOURCES:
+        raise Http404
+    try:
+        page_size = int(request.GET.get('limit') or 0)
+        data = sync.changes(resource, request.GET.get('cursor'), page_size=max(page_size, 0))
+    except ValueError as exc:  # sync.InvalidCursor, or a limit that isn't a number
+        return JsonResponse({'error': str(exc)}, status=400)
+    response = JsonResponse(data)
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+# ---- Async (ASGI) variants ---- #
+# Served in place of the views above when the site runs under spark/asgi.py
+# (SPARKAPP_ASYNC_VIEWS, see urls.py). Queries that don't depend on each
+# other run at the same time: each in a worker thread of its own
+# (thread_sensitive=False) on a connection of its own, closed when it's done,
+# and the view awaits them together. Plain sync_to_async would queue them
+# all on the request's one sync thread, one after another. Templates and
+# context processors may touch the ORM, so rendering happens in that thread.
+
+async def _in_parallel(func, *args, **kwargs):
+    """Run ``func`` in a thread and on a database connection of its own."""
+    def call():
+        try:
+            return func(*args, **kwargs)
+        finally:
+            connections.close_all()  # only this thread's connections
+    return await sync_to_async(call, thread_sensitive=False)()
+
+
+async def _arender(request, template_name, context):
+    return await sync_to_async(render)(request, template_name, context)
+
+
+async def _load_user(request):
+    """Resolve request.user (with its Employee row, see sparkapp/backends.py) before rendering."""
+    request.user = await request.auser()
+
+
+@login_required
+@user_passes_test(admin_group_required)
+async def admin_dashboard_async(request):
+    await _load_user(request)
+    return await _arender(request, 'admin_dashboard.html', {})
+
+
+@login_required
+@user_passes_test(teacher_group_required)
+async def teacher_dashboard_async(request):
+    await _load_user(request)
+    return await _arender(request, 'teacher_dashboard.html', {})
+
+
+@login_required
+@user_passes_test(principal_group_required)
+@replica_reads
+async def principal_dashboard_async(request):
+    teachers, filters = _roster_queryset(request)
+    (teachers, next_cursor), summary, departments, designations, _ = await asyncio.gather(
+        _in_parallel(keyset_page, teachers, ROSTER_ORDERING, request.GET.get('after'), ROSTER_PAGE_SIZE),
+        _in_parallel(_principal_analytics),
+        _in_parallel(cached_objects, Department.objects.order_by('dept_name')),
+        _in_parallel(cached_objects, Designation.objects.order_by('designation_name')),
+        _load_user(request),
+    )
+    return await _arender(request, 'principal_dashboard.html', _principal_context(
+        request, teachers, filters, next_cursor,
+        departments=departments, designations=designations, analytics=summary,
+    ))
+
+
+@replica_reads
+async def teacher_details_async(request, user_id):
+    # Both filter on the user id, so the timeline doesn't wait for the employee
+    employee, (entries, next_cursor), _ = await asyncio.gather(
+        _in_parallel(Employee.objects.select_related('dept_id', 'designation_id').filter(user__id=user_id).first),
+        _in_parallel(timeline.page, request.GET.get('after'), employee__user__id=user_id),
+        _load_user(request),
+    )
+    if employee is None:
+        raise Http404('No Employee matches the given query.')
+    return await _arender(request, 'teacher_details.html', _details_context(request, employee, entries, next_cursor))